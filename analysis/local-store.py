@@ -0,0 +1,262 @@
+import os, re, csv, lzma, sqlite3, argparse, html
+from datetime import datetime, timezone
+from collections import OrderedDict
+
+BATCH_SIZE = 10000
+DEFAULT_DB = 'load-results.sqlite'
+
+# label suffixes and prefixes with corresponding field names, the same mapping as in upload-metrics.py
+LABEL_SUFFIXES = [('_count_per_sec', 'count_per_sec'), ('_per_sec', 'per_sec')]
+LABEL_PREFIXES = [('min_', 'min'), ('max_', 'max'), ('avg_', 'avg')]
+TIME_FORMATS = ['%Y-%m-%d %H:%M:%S,%f', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S']
+
+# file_id of metrics and logs rows is rowid of the files row of the file they were read from
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (time REAL, host TEXT, measurement TEXT, field TEXT, value REAL, file_id INTEGER);
+CREATE TABLE IF NOT EXISTS logs (time REAL, host TEXT, severity TEXT, source TEXT, msg TEXT, file_id INTEGER);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL);
+"""
+# indexes are built after bulk inserts, it is much faster than maintaining them during ingestion
+INDEXES = """
+CREATE INDEX IF NOT EXISTS metrics_measurement_host_time ON metrics (measurement, field, host, time);
+CREATE INDEX IF NOT EXISTS metrics_file ON metrics (file_id);
+CREATE INDEX IF NOT EXISTS logs_host_time ON logs (host, time);
+CREATE INDEX IF NOT EXISTS logs_severity_time ON logs (severity, time);
+CREATE INDEX IF NOT EXISTS logs_file ON logs (file_id);
+"""
+
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript(SCHEMA)
+    for table in ('metrics', 'logs'):  # databases created before rows were bound to files
+        if 'file_id' not in [column[1] for column in conn.execute('PRAGMA table_info({})'.format(table))]:
+            conn.execute('ALTER TABLE {} ADD COLUMN file_id INTEGER'.format(table))
+    return conn
+
+
+def parse_time(value):  # returns seconds since epoch or None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def label_to_field(label):  # returns (measurement, field) or None for labels which are not stored
+    for suffix, field in LABEL_SUFFIXES:
+        if label.endswith(suffix):
+            return label[:-len(suffix)].strip(), field
+    for prefix, field in LABEL_PREFIXES:
+        if label.startswith(prefix):
+            return label[len(prefix):].strip(), field
+    return None
+
+
+def is_ingested(conn, path):
+    row = conn.execute('SELECT mtime FROM files WHERE path = ?', (path,)).fetchone()
+    return row is not None and row[0] == os.path.getmtime(path)
+
+
+def insert_batches(conn, query, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(query, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(query, batch)
+
+
+def metrics_rows(host, path):
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        labels = next(reader)
+        # label mapping is computed once per file, not for every row
+        columns = [(i, label_to_field(label)) for i, label in enumerate(labels) if i > 0]
+        columns = [(i, mapping) for i, mapping in columns if mapping]
+        for row in reader:
+            timestamp = parse_time(row[0])
+            if timestamp is None:
+                continue
+            for i, (measurement, field) in columns:
+                try:
+                    yield timestamp, host, measurement, field, float(row[i])
+                except (ValueError, IndexError):
+                    continue
+
+
+def log_rows(host, path):
+    open_fn = lzma.open if path.endswith('.xz') else open
+    with open_fn(path, 'rt', errors='replace') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('|', maxsplit=3)
+            if len(parts) != 4:
+                continue
+            timestamp = parse_time(parts[0])
+            if timestamp is None:
+                continue
+            yield timestamp, host, parts[1].lower(), parts[2], parts[3]
+
+
+def ingest_file(conn, path, table, rows):
+    if is_ingested(conn, path):
+        print("Skipping {}, it is already ingested".format(path))
+        return
+    print("Ingesting {}...".format(path))
+    with conn:
+        # files row keeps its rowid when the file changes, so rows of the previous version are replaced
+        conn.execute('INSERT OR IGNORE INTO files VALUES (?, NULL)', (path,))
+        file_id = conn.execute('SELECT rowid FROM files WHERE path = ?', (path,)).fetchone()[0]
+        conn.execute('DELETE FROM {} WHERE file_id = ?'.format(table), (file_id,))
+        insert_batches(conn, 'INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)'.format(table),
+                       (row + (file_id,) for row in rows))
+        conn.execute('UPDATE files SET mtime = ? WHERE rowid = ?', (os.path.getmtime(path), file_id))
+
+
+def ingest(conn, logs_dir='logs'):
+    metrics_dir = os.path.join(logs_dir, 'metrics')
+    metrics_matcher = re.compile(r"^metrics(\d+)\.csv$")
+    if os.path.isdir(metrics_dir):
+        for name in sorted(os.listdir(metrics_dir)):
+            m = metrics_matcher.match(name)
+            if m:
+                path = os.path.join(metrics_dir, name)
+                ingest_file(conn, path, 'metrics', metrics_rows('Node{}'.format(m.group(1)), path))
+
+    log_matcher = re.compile(r"Node(\d+).log.*")
+    for name in sorted(os.listdir(logs_dir)):
+        m = log_matcher.search(name)
+        if m:
+            path = os.path.join(logs_dir, name)
+            ingest_file(conn, path, 'logs', log_rows('Node{}'.format(m.group(1)), path))
+
+    conn.executescript(INDEXES)
+
+
+# queries below are counterparts of general_metrics.json dashboard panels,
+# `node` is a host prefix the same way as `$node` dashboard variable
+
+
+def mean_by_interval(conn, measurement, field='avg', node='', interval=60):
+    # SELECT mean("avg") FROM <measurement> WHERE "host" =~ /^$node/ GROUP BY time($__interval), "host"
+    return conn.execute(
+        'SELECT host, CAST(time / :interval AS INTEGER) * :interval AS bucket, AVG(value) FROM metrics '
+        'WHERE measurement = :measurement AND field = :field AND host LIKE :node '
+        'GROUP BY host, bucket ORDER BY host, bucket',
+        {'interval': interval, 'measurement': measurement, 'field': field, 'node': node + '%'}
+    ).fetchall()
+
+
+def throughput(conn, node='', interval=60):
+    return mean_by_interval(conn, 'monitor_avg_throughput', 'avg', node, interval)
+
+
+def latency(conn, node='', interval=60):
+    return mean_by_interval(conn, 'monitor_avg_latency', 'avg', node, interval)
+
+
+def errors_count(conn, node='', interval=60):
+    # SELECT count("msg") FROM "log-entry" WHERE severity is warning or error GROUP BY time($__interval), "host"
+    return conn.execute(
+        'SELECT host, CAST(time / :interval AS INTEGER) * :interval AS bucket, COUNT(*) FROM logs '
+        'WHERE severity IN (\'warning\', \'error\') AND host LIKE :node '
+        'GROUP BY host, bucket ORDER BY host, bucket',
+        {'interval': interval, 'node': node + '%'}
+    ).fetchall()
+
+
+def error_logs(conn, node='', limit=500):
+    # SELECT "msg" FROM "log-entry" WHERE host =~ /$node/ AND severity =~ /error|warning/ LIMIT 500
+    return conn.execute(
+        'SELECT time, host, severity, msg FROM logs '
+        'WHERE severity IN (\'warning\', \'error\') AND host LIKE :node ORDER BY time LIMIT :limit',
+        {'node': node + '%', 'limit': limit}
+    ).fetchall()
+
+
+def rows_to_series(rows):  # (host, time, value) rows to {host: [(time, value)]}
+    series = OrderedDict()
+    for host, timestamp, value in rows:
+        series.setdefault(host, []).append((timestamp, value))
+    return series
+
+
+def svg_chart(title, series, width=1200, height=250, padding=40):
+    points = [point for values in series.values() for point in values if point[1] is not None]
+    if not points:
+        return '<h3>{}</h3><p>No data</p>'.format(html.escape(title))
+    min_t, max_t = min(p[0] for p in points), max(p[0] for p in points)
+    min_v, max_v = min(0, min(p[1] for p in points)), max(p[1] for p in points)
+    scale_t = (width - 2 * padding) / ((max_t - min_t) or 1)
+    scale_v = (height - 2 * padding) / ((max_v - min_v) or 1)
+
+    lines = []
+    for i, (host, values) in enumerate(series.items()):
+        color = 'hsl({}, 70%, 45%)'.format(i * 360 // len(series))
+        coords = ' '.join(
+            '{:.1f},{:.1f}'.format(padding + (t - min_t) * scale_t, height - padding - (v - min_v) * scale_v)
+            for t, v in values if v is not None
+        )
+        lines.append('<polyline fill="none" stroke="{}" points="{}"><title>{}</title></polyline>'.format(
+            color, coords, html.escape(host)))
+    return (
+        '<h3>{title}</h3>'
+        '<svg width="{width}" height="{height}" style="border:1px solid #ccc">'
+        '<text x="2" y="{top}" font-size="10">{max_v:.2f}</text>'
+        '<text x="2" y="{bottom}" font-size="10">{min_v:.2f}</text>'
+        '<text x="{padding}" y="{height_text}" font-size="10">{start}</text>'
+        '<text x="{end_x}" y="{height_text}" font-size="10" text-anchor="end">{end}</text>'
+        '{lines}</svg>'
+    ).format(
+        title=html.escape(title), width=width, height=height, top=padding, bottom=height - padding,
+        max_v=max_v, min_v=min_v, padding=padding, height_text=height - 5, end_x=width - padding,
+        start=datetime.fromtimestamp(min_t, timezone.utc).isoformat(),
+        end=datetime.fromtimestamp(max_t, timezone.utc).isoformat(),
+        lines=''.join(lines)
+    )
+
+
+def export_html(conn, path, node='', interval=60):
+    logs = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+            datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), html.escape(host),
+            html.escape(severity), html.escape(msg))
+        for timestamp, host, severity, msg in error_logs(conn, node)
+    )
+    with open(path, 'w') as f:
+        f.write(
+            '<html><head><meta charset="utf-8"><title>Load results</title></head><body>'
+            '{}{}{}<h3>Logs</h3><table>{}</table></body></html>'.format(
+                svg_chart('Throughput', rows_to_series(throughput(conn, node, interval))),
+                svg_chart('Latency', rows_to_series(latency(conn, node, interval))),
+                svg_chart('Errors/warnings', rows_to_series(errors_count(conn, node, interval))),
+                logs
+            )
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local store for load test metrics and logs')
+    parser.add_argument('command', choices=['ingest', 'report'])
+    parser.add_argument('--db', default=DEFAULT_DB, help='sqlite database path')
+    parser.add_argument('--logs', default='logs', help='directory with Node*.log* files and metrics/ subdirectory')
+    parser.add_argument('--node', default='', help='host prefix to filter by, e.g. Node1')
+    parser.add_argument('--interval', type=int, default=60, help='grouping interval in seconds')
+    parser.add_argument('--output', default='report.html', help='html report path')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == 'ingest':
+        ingest(conn, args.logs)
+    else:
+        export_html(conn, args.output, args.node, args.interval)
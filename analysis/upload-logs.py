@@ -1,7 +1,15 @@
-import os, re, lzma
+import os, re, lzma, time, threading
+from multiprocessing import Pool, Queue, cpu_count
 from influxdb import InfluxDBClient
+from influxdb.line_protocol import make_lines
 
 BATCH_SIZE = 10000
+PARSERS = cpu_count()
+SENDERS = 4
+# parsers block when uploading is slower than parsing instead of piling up batches in memory
+QUEUE_SIZE = 4 * SENDERS
+RETRIES = 5
+DATABASE = 'load-results'
 
 
 def line_to_point(node_id, line):
@@ -23,8 +31,46 @@ def line_to_point(node_id, line):
         return
 
 
-def upload_log(client, node_id, filename):
-    print("Uploading {}...".format(filename))
+def make_client():
+    return InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE)
+
+
+class UploadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.points = 0
+        self.failed = 0
+
+    def add(self, points, failed=False):
+        with self._lock:
+            if failed:
+                self.failed += points
+            else:
+                self.points += points
+
+    def report(self):
+        elapsed = time.perf_counter() - self._started
+        print("Uploaded {} points ({} failed) in {:.1f} seconds, {:.0f} points/sec".format(
+            self.points, self.failed, elapsed, self.points / elapsed if elapsed else 0))
+
+
+_batches = None
+
+
+def init_parser(batches):
+    global _batches
+    _batches = batches
+
+
+def put_batch(points):
+    # points are converted to line protocol here so senders only do network I/O
+    _batches.put((len(points), make_lines({'points': points})))
+
+
+def parse_log(args):
+    node_id, filename = args
+    print("Parsing {}...".format(filename))
 
     open_fn = lzma.open if filename.endswith('.xz') else open
     with open_fn(filename, 'rt') as f:
@@ -35,16 +81,61 @@ def upload_log(client, node_id, filename):
                 continue
             points.append(point)
             if len(points) >= BATCH_SIZE:
-                client.write_points(points)
+                put_batch(points)
                 points.clear()
+        if points:
+            put_batch(points)
+
+
+def send_batches(batches, stats):
+    client = make_client()
+    sent_batches = 0
+    while True:
+        batch = batches.get()
+        if batch is None:
+            return
+        size, lines = batch
+        for attempt in range(1, RETRIES + 1):
+            try:
+                client.write_points([lines], protocol='line')
+                stats.add(size)
+                break
+            except Exception as e:
+                if attempt == RETRIES:
+                    print("Failed to upload batch of {} points: {}".format(size, e))
+                    stats.add(size, failed=True)
+                else:
+                    time.sleep(2 ** attempt)
+        sent_batches += 1
+        if sent_batches % 10 == 0:
+            stats.report()
+
+
+def upload_logs(log_filenames):
+    batches = Queue(maxsize=QUEUE_SIZE)
+    stats = UploadStats()
+
+    senders = [threading.Thread(target=send_batches, args=(batches, stats)) for _ in range(SENDERS)]
+    for sender in senders:
+        sender.start()
+    try:
+        with Pool(PARSERS, initializer=init_parser, initargs=(batches,)) as pool:
+            pool.map(parse_log, [(node_id, filename) for filename, node_id in log_filenames], chunksize=1)
+    finally:
+        for _ in senders:
+            batches.put(None)
+        for sender in senders:
+            sender.join()
+    stats.report()
 
 
-client = InfluxDBClient('localhost', 8086, 'root', 'root', 'load-results')
-client.create_database('load-results')
+if __name__ == '__main__':
+    make_client().create_database(DATABASE)
 
-log_filename_matcher = re.compile("Node(\d+).log.*")
-matches = [log_filename_matcher.search(name) for name in os.listdir('logs')]
-log_filenames = [(m.group(0), m.group(1)) for m in matches if m]
+    log_filename_matcher = re.compile("Node(\d+).log.*")
+    matches = [log_filename_matcher.search(name) for name in os.listdir('logs')]
+    log_filenames = [(os.path.join('logs', m.group(0)), m.group(1)) for m in matches if m]
+    # biggest files go first so they don't end up being parsed alone at the end
+    log_filenames.sort(key=lambda x: os.path.getsize(x[0]), reverse=True)
 
-for filename, node_id in log_filenames:
-    upload_log(client, node_id, os.path.join('logs', filename))
+    upload_logs(log_filenames)
@@ -1,49 +1,91 @@
+import os, re
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+import pandas as pd
 from influxdb import InfluxDBClient
-from collections import defaultdict
 
 BATCH_SIZE = 10000
+CHUNK_SIZE = 1000  # rows, each of them gives a line for every measurement
+UPLOADERS = cpu_count()
+DATABASE = 'load-results'
+METRICS_DIR = os.path.join('logs', 'metrics')
 
+# label suffixes and prefixes with corresponding field names, checked in this order
+LABEL_SUFFIXES = [('_count_per_sec', 'count_per_sec'), ('_per_sec', 'per_sec')]
+LABEL_PREFIXES = [('min_', 'min'), ('max_', 'max'), ('avg_', 'avg')]
 
-def line_to_points(node_id, labels, line):
-    timestamp = line[0]
-    measurements = defaultdict(dict)
-    for label, value in zip(labels[1:], line[1:]):
-        if label.endswith('_count_per_sec'):
-            measurements[label[:-len('_count_per_sec')]]['count_per_sec'] = float(value)
-            continue
-        if label.endswith('_per_sec'):
-            measurements[label[:-len('_per_sec')]]['per_sec'] = float(value)
-            continue
-        if label.startswith('min_'):
-            measurements[label[len('min_'):]]['min'] = float(value)
-            continue
-        if label.startswith('max_'):
-            measurements[label[len('max_'):]]['max'] = float(value)
-            continue
-        if label.startswith('avg_'):
-            measurements[label[len('avg_'):]]['avg'] = float(value)
-            continue
-    return [{
-        'measurement': measurement.strip(),
-        'time': timestamp,
-        'tags': {'host': 'Node{}'.format(node_id)},
-        'fields': fields
-    } for measurement, fields in measurements.items()]
-
-
-def upload_metrics(client, node_id):
+
+def label_to_field(label):  # returns (measurement, field) or None for labels which are not uploaded
+    for suffix, field in LABEL_SUFFIXES:
+        if label.endswith(suffix):
+            return label[:-len(suffix)].strip(), field
+    for prefix, field in LABEL_PREFIXES:
+        if label.startswith(prefix):
+            return label[len(prefix):].strip(), field
+    return None
+
+
+def metrics_schema(labels):  # maps measurement to list of (label, field), computed once per csv header
+    schema = OrderedDict()
+    for label in labels[1:]:
+        mapping = label_to_field(label)
+        if mapping:
+            measurement, field = mapping
+            schema.setdefault(measurement, []).append((label, field))
+    return schema
+
+
+def escape_key(key):
+    return key.replace(',', r'\,').replace('=', r'\=').replace(' ', r'\ ')
+
+
+def chunk_to_lines(node_id, schema, chunk):
+    timestamps = chunk.iloc[:, 0]
+    if pd.api.types.is_numeric_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, unit='s')
+    else:
+        timestamps = pd.to_datetime(timestamps)
+    timestamps = ' ' + timestamps.astype('int64').astype(str)
+
+    lines = []
+    for measurement, fields in schema.items():
+        # empty values are skipped, line is dropped completely if there are no values at all
+        values = [
+            (field + '=' + chunk[label].astype(str)).where(chunk[label].notna(), '')
+            for label, field in fields
+        ]
+        field_set = values[0].str.cat(values[1:], sep=',') if len(values) > 1 else values[0]
+        field_set = field_set.str.replace(r',+', ',', regex=True).str.strip(',')
+        prefix = '{},host=Node{} '.format(escape_key(measurement), node_id)
+        measurement_lines = prefix + field_set + timestamps
+        lines.extend(measurement_lines[field_set != ''].tolist())
+    return lines
+
+
+def upload_metrics(args):
+    node_id, filename = args
     print("Uploading metrics from node {}".format(node_id))
-    with open('logs/metrics/metrics{}.csv'.format(node_id), 'rt') as f:
-        labels = f.readline().split(',')
-        points = []
-        for line in f:
-            points.extend(line_to_points(node_id, labels, line.split(',')))
-            if len(points) > BATCH_SIZE:
-                client.write_points(points)
-                points.clear()
-
-
-client = InfluxDBClient('localhost', 8086, 'root', 'root', 'load-results')
-client.create_database('load-results')
-for i in range(25):
-    upload_metrics(client, i+1)
+    client = InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE)
+    schema = None
+    lines = []
+    for chunk in pd.read_csv(filename, chunksize=CHUNK_SIZE):
+        if schema is None:
+            schema = metrics_schema(list(chunk.columns))
+        lines.extend(chunk_to_lines(node_id, schema, chunk))
+        while len(lines) >= BATCH_SIZE:
+            client.write_points(lines[:BATCH_SIZE], protocol='line')
+            del lines[:BATCH_SIZE]
+    if lines:
+        client.write_points(lines, protocol='line')
+
+
+def find_metrics(path=METRICS_DIR):  # returns (node_id, path) for each metrics csv found
+    metrics_filename_matcher = re.compile(r"^metrics(\d+)\.csv$")
+    matches = [metrics_filename_matcher.match(name) for name in os.listdir(path)]
+    return sorted([(int(m.group(1)), os.path.join(path, m.group(0))) for m in matches if m])
+
+
+if __name__ == '__main__':
+    InfluxDBClient('localhost', 8086, 'root', 'root', DATABASE).create_database(DATABASE)
+    with Pool(UPLOADERS) as pool:
+        pool.map(upload_metrics, find_metrics(), chunksize=1)
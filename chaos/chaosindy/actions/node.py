@@ -4,8 +4,10 @@ import random
 import subprocess
 import time
 from chaosindy.common import *
-from chaosindy.execute.execute import FabricExecutor, ParallelFabricExecutor
-from chaosindy.probes.validator_info import get_validator_info, detect_primary
+from chaosindy.execute.execute import (FabricExecutor, ParallelFabricExecutor,
+    batch_succeeded)
+from chaosindy.probes.validator_info import (get_validator_info,
+    get_validator_info_by_alias, detect_primary, invalidate_validator_info)
 from chaosindy.probes.validator_state import get_current_validator_list
 from logzero import logger
 from multiprocessing import Pool
@@ -49,6 +51,7 @@ def clean_by_node_name(node: str,
     :type ssh_config_file: str
     :return: bool
     """
+    invalidate_validator_info()
     executor = FabricExecutor(ssh_config_file=expanduser(ssh_config_file))
 
     ## Stop indy-node service
@@ -184,6 +187,75 @@ def generate_load_parallel(clients = List[str],
     return True
 
 
+def iptables_drop_port_rule(port: str, delete: bool = False,
+    best_effort: bool = False) -> str:
+    """
+    Build an iptables rule dropping inbound tcp traffic to a port.
+
+    :param port: The port or port range. A port range is formatted
+        <from port>:<to port>. Required.
+    :type port: str
+    :param delete: Build a rule deleting the drop rule instead of appending it?
+        Optional. (Default: False)
+    :type delete: bool
+    :param best_effort: Do NOT fail if the rule can not be applied?
+        Optional. (Default: False)
+    :type best_effort: bool
+    :return: str
+    """
+    operation = "-D" if delete else "-A"
+    if ":" in port:
+        rule = "{} INPUT -p tcp --match multiport --dports {} -j" \
+               " DROP".format(operation, port)
+    else:
+        rule = "{} INPUT -p tcp --destination-port {} -j DROP".format(
+               operation, port)
+    if best_effort:
+        rule += " || true"
+    return rule
+
+
+def execute_batch_by_node_name(commands: Dict[str, List[str]],
+    timeout: Union[str,int] = None,
+    ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE) -> Dict[str, bool]:
+    """
+    Execute commands as sudo on nodes in one round of parallel sessions.
+
+    Commands of each node are chained into a single shell invocation and
+    stop at the first failing command.
+
+    :param commands: A mapping of node alias to the commands to execute on
+        that node. Required.
+    :type commands: Dict[str, List[str]]
+    :param timeout: How long the commands of a node may run.
+        Optional.
+        (Default: chaosindy.execute.execute.DEFAULT_PARALLEL_TIMEOUT seconds)
+    :type timeout: Union[str,int]
+    :param ssh_config_file: The relative or absolute path to the SSH config
+        file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SSH_CONFIG_FILE)
+    :type ssh_config_file: str
+    :return: Dict[str, bool] - whether all commands succeeded on each node
+    """
+    invalidate_validator_info()
+    executor = ParallelFabricExecutor(ssh_config_file=expanduser(ssh_config_file))
+    try:
+        results = executor.execute_batch(commands, as_sudo=True, chain=True,
+            timeout=int(timeout) if timeout else None)
+    finally:
+        executor.close()
+
+    succeeded = {}
+    for node, node_commands in commands.items():
+        result = results[node]
+        logger.debug("node: %s batch result: %s", node, str(result))
+        succeeded[node] = batch_succeeded(result, node_commands)
+        if not succeeded[node]:
+            logger.error("Failed to execute %s on node %s: %s", node_commands,
+                         node, result.error or result.results[-1:])
+    return succeeded
+
+
 def apply_iptables_rule_by_node_name(node: str, rule: str,
     ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE) -> bool:
     """
@@ -199,6 +271,7 @@ def apply_iptables_rule_by_node_name(node: str, rule: str,
     :type ssh_config_file: str
     :return: bool
     """
+    invalidate_validator_info()
     logger.debug("applying iptables rule >%s< on node: %s", rule, node)
     executor = FabricExecutor(ssh_config_file=expanduser(ssh_config_file))
 
@@ -235,11 +308,7 @@ def block_port_by_node_name(node: str, port: str,
     """
     logger.debug("block node %s on port %s", node, port)
     ## 1. Block a port or port range using a firewall
-    if ":" in port:
-        rule = "-A INPUT -p tcp --match multiport --dports {} -j" \
-               " DROP".format(port)
-    else:
-        rule = "-A INPUT -p tcp --destination-port {} -j DROP".format(port)
+    rule = iptables_drop_port_rule(port)
     return apply_iptables_rule_by_node_name(node, rule, ssh_config_file)
 
 
@@ -262,17 +331,8 @@ def unblock_port_by_node_name(node: str, port: str, best_effort: bool = False,
     :return: bool
     """
     logger.debug("unblock node %s on port %s", node, port)
-    do_not_fail = ""
-    if best_effort:
-       do_not_fail = " || true"
-
     ## 1. Unblock a port or port range using a firewall
-    if ":" in port:
-        rule = "-D INPUT -p tcp --match multiport --dports {} -j" \
-               " DROP{}".format(port, do_not_fail)
-    else:
-        rule = "-D INPUT -p tcp --destination-port {} -j" \
-               " DROP{}".format(port, do_not_fail)
+    rule = iptables_drop_port_rule(port, delete=True, best_effort=best_effort)
 
     try:
         return apply_iptables_rule_by_node_name(node, rule, ssh_config_file)
@@ -344,6 +404,7 @@ def stop_by_node_name(node: str, gracefully: bool = True, force: bool = True,
     :type ssh_config_file: str
     :return: bool
     """
+    invalidate_validator_info()
     logger.debug("stop node: %s", node)
     executor = FabricExecutor(ssh_config_file=expanduser(ssh_config_file))
 
@@ -413,6 +474,7 @@ def start_by_node_name(node: str,
     :type ssh_config_file: str
     :return: bool
     """
+    invalidate_validator_info()
     logger.debug("start node: %s", node)
     executor = FabricExecutor(ssh_config_file=expanduser(ssh_config_file))
 
@@ -531,16 +593,19 @@ def unblock_node_port_all_nodes(genesis_file: str, best_effort: bool = True,
     aliases = get_aliases(genesis_file)
     logger.debug(aliases)
 
+    # 2. Unblock the node port on all nodes at once
+    commands = {}
     for node in aliases:
         logger.debug("node: %s -- genesis_file: %s", node, genesis_file)
         node_info = get_info_by_node_name(genesis_file, node)
-        try:
-            unblock_port_by_node_name(node, str(node_info['node_port']),
-                                      ssh_config_file)
-        except Exception as e:
-            logger.exception(e)
-            if not best_effort:
-                return False
+        rule = iptables_drop_port_rule(str(node_info['node_port']),
+                                       delete=True, best_effort=best_effort)
+        commands[node] = ["iptables {}".format(rule)]
+    succeeded = execute_batch_by_node_name(commands,
+                                           ssh_config_file=ssh_config_file)
+
+    if not best_effort and not all(succeeded.values()):
+        return False
 
     return True
 
@@ -627,12 +692,21 @@ def block_node_port_random(genesis_file: str, count: Union[str,int],
     blocked = 0
     tried_to_block = 0
     blocked_ports = {}
+    node_ports = {}
+    commands = {}
     for node in selected:
         logger.debug("node alias to block: %s", node)
         node_info = get_info_by_node_name(genesis_file, node)
-        node_port = node_info['node_port']
-        if block_port_by_node_name(node, str(node_port), ssh_config_file):
-            blocked_ports[node] = node_port
+        node_ports[node] = node_info['node_port']
+        commands[node] = ["iptables {}".format(
+            iptables_drop_port_rule(str(node_ports[node])))]
+
+    # Block the port on all selected nodes at once
+    succeeded = execute_batch_by_node_name(commands,
+                                           ssh_config_file=ssh_config_file)
+    for node in selected:
+        if succeeded[node]:
+            blocked_ports[node] = node_ports[node]
             blocked += 1
         tried_to_block += 1
 
@@ -1183,34 +1257,24 @@ def nodes_are_caught_up(nodes: List[str], genesis_file: str,
     # "nodes_random" file has been created in a temporary directory
     # created using rules defined by get_chaos_temp_dir()
     # 1. Get validator info from all nodes
-    get_validator_info(genesis_file, did=did, seed=seed,
-                       wallet_name=wallet_name, wallet_key=wallet_key,
-                       pool=pool, ssh_config_file=ssh_config_file)
-    output_dir = get_chaos_temp_dir()
+    validator_info = get_validator_info_by_alias(genesis_file, did=did,
+                                                 seed=seed,
+                                                 wallet_name=wallet_name,
+                                                 wallet_key=wallet_key,
+                                                 pool=pool,
+                                                 ssh_config_file=ssh_config_file)
 
     matching = []
     not_matching = {}
     for alias in nodes:
         logger.debug("Checking if node %s has %s catchup transactions", alias,
                      transactions)
-        validator_info = join(output_dir, "{}-validator-info".format(alias))
         try:
-            with open(validator_info, 'r') as f:
-                node_info = json.load(f)
-
+            if alias not in validator_info:
+                raise FileNotFoundError(alias)
+            catchup_status = validator_info[alias].catchup_status
             # Get the number of transactions added during catchup
-            txns_in_catchup = None
-            # Get the catchup status
-            catchup_status = None
-            if 'data' in node_info:
-                # Shorten things to less than 80 characters per line
-                data_node_info = node_info['data']['Node_info']
-                catchup_status = data_node_info['Catchup_status']
-                txns_in_catchup = catchup_status['Number_txns_in_catchup']
-            else:
-                # Shorten things to less than 80 characters per line
-                catchup_status = node_info['Node_info']['Catchup_status']
-                txns_in_catchup = catchup_status['Number_txns_in_catchup']
+            txns_in_catchup = catchup_status['Number_txns_in_catchup']
             # Get the number of catchup transactions
             catchup_transactions = txns_in_catchup['1']
             # Get the domain ledger status
@@ -1353,6 +1417,7 @@ def set_node_services_from_cli(genesis_file: str, alias: str, alias_did: str,
     :type ssh_config_file: str
     :return: bool
     """
+    invalidate_validator_info()
 
     # TODO: Decide if this should be a send_node_transaction abstraction instead
     #       of specifically for changing a nodes "services" attribute.
@@ -1720,6 +1785,57 @@ def promote_by_node_name(genesis_file: str, alias: str,
     return status
 
 
+def block_ports_by_node_names(aliases: List[str],
+    timeout: Union[str,int] = DEFAULT_CHAOS_LEDGER_TRANSACTION_TIMEOUT,
+    ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE) -> Union[bool,Dict[str,Dict[str,str]]]:
+    """
+    Block client and node ports on a set of nodes at once
+
+    Does the same as calling stop_by_strategy with StopStrategy.PORT for each
+    node, but all nodes are handled in one round of parallel sessions.
+    Validator info of each node must already be in the chaos temp dir.
+
+    Returns False if it fails on any node. Otherwise, a dictionary mapping each
+    alias to the details stop_by_strategy would return for it.
+
+    :param aliases: The node names/aliases. Required.
+    :type aliases: List[str]
+    :param timeout: How long to perform the operation before timing out.
+        Optional.
+        (Default: chaosindy.common.DEFAULT_CHAOS_LEDGER_TRANSACTION_TIMEOUT)
+    :type timeout: Union[str,int]
+    :param ssh_config_file: The relative or absolute path to the SSH config
+        file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SSH_CONFIG_FILE)
+    :type ssh_config_file: str
+    :return: Union[bool, Dict[str, Dict[str,str]]]
+    """
+    output_dir = get_chaos_temp_dir()
+    stopped_nodes = {}
+    commands = {}
+    for alias in aliases:
+        with open("{}/{}-validator-info".format(output_dir, alias), 'r') as vif:
+            node_info = json.load(vif)['Node_info']
+        details = {
+            "stop_strategy": StopStrategy.PORT.value,
+            "client_port": str(node_info['Client_port']),
+            "node_port": str(node_info['Node_port'])
+        }
+        stopped_nodes[alias] = details
+        commands[alias] = [
+            "iptables {}".format(iptables_drop_port_rule(details['client_port'])),
+            "iptables {}".format(iptables_drop_port_rule(details['node_port']))
+        ]
+
+    succeeded = execute_batch_by_node_name(commands, timeout=timeout,
+                                           ssh_config_file=ssh_config_file)
+    for alias in aliases:
+        if not succeeded[alias]:
+            logger.error("Failed to block %s", alias)
+            return False
+    return stopped_nodes
+
+
 def stop_by_strategy(genesis_file: str, alias: str, stop_strategy: int,
     timeout: Union[str,int] = DEFAULT_CHAOS_LEDGER_TRANSACTION_TIMEOUT,
     ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE) -> Union[bool,Dict[str,str]]:
@@ -2635,13 +2751,20 @@ def stop_n_nodes(genesis_file: str,
     elif selection_strategy == SelectionStrategy.FORWARD.value:
         node_selection = node_selection[0:number_of_nodes]
 
-    for node in node_selection:
-        details = stop_by_strategy(genesis_file, node, stop_strategy,
-                                   timeout=stop_node_timeout,
-                                   ssh_config_file=ssh_config_file)
-        if not details:
+    if stop_strategy == StopStrategy.PORT.value:
+        # Block ports on all selected nodes in one round of parallel sessions
+        stopped_nodes = block_ports_by_node_names(node_selection,
+            timeout=stop_node_timeout, ssh_config_file=ssh_config_file)
+        if not stopped_nodes:
             return False
-        stopped_nodes[node] = details
+    else:
+        for node in node_selection:
+            details = stop_by_strategy(genesis_file, node, stop_strategy,
+                                       timeout=stop_node_timeout,
+                                       ssh_config_file=ssh_config_file)
+            if not details:
+                return False
+            stopped_nodes[node] = details
 
     data = {
         'stopped_nodes': stopped_nodes
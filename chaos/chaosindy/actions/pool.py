@@ -8,6 +8,7 @@ from chaosindy.common import *
 from chaosindy.execute.execute import (FabricExecutor, ParallelFabricExecutor,
     NonDaemonicChaosPool)
 from chaosindy.actions.node import clean_by_node_name
+from chaosindy.probes.validator_info import invalidate_validator_info
 from logzero import logger
 from os.path import expanduser, join
 from time import sleep
@@ -84,6 +85,8 @@ def clean_pool(aliases: List[str],
         list_of_results = [False]
         with NonDaemonicChaosPool(processes=4) as pool:
             list_of_results = pool.map(_clean_pool_worker, arg_tuples)
+        # Workers invalidate their own copies of the cache only
+        invalidate_validator_info()
         if False in list_of_results:
             return False
 
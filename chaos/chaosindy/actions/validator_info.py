@@ -1,11 +1,12 @@
-import json
 from chaosindy.common import (
+    get_aliases,
     get_chaos_temp_dir,
     DEFAULT_CHAOS_SSH_CONFIG_FILE,
     true_list, false_list
 )
+from chaosindy.probes.validator_info import invalidate_validator_info
 from logzero import logger
-from os.path import expanduser, join
+from os.path import join
 from os import remove
 from shutil import rmtree
 
@@ -36,6 +37,7 @@ def delete_validator_info(genesis_file: str = None, cleanup: str = "True",
     :return: bool
     """
     output_dir = get_chaos_temp_dir()
+    invalidate_validator_info()
 
     if cleanup.lower() in false_list:
         logger.debug("Skipping cleanup. You will be expected to remove %s",
@@ -45,11 +47,8 @@ def delete_validator_info(genesis_file: str = None, cleanup: str = "True",
     if genesis_file:
         logger.debug("genesis_file: %s ssh_config_file: %s", genesis_file,
                      ssh_config_file)
-        # 1. Open genesis_file and load all aliases into an array
-        aliases = []
-        with open(expanduser(genesis_file), 'r') as genesisfile:
-            for line in genesisfile:
-                aliases.append(json.loads(line)['data']['alias'])
+        # 1. Load all aliases from the genesis file into an array
+        aliases = get_aliases(genesis_file)
         logger.debug(str(aliases))
 
         # 2. Delete validator info collected by the experiment
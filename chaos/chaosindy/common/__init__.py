@@ -2,10 +2,12 @@ import json
 import re
 import shutil
 import tempfile
+import threading
+from collections import namedtuple
 from enum import Enum
 from logzero import logger
-from os import makedirs
-from os.path import expanduser
+from os import makedirs, stat
+from os.path import abspath, expanduser
 from psutil import Process, NoSuchProcess
 
 from typing import Union, Dict, List
@@ -71,6 +73,81 @@ def remove_chaos_temp_dir(cleanup: bool = True) -> bool:
         logger.info("Skip removal of %s.", temp_dir)
     return True
 
+GenesisNode = namedtuple('GenesisNode', ['alias', 'dest', 'node_ip',
+                                         'node_port', 'client_ip',
+                                         'client_port', 'txn'])
+
+
+class GenesisIndex(object):
+    """
+    Parsed genesis transaction file with O(1) lookups by node alias.
+
+    Use get_genesis_index to get an index, it is parsed once and reused until
+    the genesis file changes. Indexes are shared, do not modify the
+    transactions they return.
+    """
+    def __init__(self, genesis_file: str):
+        self.genesis_file = genesis_file
+        self.aliases = []
+        self.nodes = {}
+        with open(genesis_file, 'r') as genesisfile:
+            for line in genesisfile:
+                if not line.strip():
+                    continue
+                txn = json.loads(line)
+                data = txn['txn']['data']
+                alias = data['data']['alias']
+                self.aliases.append(alias)
+                # The first transaction of an alias listed more than once is
+                # the one looked up, like get_info_by_node_name always did
+                self.nodes.setdefault(alias, GenesisNode(alias, data.get('dest'),
+                                                data['data'].get('node_ip'),
+                                                data['data'].get('node_port'),
+                                                data['data'].get('client_ip'),
+                                                data['data'].get('client_port'),
+                                                txn))
+
+    def get(self, alias: str) -> Union[GenesisNode,None]:
+        return self.nodes.get(alias)
+
+    def __contains__(self, alias: str) -> bool:
+        return alias in self.nodes
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+
+_genesis_indexes = {}
+_genesis_indexes_lock = threading.Lock()
+
+
+def get_genesis_index(genesis_file: str) -> GenesisIndex:
+    """
+    Get the parsed index of a genesis transaction file.
+
+    Indexes are memoised by path and modification time, so the file is parsed
+    again only if it changed since the previous call.
+
+    :param genesis_file: The relative or absolute path to a genesis transaction
+        file.
+        Required.
+    :type genesis_file: str
+    :return: GenesisIndex
+    """
+    path = abspath(expanduser(genesis_file))
+    st = stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    with _genesis_indexes_lock:
+        cached = _genesis_indexes.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+    logger.debug("Parsing genesis file %s", path)
+    index = GenesisIndex(path)
+    with _genesis_indexes_lock:
+        _genesis_indexes[path] = (version, index)
+    return index
+
+
 def get_info_by_node_name(genesis_file: str, node: str,
                           path: str = None) -> Union[Dict,None]:
     """
@@ -89,21 +166,15 @@ def get_info_by_node_name(genesis_file: str, node: str,
     :type node: str
     :return: Union[Dict,None]
     """
-    # Open genesis_file and return a node's info based on a json path
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            line_json = json.loads(line)
-            alias = line_json['txn']['data']['data']['alias']
-            if (alias == node):
-                if not path:
-                    return line_json['txn']['data']['data']
-                else:
-                    filters = path.split(".")
-                    return_json = line_json
-                    for f in filters:
-                        return_json = return_json[f]
-                    return return_json
-    return None
+    genesis_node = get_genesis_index(genesis_file).get(node)
+    if genesis_node is None:
+        return None
+    if not path:
+        return genesis_node.txn['txn']['data']['data']
+    return_json = genesis_node.txn
+    for f in path.split("."):
+        return_json = return_json[f]
+    return return_json
 
 
 def get_aliases(genesis_file: str) -> List[str]:
@@ -120,14 +191,7 @@ def get_aliases(genesis_file: str) -> List[str]:
 
     :return: List[str]
     """
-    aliases = []
-    # Open genesis_file and load all aliases into an array
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            line_json = json.loads(line)
-            alias = line_json['txn']['data']['data']['alias']
-            aliases.append(alias)
-    return aliases
+    return list(get_genesis_index(genesis_file).aliases)
 
 
 # TODO: Consider adding a return_line_count, which would be the number of lines
@@ -184,13 +248,10 @@ def get_indy_cli_command_output(output: str, match: str,
 class ValidatorInfoSource(Enum):
     """
     All possible sources (methods of retrieval) of validator info
-
-    The SDK option is not yet implemented. It is stubbed out in hopes that the
-    option will be available soon.
     """
     NODE = 1 # validator-info script executed on each node
     CLI = 2 # `ledger get-validator-info` executed via indy-cli
-    SDK = 3 # Not Yet Implemented - Use Indy SDK to get validator info
+    SDK = 3 # GET_VALIDATOR_INFO sent to all nodes using Indy SDK
 
     @classmethod
     def has_value(cls, value):
@@ -256,6 +317,8 @@ DEFAULT_CHAOS_LOAD_TIMEOUT=60
 DEFAULT_CHAOS_NODE_SERVICES="VALIDATOR"
 DEFAULT_CHAOS_PAUSE=60
 DEFAULT_CHAOS_POOL="chaosindy"
+# Number of pool ledger transactions requested at the same time
+DEFAULT_CHAOS_POOL_LEDGER_WINDOW=20
 DEFAULT_CHAOS_TRUSTEE_DICT = {
   1: {
       "seed": "000000000000000000000000Trustee1",
@@ -309,6 +372,10 @@ DEFAULT_CHAOS_SEED=DEFAULT_CHAOS_TRUSTEE_SEED
 
 DEFAULT_CHAOS_SSH_CONFIG_FILE="~/.ssh/config"
 DEFAULT_CHAOS_VALIDATOR_INFO_SOURCE=ValidatorInfoSource.CLI.value
+# Seconds validator info collected by a probe is reused by the following probes.
+# Nodes refresh their validator info every 60 seconds, so it may be that stale
+# anyway, but probes polling for a change (i.e. a view change) must see it.
+DEFAULT_CHAOS_VALIDATOR_INFO_TTL=5
 DEFAULT_CHAOS_WALLET_NAME="chaosindy"
 DEFAULT_CHAOS_MY_WALLET_NAME=DEFAULT_CHAOS_WALLET_NAME
 DEFAULT_CHAOS_THEIR_WALLET_NAME="their_"+DEFAULT_CHAOS_WALLET_NAME
@@ -24,21 +24,27 @@ def parse_payment_addresses(addresses: List[str], delimiter: str,
                             index: int) -> List[str]:
     return get_element_list(addresses, delimiter, index)
 
-def parse_payment_sources(sources: List[str]) -> Dict[str,Dict[str,Union[int,str]]]:
+def parse_payment_source_rows(rows: List[List[str]]) -> Dict[str,Dict[str,Union[int,str]]]:
+    # Rows of a 'ledger get-payment-sources' table:
+    # Source | Payment Address | Amount | Extra
     payment_sources = {}
-    for source in sources:
-        source_attributes = source.split("|")
+    for row in rows:
         # Convert amount to an int here for convenience later
-        amount = source_attributes[3].strip()
+        amount = row[2]
         if amount == '':
             amount = "0"
-        extra = source_attributes[4].strip()
+        extra = row[3]
         if extra == '':
             extra = "0"
-        payment_sources[source_attributes[1].strip()] = {
-            'payment_address': source_attributes[2].strip(),
+        payment_sources[row[0]] = {
+            'payment_address': row[1],
             'amount': int(amount),
             'extra': int(extra)
         }
     return payment_sources
+
+def parse_payment_sources(sources: List[str]) -> Dict[str,Dict[str,Union[int,str]]]:
+    return parse_payment_source_rows(
+        [[cell.strip() for cell in source.split("|")[1:]]
+         for source in sources])
 # End helper functions
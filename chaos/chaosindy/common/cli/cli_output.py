@@ -0,0 +1,199 @@
+"""
+Structured indy-cli output
+
+indy-cli output is parsed once, in a single pass over its lines, into the
+output of each command: its lines, tables and JSON bodies, and whether it
+failed.
+"""
+import json
+import re
+from collections import namedtuple
+
+from typing import List, Union
+
+ANSI_ESCAPE = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+# indy-cli prints errors in red, but may not colour its output when it does not
+# write to a terminal, so errors are also told by their text. Only indy-cli's
+# error messages match, not informational output like "NYM not found".
+ERROR = re.compile(r'\x1B\[(?:\d+;)*31m')
+ERROR_TEXT = re.compile(r'^(?:Invalid |Unknown |Unexpected |Error|'
+                        r'Transaction has been rejected|'
+                        r'Transaction response has not been received|'
+                        r'There is no (?:opened|active|connected) |'
+                        r'(?:Wallet|Pool|Pool config|Did) "[^"]*" '
+                        r'(?:not found|does not exist|already exists))')
+# Echo of a command: the prompt holding the open pool, wallet and did, followed
+# by the command
+COMMAND = re.compile(r'^(?:[\w-]+\([^)]*\):)*indy> (.*)$')
+BATCH_FAILED = re.compile(r'^Batch execution failed(?: at line (\d+))?')
+TABLE_BORDER = re.compile(r'^\+[-+]*\+$')
+
+CliTable = namedtuple('CliTable', ['header', 'rows'])
+# JSON found in the output, text is what indy-cli printed, value the parsed one
+CliJson = namedtuple('CliJson', ['text', 'value'])
+
+
+class CliCommandOutput(object):
+    """
+    Output of a single indy-cli command. Lines are stripped of ANSI escape
+    sequences.
+    """
+    def __init__(self, command: str):
+        self.command = command
+        self.lines = []
+        self.tables = []
+        self.json = []
+        self.failed = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def find_lines(self, match: str) -> List[str]:
+        """
+        Lines containing match.
+        """
+        return [line for line in self.lines if match in line]
+
+    def rows(self) -> List[List[str]]:
+        """
+        Rows of all tables of the command.
+        """
+        return [row for table in self.tables for row in table.rows]
+
+
+class CliOutput(object):
+    """
+    Output of an indy-cli batch, split into the output of each command.
+
+    Output printed before the first command (i.e. in interactive mode) goes to
+    a command named "".
+    """
+    def __init__(self):
+        self.commands = []
+        self.failed = False
+        self.failed_line = None
+
+    def find_commands(self, prefix: str) -> List[CliCommandOutput]:
+        """
+        Output of the commands starting with prefix, in the order they ran.
+        """
+        return [command for command in self.commands
+                if command.command.startswith(prefix)]
+
+    def find_lines(self, match: str) -> List[str]:
+        """
+        Lines of all commands containing match.
+        """
+        return [line for command in self.commands
+                for line in command.find_lines(match)]
+
+    def rows(self, prefix: str = "") -> List[List[str]]:
+        """
+        Rows of all tables of the commands starting with prefix.
+        """
+        return [row for command in self.find_commands(prefix)
+                for row in command.rows()]
+
+    def json(self, prefix: str = "") -> List[CliJson]:
+        """
+        JSON bodies of the commands starting with prefix.
+        """
+        return [body for command in self.find_commands(prefix)
+                for body in command.json]
+
+
+def is_error_line(line: str) -> bool:
+    """
+    Is a line of indy-cli output an error message?
+
+    JSON bodies and table rows are never error messages, whatever they hold.
+
+    :param line: A line of indy-cli output, may contain ANSI escape sequences.
+        Required.
+    :type line: str
+    :return: bool
+    """
+    if ERROR.search(line):
+        return True
+    line = ANSI_ESCAPE.sub('', line).strip()
+    return not line.startswith(('{', '[', '|')) and bool(ERROR_TEXT.match(line))
+
+
+def _parse_json(line: str) -> Union[CliJson,None]:
+    if not line or line[0] not in '{[':
+        return None
+    try:
+        return CliJson(line, json.loads(line))
+    except ValueError:
+        return None
+
+
+def _table_cells(line: str) -> List[str]:
+    return [cell.strip() for cell in line[1:-1].split("|")]
+
+
+def parse_cli_output(output: Union[bytes,str]) -> CliOutput:
+    """
+    Parse the output of indy-cli into the output of each command.
+
+    :param output: STDOUT of indy-cli, i.e. CliReturn.std_out
+        Required.
+    :type output: Union[bytes,str]
+    :return: CliOutput
+    """
+    if isinstance(output, bytes):
+        output = output.decode(errors='replace')
+
+    cli_output = CliOutput()
+    command = None
+    # Table being parsed, None outside of tables
+    table = None
+
+    for raw_line in output.splitlines():
+        line = ANSI_ESCAPE.sub('', raw_line).rstrip()
+
+        match = COMMAND.match(line)
+        if match:
+            command = CliCommandOutput(match.group(1).strip())
+            cli_output.commands.append(command)
+            table = None
+            continue
+
+        match = BATCH_FAILED.match(line)
+        if match:
+            cli_output.failed = True
+            if match.group(1):
+                cli_output.failed_line = int(match.group(1))
+            if command is not None:
+                command.failed = True
+            continue
+
+        if command is None:
+            command = CliCommandOutput("")
+            cli_output.commands.append(command)
+        command.lines.append(line)
+        if is_error_line(raw_line):
+            command.failed = True
+
+        stripped = line.strip()
+        if TABLE_BORDER.match(stripped):
+            # Borders also separate the header and rows, the table ends at the
+            # first line which is not part of it
+            if table is None:
+                table = CliTable([], [])
+                command.tables.append(table)
+            continue
+        if table is not None and stripped.startswith("|"):
+            if not table.header:
+                table.header.extend(_table_cells(stripped))
+            else:
+                table.rows.append(_table_cells(stripped))
+            continue
+        table = None
+
+        body = _parse_json(stripped)
+        if body is not None:
+            command.json.append(body)
+
+    return cli_output
@@ -1,62 +1,599 @@
+import atexit
+import fcntl
 import os
-import glob
+import re
+import selectors
 import subprocess
+import tempfile
+import threading
 import time
-from collections import namedtuple
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
 from logzero import logger
 
+from chaosindy.common.cli.cli_output import (BATCH_FAILED, is_error_line,
+    parse_cli_output)
+
+from typing import Iterator, List, Tuple
+
 CLI_CMD_NAME = "indy-cli"
 
+# Seconds a single command may take in a persistent CLI session
+DEFAULT_CLI_SESSION_TIMEOUT = 120
 
-CliReturn = namedtuple('cli_rtn', 'std_out std_err return_code')
 
+# output is std_out parsed by parse_cli_output
+CliReturn = namedtuple('cli_rtn', 'std_out std_err return_code output')
+# Output of a single command run in a CliSession. Commands the session did not
+# have to run (i.e. opening the wallet which is already open) are skipped.
+CliCommandResult = namedtuple('CliCommandResult',
+                              ['command', 'output', 'failed', 'skipped'])
 
-class CliRunner:
-    def __init__(self, output_dir, cli_cmd_name: str=CLI_CMD_NAME):
-        self.output_dir = output_dir
+
+class CliSessionError(Exception):
+    """
+    Raised when the indy-cli process of a CliSession dies or does not respond
+    """
+    pass
+
+
+class CliSession(object):
+    """
+    A long-lived indy-cli process commands are streamed to.
+
+    indy-cli may print neither a prompt nor colours when its stdin is not a
+    terminal, so each command is followed by a 'show' of a marker file and its
+    output is read until the marker is printed. Prompts and echoed commands
+    are stripped from the output. Failed commands are detected from the error
+    messages of indy-cli (see is_error_line), or by the CLI exiting with
+    "Batch execution failed" like it does when it runs commands from a pipe.
+
+    The session keeps the wallet, did and pool opened by batches open, so
+    following batches opening the same wallet and pool, using the same did, or
+    loading the same plugin, skip those commands. A batch runs under the
+    session lock, so batches of different threads never interleave. Use
+    get_cli_session to share sessions.
+    """
+    ANSI_ESCAPE = re.compile(rb'\x1B\[[0-?]*[ -/]*[@-~]')
+    PROMPT = re.compile(rb'^(?:[\w-]+\([^)]*\):)*indy> ?')
+
+    def __init__(self, cli_cmd_name: str = CLI_CMD_NAME,
+                 timeout: int = DEFAULT_CLI_SESSION_TIMEOUT):
         self.cli_cmd_name = cli_cmd_name
+        self.timeout = timeout
+        self._process = None
+        self._marker = None
+        self._marker_file = None
+        # Command printing the marker
+        self._show_marker = None
+        # Output read past the marker of the previous command
+        self._buffer = b''
+        self._lock = threading.Lock()
+        self._reset_state()
 
-    def _create_batch_file_name(self):
-        return "cli-batch-" + str(time.time()).replace(".", "-", 1)
+    def _reset_state(self):
+        self.wallet = None
+        self.did = None
+        self.pool = None
+        self.plugins = set()
 
-    def _find_available_batch_name(self, run_name, num_modifier=0):
-        # if num_modifier > 0:
-        #     run_name = run_name + "-" + str(num_modifier).zfill(2)
+    def _start(self):
+        logger.debug("Starting %s session", self.cli_cmd_name)
+        self._buffer = b''
+        self._marker = "chaosindy-cli-marker-{}".format(uuid.uuid4().hex)
+        fd, self._marker_file = tempfile.mkstemp(prefix="chaosindy-cli-")
+        with os.fdopen(fd, 'w') as f:
+            f.write(self._marker + "\n")
+        self._show_marker = "show {}".format(self._marker_file)
+        self._process = subprocess.Popen([self.cli_cmd_name],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT,
+                                         bufsize=0)
+        # Wait for the CLI to be ready, dropping its greeting
+        self._send(self._show_marker)
+        output, exited = self._read_until_marker()
+        if exited:
+            raise CliSessionError("{} exited: {}".format(
+                self.cli_cmd_name, output.decode(errors='replace')))
 
-        name_to_test = run_name if not num_modifier > 0 else run_name + "-" + str(num_modifier).zfill(2)
+    def _send(self, command: str):
+        try:
+            self._process.stdin.write((command + "\n").encode())
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            # The CLI exited (i.e. on a failed command), which is told by
+            # reading its output to the end
+            pass
 
-        if len(glob.glob(os.path.join(self.output_dir, name_to_test)+"*")) != 0:
-            return self._find_available_batch_name(run_name, num_modifier=num_modifier+1)
-        else:
-            return name_to_test
+    def _read_until_marker(self) -> Tuple[bytes, bool]:
+        # Returns the output and whether the CLI exited because of a failure
+        output = self._buffer
+        self._buffer = b''
+        marker = self._marker.encode()
+        searched = 0
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._process.stdout, selectors.EVENT_READ)
+            while True:
+                # Only the new output is searched, it is not rescanned for
+                # each chunk
+                found = output.find(marker, searched)
+                if found != -1:
+                    line_end = output.find(b'\n', found)
+                    if line_end != -1:
+                        self._buffer = output[line_end + 1:]
+                        # A prompt may precede the marker on its line
+                        return output[:output.rfind(b'\n', 0, found) + 1], \
+                            False
+                else:
+                    searched = max(0, len(output) - len(marker))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    self._kill()
+                    raise CliSessionError("{} did not respond in {} " \
+                        "seconds".format(self.cli_cmd_name, self.timeout))
+                chunk = os.read(self._process.stdout.fileno(), 65536)
+                if not chunk:
+                    self._kill()
+                    if any(BATCH_FAILED.match(line.decode(errors='replace'))
+                           for line, _ in self._strip_prompts(output)):
+                        return output, True
+                    raise CliSessionError("{} exited".format(
+                        self.cli_cmd_name))
+                output += chunk
+
+    def _strip_prompts(self, output: bytes) -> Iterator[Tuple[bytes, bool]]:
+        # Yields the lines of the output and whether a prompt was stripped
+        for line in output.split(b'\n'):
+            plain = self.ANSI_ESCAPE.sub(b'', line)
+            match = self.PROMPT.match(plain)
+            if match:
+                yield plain[match.end():], True
+            else:
+                yield line, False
+
+    def _clean_output(self, output: bytes, command: str) -> bytes:
+        # Drops prompts and the echo of the command and of the marker 'show'
+        echoes = (command.encode(), b'', self._show_marker.encode())
+        return b'\n'.join(line for line, prompted in self._strip_prompts(output)
+                          if not (prompted and line.strip() in echoes))
+
+    def _kill(self):
+        # Wallets, dids and pools are gone with the process
+        self._reset_state()
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        if self._marker_file is not None:
+            try:
+                os.remove(self._marker_file)
+            except FileNotFoundError:
+                pass
+            self._marker_file = None
+
+    def _run(self, command: str) -> CliCommandResult:
+        if self._process is None or self._process.poll() is not None:
+            self._kill()
+            self._start()
+        self._send(command)
+        self._send(self._show_marker)
+        output, exited = self._read_until_marker()
+        output = self._clean_output(output, command)
+        failed = exited or any(is_error_line(line) for line in
+                               output.decode(errors='replace').splitlines())
+        return CliCommandResult(command, output, failed, False)
+
+    def execute(self, command: str) -> CliCommandResult:
+        """
+        Run a single command, skipping it if the session is already in the
+        state it leads to.
+
+        :param command: An indy-cli command.
+            Required.
+        :type command: str
+        :return: CliCommandResult
+        """
+        with self._lock:
+            return self._execute(command)
+
+    def _execute(self, command: str) -> CliCommandResult:
+        command = command.strip()
+        words = command.split()
+        if not words or words[0].startswith('#') or words == ['exit']:
+            return CliCommandResult(command, b'', False, True)
+
+        if words[:2] == ['wallet', 'open'] and len(words) > 2:
+            if self.wallet == words[2]:
+                return CliCommandResult(command, b'', False, True)
+            if self.wallet is not None:
+                self._close_wallet()
+            result = self._run(command)
+            if not result.failed:
+                self.wallet = words[2]
+            return result
+
+        if words[:2] == ['did', 'use'] and len(words) > 2:
+            if self.did == words[2]:
+                return CliCommandResult(command, b'', False, True)
+            result = self._run(command)
+            self.did = None if result.failed else words[2]
+            return result
+
+        if words[:2] == ['pool', 'connect'] and len(words) > 2:
+            if self.pool == words[2]:
+                return CliCommandResult(command, b'', False, True)
+            if self.pool is not None:
+                self._run("pool disconnect")
+                self.pool = None
+            result = self._run(command)
+            if not result.failed:
+                self.pool = words[2]
+            return result
+
+        # Wallets and pools are kept open for the following batches
+        if words in (['wallet', 'close'], ['pool', 'disconnect']):
+            return CliCommandResult(command, b'', False, True)
+
+        if words[0] == 'load-plugin':
+            if command in self.plugins:
+                return CliCommandResult(command, b'', False, True)
+            result = self._run(command)
+            if not result.failed:
+                self.plugins.add(command)
+            return result
+
+        return self._run(command)
+
+    def _close_wallet(self):
+        # Closing the wallet also drops the did in use
+        self._run("wallet close")
+        self.wallet = None
+        self.did = None
+
+    def run_batch(self, batch: str) -> List[CliCommandResult]:
+        """
+        Run the commands of a batch one by one, stopping at the first failed
+        one like indy-cli does in batch mode.
+
+        The batch holds the session until it completes. Like in batch mode, it
+        starts without a did in use: a did used by a previous batch is dropped
+        unless the batch uses a did itself.
+
+        :param batch: Commands, one per line (see BatchBuilder).
+            Required.
+        :type batch: str
+        :return: List[CliCommandResult] - results of the commands which ran
+        """
+        lines = batch.split("\n")
+        results = []
+        with self._lock:
+            if self.did is not None and self._process is not None and \
+                    not any(line.split()[:2] == ['did', 'use']
+                            for line in lines):
+                self._close_wallet()
+            for line in lines:
+                result = self._execute(line)
+                results.append(result)
+                if result.failed:
+                    break
+        return results
+
+    def close(self):
+        """
+        Exit the indy-cli process.
+        """
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._send("exit")
+                self._process.wait(timeout=10)
+            except Exception as e:
+                logger.debug("Failed to exit %s session: %s",
+                             self.cli_cmd_name, e)
+            self._kill()
+
+
+_cli_sessions = {}
+_cli_sessions_lock = threading.Lock()
+
+
+def get_cli_session(cli_cmd_name: str = CLI_CMD_NAME) -> CliSession:
+    """
+    Get the CliSession shared by all persistent CliRunners using the same CLI.
+    """
+    with _cli_sessions_lock:
+        session = _cli_sessions.get(cli_cmd_name)
+        if session is None:
+            session = CliSession(cli_cmd_name)
+            _cli_sessions[cli_cmd_name] = session
+        return session
+
+
+def close_cli_sessions():
+    """
+    Close all sessions returned by get_cli_session.
+    """
+    with _cli_sessions_lock:
+        sessions = list(_cli_sessions.values())
+        _cli_sessions.clear()
+    for session in sessions:
+        session.close()
 
 
-    def run(self, batch: str, run_name: str=None):
+def _forget_cli_sessions():
+    # A forked child shares the pipes of the parent's sessions, so it starts
+    # its own sessions instead of using (or exiting) them
+    global _cli_sessions, _cli_sessions_lock
+    _cli_sessions = {}
+    _cli_sessions_lock = threading.Lock()
+
+
+atexit.register(close_cli_sessions)
+os.register_at_fork(after_in_child=_forget_cli_sessions)
+
+
+class BatchIndex(object):
+    """
+    Names the batches run in an output directory and keeps an index of them.
+
+    Batch names are '<run name>-<sequence number>'. A name is reserved by
+    creating its '.cli.in' file exclusively, so runners in different processes
+    never get the same name, and the directory is never scanned. Reserved
+    names are appended to an index file, which allows looking batches up by
+    run name and is read once per process to carry on the sequence. Processes
+    update the index file under a lock file.
+
+    If max_batches is set, only the newest max_batches batches of the index
+    are retained: the files of older ones are removed once there are more of
+    them, and the index file is compacted to the retained batches when it
+    grows past twice their number. Retention is set when the index is created.
+    """
+    INDEX_FILE_NAME = "cli-batches.index"
+    LOCK_FILE_NAME = "cli-batches.lock"
+
+    def __init__(self, output_dir: str, max_batches: int = None):
+        self.output_dir = output_dir
+        self._max_batches = max_batches
+        self._index_file = os.path.join(output_dir, self.INDEX_FILE_NAME)
+        self._lock_file = os.path.join(output_dir, self.LOCK_FILE_NAME)
+        self._lock = threading.Lock()
+        # Batch name -> run name, oldest first
+        self._batches = OrderedDict()
+        # Run name -> batch names, oldest first
+        self._runs = {}
+        self._next_seq_no = 1
+        # Entries in the index file, retained or not
+        self._index_size = 0
+        with self._locked_index():
+            self._load()
+
+    @property
+    def max_batches(self) -> int:
+        return self._max_batches
+
+    @contextmanager
+    def _locked_index(self):
+        with open(self._lock_file, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self) -> List[Tuple[int, str, str]]:
+        entries = []
+        try:
+            with open(self._index_file, 'r') as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) != 3:
+                        continue
+                    seq_no, run_name, batch_name = fields
+                    entries.append((int(seq_no), run_name, batch_name))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _load(self):
+        # The index is trusted, batch files are not checked. Only the newest
+        # entries are retained, the older ones are removed by whichever
+        # process reserved the batches past them.
+        entries = self._read_index()
+        self._index_size = len(entries)
+        self._batches.clear()
+        self._runs.clear()
+        entries.sort()
+        if entries:
+            self._next_seq_no = max(self._next_seq_no, entries[-1][0] + 1)
+        if self._max_batches:
+            entries = entries[-self._max_batches:]
+        for _, run_name, batch_name in entries:
+            self._add(batch_name, run_name)
+
+    def _add(self, batch_name: str, run_name: str):
+        self._batches[batch_name] = run_name
+        self._runs.setdefault(run_name, deque()).append(batch_name)
+
+    def batch_file_path(self, batch_name: str, suffix: str) -> str:
+        return os.path.join(self.output_dir, batch_name + suffix)
+
+    def reserve(self, run_name: str) -> str:
+        """
+        Reserve a new batch name for a run, creating its empty '.cli.in'
+        file.
+
+        :param run_name: Name of the run, i.e. "indy-cli-create-pool".
+            Required.
+        :type run_name: str
+        :return: str - the batch name
+        """
+        with self._lock, self._locked_index():
+            while True:
+                seq_no = self._next_seq_no
+                self._next_seq_no += 1
+                batch_name = "{}-{}".format(run_name, str(seq_no).zfill(5))
+                try:
+                    fd = os.open(self.batch_file_path(batch_name, ".cli.in"),
+                                 os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    # Reserved by another process since the index was read
+                    continue
+                os.close(fd)
+                break
+            with open(self._index_file, 'a') as f:
+                f.write("{}\t{}\t{}\n".format(seq_no, run_name, batch_name))
+            self._index_size += 1
+            self._add(batch_name, run_name)
+            self._prune()
+        return batch_name
+
+    def _prune(self):
+        if not self._max_batches:
+            return
+        while len(self._batches) > self._max_batches:
+            batch_name, run_name = self._batches.popitem(last=False)
+            runs = self._runs[run_name]
+            runs.popleft()
+            if not runs:
+                del self._runs[run_name]
+            self._remove_files(batch_name)
+        if self._index_size > 2 * self._max_batches:
+            self._compact()
+
+    def _remove_files(self, batch_name: str):
+        for suffix in (".cli.in", ".cli.out"):
+            try:
+                os.remove(self.batch_file_path(batch_name, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _compact(self):
+        # Rewrites the index with the retained batches. It is read again, as
+        # other processes may have appended batches this one does not know.
+        entries = sorted(self._read_index())
+        for _, _, batch_name in entries[:-self._max_batches]:
+            self._remove_files(batch_name)
+        entries = entries[-self._max_batches:]
+        compacted_file = self._index_file + ".tmp"
+        with open(compacted_file, 'w') as f:
+            for entry in entries:
+                f.write("{}\t{}\t{}\n".format(*entry))
+        os.replace(compacted_file, self._index_file)
+        self._load()
+
+    def find(self, run_name: str) -> List[str]:
+        """
+        Names of the retained batches of a run, oldest first.
+
+        :param run_name: Name of the run.
+            Required.
+        :type run_name: str
+        :return: List[str]
+        """
+        with self._lock:
+            return list(self._runs.get(run_name, []))
+
+
+_batch_indexes = {}
+_batch_indexes_lock = threading.Lock()
+
+
+def get_batch_index(output_dir: str, max_batches: int = None) -> BatchIndex:
+    """
+    Get the BatchIndex of an output directory, shared by all CliRunners using
+    it. Retention is set by the runner creating the index, max_batches of
+    later runners is ignored.
+    """
+    key = os.path.abspath(output_dir)
+    with _batch_indexes_lock:
+        index = _batch_indexes.get(key)
+        if index is None:
+            index = BatchIndex(output_dir, max_batches=max_batches)
+            _batch_indexes[key] = index
+        elif max_batches is not None and max_batches != index.max_batches:
+            logger.warning("Batch index of %s retains %s batches, ignoring " \
+                           "max_batches %s", output_dir, index.max_batches,
+                           max_batches)
+    return index
+
+
+class CliRunner:
+    # Run batches in a shared CliSession instead of an indy-cli process per
+    # batch, unless told otherwise when created
+    persistent_default = False
+
+    def __init__(self, output_dir, cli_cmd_name: str=CLI_CMD_NAME,
+                 persistent: bool=None, max_batches: int=None):
+        self.output_dir = output_dir
+        self.cli_cmd_name = cli_cmd_name
+        self.batch_index = get_batch_index(output_dir,
+                                           max_batches=max_batches)
+        if persistent is None:
+            persistent = CliRunner.persistent_default
+        self.persistent = persistent
+
+    def find_batches(self, run_name: str) -> List[str]:
+        """
+        Paths of the '.cli.out' files of the retained batches of a run,
+        oldest first.
+        """
+        return [self.batch_index.batch_file_path(batch_name, ".cli.out")
+                for batch_name in self.batch_index.find(run_name)]
+
+    def _run_in_session(self, batch: str) -> Tuple[bytes, bytes, int]:
+        try:
+            results = get_cli_session(self.cli_cmd_name).run_batch(batch)
+        except CliSessionError as e:
+            logger.error("CLI session failed: %s", e)
+            return "Batch execution failed: {}\n".format(e).encode(), b'', 1
+        # Build a transcript like the one of indy-cli in batch mode, so the
+        # output is checked the same way
+        std_out = b''
+        for result in results:
+            if not result.skipped:
+                std_out += "indy> {}\n".format(result.command).encode()
+                std_out += result.output
+        if results and results[-1].failed:
+            std_out += "Batch execution failed at line {}\n".format(
+                len(results)).encode()
+            return std_out, b'', 1
+        return std_out, b'', 0
+
+    def run(self, batch: str, run_name: str=None) -> CliReturn:
         logger.info("Running batch. name: %s", run_name)
 
         if run_name is None:
-            run_name = self._create_batch_file_name()
+            run_name = "cli-batch"
 
-        run_name = self._find_available_batch_name(run_name)
+        batch_name = self.batch_index.reserve(run_name)
 
-        full_batch_file_path = os.path.join(self.output_dir, run_name+".cli.in")
+        full_batch_file_path = self.batch_index.batch_file_path(batch_name,
+                                                                ".cli.in")
         with open(full_batch_file_path, "w") as f:
             f.write(batch)
             f.flush()
             logger.debug("Batch file written to: %s", full_batch_file_path)
 
-        p = subprocess.run([self.cli_cmd_name, full_batch_file_path],
-                           stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE,
-                           shell=False,
-                           check=False
-                           )
+        if self.persistent:
+            std_out, std_err, return_code = self._run_in_session(batch)
+        else:
+            p = subprocess.run([self.cli_cmd_name, full_batch_file_path],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               shell=False,
+                               check=False
+                               )
 
-        std_out = p.stdout
-        std_err = p.stderr
-        return_code = p.returncode
+            std_out = p.stdout
+            std_err = p.stderr
+            return_code = p.returncode
 
-        stdout_file_path = os.path.join(self.output_dir, run_name+".cli.out")
+        stdout_file_path = self.batch_index.batch_file_path(batch_name,
+                                                            ".cli.out")
 
         with open(stdout_file_path, "wb") as f:
             f.write(std_out)
@@ -64,4 +601,5 @@ class CliRunner:
             logger.debug("CLI stdout written to: %s", stdout_file_path)
 
 
-        return CliReturn(std_out, std_err, return_code)
\ No newline at end of file
+        return CliReturn(std_out, std_err, return_code,
+                         parse_cli_output(std_out))
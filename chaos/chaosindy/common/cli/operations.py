@@ -1,8 +1,8 @@
 """
 Common operations for CLI strategy
 """
-from chaosindy.common import get_indy_cli_command_output
 from chaosindy.common.cli import *
+from chaosindy.common.cli.cli_output import CliOutput
 from chaosindy.common.cli.batch_builder import BatchBuilder
 from chaosindy.common.cli.cli_runner import CliRunner
 from chaosindy.common.cli.commands import cmd_open_wallet, \
@@ -26,11 +26,8 @@ class BatchExecutionFailedException(Error):
    """
    pass
 
-def batch_execution_failed(std_out):
-    status = get_indy_cli_command_output(std_out,
-                                         "Batch execution failed",
-                                         return_line_offset=0)
-    if status:
+def batch_execution_failed(output: CliOutput):
+    if output.failed:
         logger.warn("CLI batch execution failed, see out file for more info")
         return True
     else:
@@ -56,11 +53,11 @@ def cli_create_pool(output_dir,
     batch_str = batch.build()
 
     runner = CliRunner(output_dir)
-    std_out = runner.run(batch_str, "indy-cli-create-pool").std_out
+    output = runner.run(batch_str, "indy-cli-create-pool").output
 
-    if batch_execution_failed(std_out):
-        pool_already_exists = get_indy_cli_command_output(std_out,
-            "\"{}\" already exists".format(pool_name), return_line_offset=0)
+    if batch_execution_failed(output):
+        pool_already_exists = output.find_lines(
+            "\"{}\" already exists".format(pool_name))
         if not pool_already_exists:
             return False
 
@@ -86,12 +83,11 @@ def cli_create_wallet(output_dir,
     batch_str = batch.build()
 
     runner = CliRunner(output_dir)
-    std_out = runner.run(batch_str, "indy-cli-create-wallet").std_out
+    output = runner.run(batch_str, "indy-cli-create-wallet").output
 
-    if batch_execution_failed(std_out):
-        wallet_already_exists = get_indy_cli_command_output(
-            std_out, "\"{}\" already exists".format(wallet_name),
-            return_line_offset=0)
+    if batch_execution_failed(output):
+        wallet_already_exists = output.find_lines(
+            "\"{}\" already exists".format(wallet_name))
         if not wallet_already_exists:
             return False
 
@@ -122,9 +118,9 @@ def cli_create_local_did(output_dir: str,
     batch_str = batch.build()
 
     runner = CliRunner(output_dir)
-    std_out = runner.run(batch_str, "indy-cli-create-local-did").std_out
+    output = runner.run(batch_str, "indy-cli-create-local-did").output
 
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         return False
 
     return True
@@ -169,9 +165,9 @@ def cli_create_ledger_did(output_dir: str,
     batch_str = batch.build()
 
     runner = CliRunner(output_dir)
-    std_out = runner.run(batch_str, "indy-cli-create-ledger-did").std_out
+    output = runner.run(batch_str, "indy-cli-create-ledger-did").output
 
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         return False
 
     return True
@@ -208,9 +204,9 @@ def cli_create_payment_address(output_dir: str,
     batch_str = batch.build()
 
     runner = CliRunner(output_dir)
-    std_out = runner.run(batch_str, "indy-cli-create-payment-address").std_out
+    output = runner.run(batch_str, "indy-cli-create-payment-address").output
 
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         return False
 
     return True
@@ -253,13 +249,14 @@ def cli_mint_tokens(output_dir: str,
 
     batch_str = batch.build()
 
-    std_out = CliRunner(output_dir).run(batch_str,
-                                        "indy-cli-prepare-mint").std_out
+    output = CliRunner(output_dir).run(batch_str,
+                                       "indy-cli-prepare-mint").output
 
-    mint_txn = get_indy_cli_command_output(std_out,
-                                           "MINT transaction has been created:")
-    if isinstance(mint_txn, str):
-        mint_txn = mint_txn.strip()
+    # The MINT transaction is printed as JSON
+    mint_txn = None
+    for body in output.json("ledger mint-prepare"):
+        mint_txn = body.text
+        break
 
     for trustee_did in trustee_did_list:
         batch = BatchBuilder()
@@ -270,17 +267,17 @@ def cli_mint_tokens(output_dir: str,
 
         batch_str = batch.build()
 
-        std_out = CliRunner(output_dir).run(batch_str,
-                                            "indy-cli-sign-mint").std_out
+        output = CliRunner(output_dir).run(batch_str,
+                                           "indy-cli-sign-mint").output
 
-        if batch_execution_failed(std_out):
+        if batch_execution_failed(output):
             return False
 
-        mint_txn = get_indy_cli_command_output(std_out,
-                                               "Transaction has been signed",
-                                               return_line_offset=1)
-        if isinstance(mint_txn, str):
-            mint_txn = mint_txn.strip()
+        # The signed transaction is printed as JSON
+        mint_txn = None
+        for body in output.json("ledger sign-multi"):
+            mint_txn = body.text
+            break
 
     batch = BatchBuilder()
     with cmd_open_pool_and_wallet(batch,
@@ -292,10 +289,10 @@ def cli_mint_tokens(output_dir: str,
 
     batch_str = batch.build()
 
-    std_out = CliRunner(output_dir).run(batch_str,
-                                        "indy-cli-submit-mint").std_out
+    output = CliRunner(output_dir).run(batch_str,
+                                       "indy-cli-submit-mint").output
 
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         return False
 
     return True
@@ -326,17 +323,14 @@ def cli_get_payment_addresses(output_dir: str,
 
     batch_str = batch.build()
 
-    std_out = CliRunner(output_dir).run(batch_str,
-                                        "indy-cli-payment-address-list").std_out
+    output = CliRunner(output_dir).run(batch_str,
+                                       "indy-cli-payment-address-list").output
 
-    payment_address_list = []
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         raise BatchExecutionFailedException
-    else:
-        payment_address_list = get_indy_cli_command_output(std_out,
-            "{}:{}:".format(payment_scheme, payment_method),
-            return_line_offset=0, multi=True)
-    return parse_payment_addresses(payment_address_list, "|", 1)
+    prefix = "{}:{}:".format(payment_scheme, payment_method)
+    return [row[0] for row in output.rows("payment-address list")
+            if row and row[0].startswith(prefix)]
 
 
 def cli_generate_payment_addresses(output_dir: str,
@@ -372,16 +366,13 @@ def cli_generate_payment_addresses(output_dir: str,
 
     batch_str = batch.build()
 
-    std_out = CliRunner(output_dir).run(batch_str,
-        "indy-cli-payment-address-generate").std_out
+    output = CliRunner(output_dir).run(batch_str,
+        "indy-cli-payment-address-generate").output
 
-    payment_address_generate = []
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         raise BatchExecutionFailedException
-    else:
-        payment_address_generate = get_indy_cli_command_output(std_out,
-            "Payment Address has been created", return_line_offset=0,
-            multi=True)
+    payment_address_generate = output.find_lines(
+        "Payment Address has been created")
     return parse_payment_addresses(payment_address_generate, "\"", 1)
 
 
@@ -426,14 +417,12 @@ def cli_get_payment_sources(output_dir: str,
 
     batch_str = batch.build()
 
-    std_out = CliRunner(output_dir).run(batch_str,
-                                        "indy-cli-payment-sources-get").std_out
+    output = CliRunner(output_dir).run(batch_str,
+                                       "indy-cli-payment-sources-get").output
 
-    payment_address_sources = []
-    if batch_execution_failed(std_out):
+    if batch_execution_failed(output):
         raise BatchExecutionFailedException
-    else:
-        payment_address_sources = get_indy_cli_command_output(std_out,
-            "txo:{}".format(payment_method), return_line_offset=0,
-            multi=True)
-    return parse_payment_sources(payment_address_sources)
+    prefix = "txo:{}".format(payment_method)
+    return parse_payment_source_rows(
+        [row for row in output.rows("ledger get-payment-sources")
+         if row and row[0].startswith(prefix)])
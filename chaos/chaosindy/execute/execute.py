@@ -1,23 +1,246 @@
 import abc
+import atexit
 import os
+import re
 import json
+import shlex
+import socket
+import time
+import uuid
+import threading
 import multiprocessing
 import multiprocessing.pool
+import concurrent.futures
 
 from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from logzero import logger
-from multiprocessing import Pool, Process, Queue, Manager, cpu_count
+from multiprocessing import Process, Queue
 from queue import Empty
 
 from fabric import Connection, Config
-from paramiko import AuthenticationException
+from invoke import Context
+from invoke.exceptions import CommandTimedOut
+from paramiko import AuthenticationException, SSHException
 
-from typing import List
+from typing import Dict, Iterator, List
 
 Result = namedtuple('Result', ['return_code', 'stdout', 'stderr'])
 ParallelResult = namedtuple('ParallelResult',
                             ['host', 'return_code', 'stdout', 'stderr'])
+# Result of a single command of a batch, elapsed is in seconds
+CommandResult = namedtuple('CommandResult',
+                           ['command', 'return_code', 'stdout', 'stderr',
+                            'elapsed'])
+# Results of a batch on a host. Commands which were not run (i.e. after a
+# failed one) have no results. Error is set if the batch itself failed.
+BatchResult = namedtuple('BatchResult', ['host', 'results', 'elapsed', 'error'])
+
+# Number of hosts ParallelFabricExecutor works with at the same time
+DEFAULT_PARALLEL_FAN_OUT = 25
+# Seconds to wait for an SSH connection to a host
+DEFAULT_CONNECT_TIMEOUT = 60
+# Seconds an action (or each command of a batch) may run on a host when
+# executed by ParallelFabricExecutor
+DEFAULT_PARALLEL_TIMEOUT = 300
+
+
+class ConnectionPool(object):
+    """
+    A pool of long-lived Fabric connections.
+
+    One connection is kept per (ssh config, host, user, connect kwargs,
+    connect timeout), so executors created by every chaos action share already
+    established SSH sessions instead of doing a full handshake per command.
+    Connections are kept alive with SSH keepalive packets, checked before use
+    and reopened when they are found dead. A connection is used by one thread
+    at a time.
+    """
+    def __init__(self, keepalive: int = 30):
+        self._keepalive = keepalive
+        self._connections = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host, ssh_config_file, user, connect_kwargs, connect_timeout,
+             connection_class):
+        return (host, ssh_config_file, user,
+                json.dumps(connect_kwargs, sort_keys=True), connect_timeout,
+                connection_class)
+
+    @contextmanager
+    def connection(self, host: str, config: Config, ssh_config_file: str = None,
+                   user: str = None, connect_kwargs: dict = None,
+                   connect_timeout: int = None,
+                   connection_class: type = None) -> Iterator[Connection]:
+        """
+        Use an open connection to a host, reconnecting if the pooled one is
+        not alive.
+
+        The connection is held until the with block exits, so no other thread
+        runs commands on it, reconnects or discards it meanwhile. A failed
+        reconnect is retried once, unless it timed out or failed to
+        authenticate. Errors of the with block are never retried, as commands
+        may not be safe to run twice. A connection failing with an SSH or
+        socket error is closed, to be reopened on the next use.
+        """
+        connection_class = connection_class or Connection
+        key = self._key(host, ssh_config_file, user, connect_kwargs,
+                        connect_timeout, connection_class)
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = connection_class(host, config=config, user=user,
+                                              connect_timeout=connect_timeout,
+                                              connect_kwargs=connect_kwargs)
+                self._connections[key] = connection
+                self._locks[key] = threading.Lock()
+            lock = self._locks[key]
+
+        with lock:
+            self._ensure_open(connection)
+            try:
+                yield connection
+            except (SSHException, EOFError, socket.error):
+                self.discard(connection)
+                raise
+
+    def discard(self, connection: Connection):
+        """
+        Close a connection so it is reopened on the next use.
+        """
+        try:
+            connection.close()
+        except Exception as e:
+            logger.debug("Failed to close connection to %s: %s",
+                         connection.host, e)
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._locks.clear()
+        for connection in connections:
+            self.discard(connection)
+
+    def forget(self):
+        """
+        Drop all pooled connections without closing them.
+
+        A forked child inherits the sockets of the parent's connections but
+        not the threads reading them, so it must neither use them nor close
+        them (closing ends the parent's sessions). Locks are recreated as they
+        may have been held by parent threads at fork time.
+        """
+        self._connections = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_alive(connection: Connection) -> bool:
+        # The transport turns inactive once its reader thread sees the session
+        # end. An ignore message makes sure the socket is still writable.
+        transport = connection.transport
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception as e:
+            logger.debug("Connection to %s is dead: %s", connection.host, e)
+            return False
+        return True
+
+    def _ensure_open(self, connection: Connection):
+        for attempt in range(2):
+            if self._is_alive(connection):
+                return
+            try:
+                self._reconnect(connection)
+                return
+            except (socket.timeout, AuthenticationException):
+                raise
+            except (SSHException, EOFError, socket.error) as e:
+                if attempt > 0:
+                    raise e
+                logger.debug("Connecting to %s failed, retrying: %s",
+                             connection.host, e)
+
+    def _reconnect(self, connection: Connection):
+        self.discard(connection)
+        connection.open()
+        connection.transport.set_keepalive(self._keepalive)
+
+
+class LocalConnection(object):
+    """
+    A stand-in for fabric.Connection running commands in local subprocesses.
+
+    Lets executors be tested and benchmarked without a pool: every host is
+    "reachable" and runs commands with the local shell, with CHAOS_HOST set to
+    the host name. sudo runs commands as the current user. connect_latency
+    seconds are spent on every (re)connect to model an SSH handshake.
+    """
+    connect_latency = 0.0
+
+    def __init__(self, host, config=None, user=None, connect_timeout=None,
+                 connect_kwargs=None):
+        self.host = host
+        self.user = user
+        self.is_connected = False
+        self.transport = None
+        self._context = Context()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        self.is_connected = True
+        self.transport = _LocalTransport()
+
+    def close(self):
+        self.is_connected = False
+        self.transport = None
+
+    def run(self, command, hide=True, timeout=None, warn=False, **kwargs):
+        if not self.is_connected:
+            self.open()
+        # Remote commands get no stdin, neither do the local ones
+        kwargs.setdefault('in_stream', False)
+        return self._context.run(command, hide=hide, timeout=timeout,
+                                 warn=warn, env={'CHAOS_HOST': self.host},
+                                 **kwargs)
+
+    sudo = run
+
+
+class _LocalTransport(object):
+    def is_active(self):
+        return True
+
+    def send_ignore(self):
+        pass
+
+    def set_keepalive(self, interval):
+        pass
+
+
+# Shared by all FabricExecutor instances. Closed explicitly on exit to avoid
+# errors in paramiko clean up during interpreter shutdown.
+connection_pool = ConnectionPool()
+atexit.register(connection_pool.close)
+# Forked children (i.e. NonDaemonicChaosPool workers) open their own connections
+os.register_at_fork(after_in_child=lambda: connection_pool.forget())
 
 
 class RemoteExecutor(object):
@@ -63,9 +286,11 @@ class FabricExecutor(RemoteExecutor):
     """
     @staticmethod
     def _multiprocess_execute_on_host(q, host, action, config, user=None,
-                                      as_sudo=False, connect_kwargs=None):
-        with Connection(host, config=config, user=user,
-                        connect_kwargs=connect_kwargs) as c:
+                                      as_sudo=False, connect_kwargs=None,
+                                      connection_class=None):
+        connection_class = connection_class or Connection
+        with connection_class(host, config=config, user=user,
+                              connect_kwargs=connect_kwargs) as c:
             if as_sudo:
                 rtn = c.sudo(action, hide=True)
                 #rtn = c.sudo(action, hide=True, pty=True)
@@ -76,11 +301,40 @@ class FabricExecutor(RemoteExecutor):
             q.put(Result(rtn.return_code, rtn.stdout, rtn.stderr))
 
     config = None
+    ssh_config_file = None
+    persistent_connections = True
+    connection_class = None
 
-    def __init__(self, ssh_config_file=None):
+    def __init__(self, ssh_config_file=None, persistent_connections=True,
+                 connection_class=None):
         self.config = FabricExecutor._create_config(
             ssh_config_file=ssh_config_file)
-        pass
+        self.ssh_config_file = ssh_config_file
+        # Reuse pooled connections instead of spawning a process with a new
+        # connection for every command
+        self.persistent_connections = persistent_connections
+        # Backend used to reach hosts, fabric.Connection unless set (i.e. to
+        # LocalConnection)
+        self.connection_class = connection_class
+
+    @contextmanager
+    def _connection(self, host, user=None, connect_kwargs=None,
+                    connect_timeout=None):
+        # Pooled connections are held for the with block, others closed on
+        # exit
+        if self.persistent_connections:
+            with connection_pool.connection(
+                    host, self.config, ssh_config_file=self.ssh_config_file,
+                    user=user, connect_kwargs=connect_kwargs,
+                    connect_timeout=connect_timeout,
+                    connection_class=self.connection_class) as connection:
+                yield connection
+            return
+        connection_class = self.connection_class or Connection
+        with connection_class(host, config=self.config, user=user,
+                              connect_timeout=connect_timeout,
+                              connect_kwargs=connect_kwargs) as connection:
+            yield connection
 
     # @staticmethod
     # def _format_rtn(rtn):
@@ -119,11 +373,47 @@ class FabricExecutor(RemoteExecutor):
 
         return connect_kwargs
 
+    @staticmethod
+    def _run(connection, action, as_sudo=False, timeout=None, warn=False):
+        if as_sudo:
+            rtn = connection.sudo(action, hide=True, timeout=timeout, warn=warn)
+        else:
+            rtn = connection.run(action, hide=True, timeout=timeout, warn=warn)
+        return Result(rtn.return_code, rtn.stdout, rtn.stderr)
+
+    def _pooled_execute_on_host(self, host, action, user=None, as_sudo=False,
+                                connect_kwargs=None, timeout=10,
+                                connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                                warn=False):
+        # A connection dying once the command was sent (i.e. node restarted)
+        # is not retried: the command may have run and many actions are not
+        # idempotent (i.e. adding an iptables rule). The pool discards the
+        # connection, so the next call reconnects.
+        try:
+            with self._connection(host, user=user,
+                                  connect_kwargs=connect_kwargs,
+                                  connect_timeout=connect_timeout) as c:
+                return self._run(c, action, as_sudo=as_sudo, timeout=timeout,
+                                 warn=warn)
+        except CommandTimedOut:
+            raise Exception("Remote execution has exceeded timeout")
+
     def _execute_on_host(self, host: str, action: str, user: str = None,
                          as_sudo: bool = False, identity_file: str = None,
                          timeout: int = 10) -> str:
         connect_kwargs = self._collect_connect_kwargs(identity_file)
 
+        if self.persistent_connections:
+            # Like the process based execution, connecting counts towards the
+            # timeout
+            return self._pooled_execute_on_host(host, action, user=user,
+                                                as_sudo=as_sudo,
+                                                connect_kwargs=connect_kwargs,
+                                                timeout=timeout,
+                                                connect_timeout=min(
+                                                    timeout,
+                                                    DEFAULT_CONNECT_TIMEOUT))
+
         p = None
         q = Queue()
         try:
@@ -132,7 +422,8 @@ class FabricExecutor(RemoteExecutor):
             keyword_args = {
                 "user": user,
                 "as_sudo": as_sudo,
-                "connect_kwargs": connect_kwargs
+                "connect_kwargs": connect_kwargs,
+                "connection_class": self.connection_class
             }
             p = Process(target=FabricExecutor._multiprocess_execute_on_host,
                         args=(q, host, action, self.config),
@@ -157,221 +448,329 @@ class ParallelFabricExecutor(FabricExecutor):
     A Phython Fabric-based remote executor capable of parallel processing remote
     execution.
 
-    The number of processes that may run in parallel is limited by a client's
-    CPU count. The more cpu cores, the more remote execution can happen in
-    parallel.
+    Remote execution is I/O bound, so hosts are handled by a pool of threads
+    sized by the host fan-out rather than by the client's CPU count. The pool
+    lives as long as the executor, so one instance may run any number of
+    execute calls.
     """
-    _processes = []
     config = None
-    # DEBUG PARALLELIZATION
-    #f = None
-
-    # DEBUG PARALLELIZATION
-    #def open_print(self):
-    #    self.f = open('/tmp/corin.txt', 'a')
-
-    # DEBUG PARALLELIZATION
-    #def close_print(self):
-    #    self.f.close()
-
-    # DEBUG PARALLELIZATION
-    #def flush_print(self):
-    #    self.f.flush()
-
-    # DEBUG PARALLELIZATION
-    #def print(self, text):
-    #    self.f.write("{}: {}".format(os.getpid(), text))
-    #    self.flush_print()
-
-    def __init__(self, ssh_config_file=None):
-        super().__init__(ssh_config_file=ssh_config_file)
-
-        # DEBUG PARALLELIZATION
-        #self.open_print()
-        #self.print("In ParallelFabricExecutor.__init__\n")
-
-        # A manager for inter-process communcation (IPC)
-        self._manager = Manager()
-        # A queue to hold tasks
-        self._tasks = self._manager.Queue()
-        # A queue to hold task results
-        self._results = self._manager.Queue()
-        # Create process pool with as many processes as there are cores
-        # TODO: make self._cpu_count configurable
-        #       On a 2 cpu client _cpu_count was set to 4 and 5 with nominal
-        #       decrease (improvement) in runtime.
-        self._cpu_count = cpu_count()
-        self._pool = Pool(processes=self._cpu_count)
-        self._processes = []
-        # Initiate the worker processes
-        for i in range(self._cpu_count):
-            # Set process name
-            process_name = 'P%i' % i
-            # Create the process, and connect it to the worker function
-            new_process = Process(target=self.do_work,
-                                  args=(process_name,self._tasks,self._results))
-            # Add new process to the list of processes
-            self._processes.append(new_process)
-            # Start the process
-            new_process.start()
-        # Worker processes are now waiting for work
-
-        # DEBUG PARALLELIZATION
-        #self.print("Leaving __init__\n")
+
+    def __init__(self, ssh_config_file=None, persistent_connections=True,
+                 fan_out: int = DEFAULT_PARALLEL_FAN_OUT,
+                 connection_class=None):
+        super().__init__(ssh_config_file=ssh_config_file,
+                         persistent_connections=persistent_connections,
+                         connection_class=connection_class)
+        self.fan_out = fan_out
+        self._pool = ThreadPoolExecutor(max_workers=fan_out)
 
     def __del__(self):
-        for process in self._processes:
-            # Gracefully send SIGTERM to each process
-            process.terminate()
-
-        # DEBUG PARALLELIZATION
-        #if self.f:
-        #    self.print("Closing file handle...")
-        #    self.close_print()
-        #    self.f = None
-
-    def _parallel_execute_on_host(self, results, host, action, config,
-                                  user=None, as_sudo=False, **kwargs):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker threads once they finish already submitted hosts.
+        """
+        pool = getattr(self, '_pool', None)
+        if pool:
+            pool.shutdown(wait=False)
+
+    def _parallel_execute_on_host(self, host, action, user=None, as_sudo=False,
+                                  connect_kwargs=None,
+                                  connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                                  timeout=DEFAULT_PARALLEL_TIMEOUT
+                                  ) -> ParallelResult:
         if action == "pytest":
-            # DEBUG PARALLELIZATION
-            #self.print("Returning mocked ParallelResult\n")
-            results.put(ParallelResult(host, 0, "corin\n", ""))
+            return ParallelResult(host, 0, "corin\n", "")
+
+        if self.persistent_connections:
+            rtn = self._pooled_execute_on_host(host, action, user=user,
+                                               as_sudo=as_sudo,
+                                               connect_kwargs=connect_kwargs,
+                                               timeout=timeout,
+                                               connect_timeout=connect_timeout,
+                                               warn=True)
         else:
-            # DEBUG PARALLELIZATION
-            #self.print("In _parallel_execute_on_host...\n")
-            connect_timeout = kwargs.get('connect_timeout', 60)
-            connect_kwargs = kwargs.get('connect_kwargs', None)
-
-            # DEBUG PARALLELIZATION
-            #self.print("connect_timeout: {}\n".format(connect_timeout))
-            #self.print("connect_kwargs: {}\n".format(connect_kwargs))
-            #self.print("Opening connection\n")
-
-            with Connection(host, config=config, user=user,
-                            connect_timeout=connect_timeout,
-                            connect_kwargs=connect_kwargs) as c:
-                # DEBUG PARALLELIZATION
-                #self.print("Connection open\n")
-                if as_sudo:
-                    rtn = c.sudo(action, hide=True)
-                    #rtn = c.sudo(action, hide=True, pty=True)
-                else:
-                    rtn = c.run(action, hide=True)
-                    #rtn = c.run(action, hide=True, pty=True)
-
-                results.put(ParallelResult(host, rtn.return_code, rtn.stdout,
-                                           rtn.stderr))
-            # DEBUG PARALLELIZATION
-            #self.print("Connection closed\n")
-
-    # Define worker function
-    def do_work(self, process_name, tasks, results):
-        logger.debug('[%s] routine starts', process_name)
-
-        with open('/tmp/corin.txt', 'a') as f:
-            while True:
-                # DEBUG PARALLELIZATION
-                #self.print("Before tasks.get()\n")
-                new_tuple = tasks.get()
-                # DEBUG PARALLELIZATION
-                #self.print("After tasks.get()\n")
-                if len(new_tuple) == 0:
-                    # DEBUG PARALLELIZATION
-                    #self.print('[{}] routine quits\n'.format(process_name))
-                    logger.debug('[%s] routine quits', process_name)
-
-                    # Indicate finished
-                    results.put(ParallelResult("", -999, "", ""))
-                    break
-                else:
-                    # Unpack tuple into variables. See self.tasks.put in
-                    # 'execute' member function
-                    host = new_tuple[0]
-                    action = new_tuple[1]
-                    user = new_tuple[2]
-                    as_sudo = new_tuple[3]
-                    kwargs_dict = new_tuple[4]
-                    # TODO: Execute remote command - _parallel_execute_on_host
-                    logger.debug('Execute on host...')
-                    logger.debug('host: %s', host)
-                    logger.debug('action: %s', action)
-                    logger.debug('user: %s', user)
-                    logger.debug('as_sudo: %s', as_sudo)
-                    logger.debug('kwargs: %s', json.dumps(kwargs_dict))
-
-                    # DEBUG PARALLELIZATION
-                    #self.print('Execute on host...\n')
-                    #self.print('host: {}\n'.format(host))
-                    #self.print('action: {}\n'.format(action))
-                    #self.print('user: {}\n'.format(user))
-                    #self.print('as_sudo: {}\n'.format(as_sudo))
-                    #self.print('kwargs: {}\n'.format(json.dumps(kwargs_dict)))
-                    #self.print('Before call to _parallel_execute_on_host\n')
-                    #self.print('Details about _parallel_execute_on_host: ' \
-                    #           '{}\n'.format(
-                    #           getattr(self, '_parallel_execute_on_host')))
-
-                    self._parallel_execute_on_host(results, host, action,
-                                                   self.config, user=user,
-                                                   as_sudo=as_sudo,
-                                                   **kwargs_dict)
-                    # DEBUG PARALLELIZATION
-                    #self.print('After call to _parallel_execute_on_host\n')
-        return
+            with self._connection(host, user=user,
+                                  connect_kwargs=connect_kwargs,
+                                  connect_timeout=connect_timeout) as c:
+                try:
+                    rtn = self._run(c, action, as_sudo=as_sudo,
+                                    timeout=timeout, warn=True)
+                except CommandTimedOut:
+                    raise Exception("Remote execution has exceeded timeout")
+        return ParallelResult(host, rtn.return_code, rtn.stdout, rtn.stderr)
+
+    def execute_stream(self, hosts: List[str], action: str, user: str = None,
+                       as_sudo: bool = False,
+                       **kwargs) -> Iterator[ParallelResult]:
+        """
+        Execute an action on hosts in parallel, yielding results in the order
+        hosts finish.
+
+        A host which fails (i.e. can not be reached or exceeds its timeout)
+        yields a result with return code -1 and the error in stderr, so every
+        host gets exactly one result.
+
+        :param hosts: hostnames
+            Required.
+        :type hosts: List[str]
+        :param action: A command to execute on each host.
+            Required.
+        :type action: str
+        :param user: The user to execute the action.
+            Optional. (Default: None)
+        :type user: str
+        :param as_sudo: Should the user execute the action as sudo?
+            Optional. (Default: False)
+        :type as_sudo: bool
+        :param identity_file: The identity file used to connect.
+            Optional. (Default: None)
+        :type identity_file: str
+        :param connect_timeout: Seconds to wait for a connection to a host.
+            Optional. (Default: 60)
+        :type connect_timeout: int
+        :param timeout: Seconds the action may run on each host. Hosts still
+            running when every host had time to connect and run the action
+            are given up on.
+            Optional. (Default: DEFAULT_PARALLEL_TIMEOUT)
+        :type timeout: int
+        """
+        identity_file = kwargs.pop('identity_file', None)
+        kwargs['connect_kwargs'] = self._collect_connect_kwargs(identity_file)
+        self._set_timeouts(kwargs)
+        logger.debug('Execute on hosts: %s action: %s user: %s as_sudo: %s ' \
+                     'kwargs: %s', hosts, action, user, as_sudo,
+                     json.dumps(kwargs))
+
+        futures = {
+            self._pool.submit(self._parallel_execute_on_host, host, action,
+                              user=user, as_sudo=as_sudo, **kwargs): host
+            for host in hosts
+        }
+        for host, future in self._as_completed(
+                futures, kwargs['connect_timeout'] + kwargs['timeout']):
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.error("Remote execution on %s failed: %s", host, e)
+                yield ParallelResult(host, -1, "", str(e))
 
     def execute(self, hosts: List[str], action: str, user: str = None,
                 as_sudo: bool = False, **kwargs):
-        # DEBUG PARALLELIZATION
-        #self.print("In execute...\n")
-        #self.print("The instance's _parallel_execute_on_host function has " \
-        #           "been patched by pytest at this point...\n")
-        #self.print('Details about _parallel_execute_on_host: {}\n'.format(
-        #           getattr(self, '_parallel_execute_on_host')))
-        identity_file = kwargs.pop('identity_file', None)
-        connect_kwargs = self._collect_connect_kwargs(identity_file)
-        kwargs['connect_kwargs'] = connect_kwargs
-        logger.debug('TODO: Execute on hosts...')
-        logger.debug('hosts: %s', hosts)
-        logger.debug('action: %s', action)
-        logger.debug('user: %s', user)
-        logger.debug('as_sudo: %s', as_sudo)
-        logger.debug('kwargs: %s', json.dumps(kwargs))
-        # Fill task queue
-        for host in hosts:
-            self._tasks.put((host, action, user, as_sudo, kwargs))
-
-        # Signal the do_work worker function/process to exit. An empty tuple
-        # will be the signal for a worker process to exit.
-        for host in hosts:
-            self._tasks.put(())
-
-        # Read results
-        num_finished_processes = 0
+        """
+        Execute an action on hosts in parallel.
+
+        Takes the same arguments as execute_stream and returns a dict mapping
+        each host to its 'return_code', 'stdout' and 'stderr'.
+        """
         rtn = {}
-        while True:
-            # Read result
-            new_result = self._results.get()
-            # Have a look at the results
-            if new_result.return_code == -999:
-                # Process has finished
-                num_finished_processes += 1
-
-                if num_finished_processes == self._cpu_count:
-                    break
-            else:
-                # Output result
-                #logger.debug('host: %s rc: %d stdout: %s stderr: %s',
-                #             new_result.host, new_result.return_code,
-                #             new_result.stdout, new_result.stderr)
-                rtn[new_result.host] = {
-                   'return_code': new_result.return_code,
-                   'stdout': new_result.stdout,
-                   'stderr': new_result.stderr
-                }
-        # DEBUG PARALLELIZATION
-        #self.print("Returning {} from execute...\n".format(str(rtn)))
+        for result in self.execute_stream(hosts, action, user=user,
+                                          as_sudo=as_sudo, **kwargs):
+            rtn[result.host] = {
+               'return_code': result.return_code,
+               'stdout': result.stdout,
+               'stderr': result.stderr
+            }
         return rtn
 
+    @staticmethod
+    def _set_timeouts(kwargs):
+        # Timeouts are always finite, so a hung host can not stall the others
+        if kwargs.get('connect_timeout') is None:
+            kwargs['connect_timeout'] = DEFAULT_CONNECT_TIMEOUT
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = DEFAULT_PARALLEL_TIMEOUT
+
+    def _as_completed(self, futures, host_timeout):
+        # Yields (host, future) in the order hosts finish. Hosts are run in
+        # waves of fan_out, so hosts not done once every wave had host_timeout
+        # seconds are given up on: their futures are cancelled and yield a
+        # timeout error.
+        waves = -(-len(futures) // self.fan_out)
+        finished = set()
+        try:
+            for future in as_completed(futures, timeout=waves * host_timeout):
+                finished.add(future)
+                yield futures[future], future
+        except concurrent.futures.TimeoutError:
+            for future, host in futures.items():
+                if future in finished:
+                    continue
+                if not future.done():
+                    future.cancel()
+                    future = _timed_out_future()
+                yield host, future
+
+    @staticmethod
+    def _chain_commands(commands: List[str], marker: str,
+                        stop_on_error: bool) -> str:
+        # Every command is framed with marker lines carrying its index, exit
+        # code and timestamps, so results can be split out of a single output
+        steps = []
+        for i, command in enumerate(commands):
+            step = "echo '{m} {i}' >&2; echo \"{m} begin {i} $(date +%s%N)\";" \
+                   " ( {command} ); rc=$?;" \
+                   " printf '\\n{m} end {i} %s %s\\n' $rc $(date +%s%N)".format(
+                   m=marker, i=i, command=command)
+            if stop_on_error:
+                step += "; [ $rc -eq 0 ] || exit $rc"
+            steps.append(step)
+        return "sh -c {}".format(shlex.quote("; ".join(steps)))
+
+    @staticmethod
+    def _split_chained_output(commands: List[str], marker: str, stdout: str,
+                              stderr: str) -> List[CommandResult]:
+        stderr_parts = re.split(r'^{} (\d+)\n'.format(marker), stderr,
+                                flags=re.M)
+        errors = dict(zip(stderr_parts[1::2], stderr_parts[2::2]))
+        results = []
+        regex = re.compile(r'^{m} begin (\d+) (\d+)\n(.*?)\n{m} end \1 (\d+)' \
+                           r' (\d+)$'.format(m=marker), re.M | re.S)
+        for match in regex.finditer(stdout):
+            index, started, output, return_code, finished = match.groups()
+            results.append(CommandResult(commands[int(index)],
+                                         int(return_code), output,
+                                         errors.get(index, ""),
+                                         (int(finished) - int(started)) / 1e9))
+        return results
+
+    def _batch_execute_on_host(self, host, commands, user=None, as_sudo=False,
+                               chain=False, stop_on_error=True,
+                               connect_kwargs=None,
+                               connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                               timeout=DEFAULT_PARALLEL_TIMEOUT) -> BatchResult:
+        started = time.perf_counter()
+        results = []
+        try:
+            with self._connection(host, user=user,
+                                  connect_kwargs=connect_kwargs,
+                                  connect_timeout=connect_timeout) as c:
+                if chain:
+                    marker = "chaosindy-{}".format(uuid.uuid4().hex)
+                    rtn = self._run(c, self._chain_commands(commands, marker,
+                                                            stop_on_error),
+                                    as_sudo=as_sudo, timeout=timeout,
+                                    warn=True)
+                    results = self._split_chained_output(commands, marker,
+                                                         rtn.stdout,
+                                                         rtn.stderr)
+                else:
+                    for command in commands:
+                        command_started = time.perf_counter()
+                        rtn = self._run(c, command, as_sudo=as_sudo,
+                                        timeout=timeout, warn=True)
+                        results.append(CommandResult(
+                            command, rtn.return_code, rtn.stdout, rtn.stderr,
+                            time.perf_counter() - command_started))
+                        if stop_on_error and rtn.return_code != 0:
+                            break
+        except CommandTimedOut:
+            return BatchResult(host, results, time.perf_counter() - started,
+                               "Remote execution has exceeded timeout")
+        return BatchResult(host, results, time.perf_counter() - started, None)
+
+    def execute_batch_stream(self, commands: Dict[str, List[str]],
+                             user: str = None, as_sudo: bool = False,
+                             chain: bool = False, stop_on_error: bool = True,
+                             **kwargs) -> Iterator[BatchResult]:
+        """
+        Execute lists of commands on hosts in parallel, yielding results in the
+        order hosts finish.
+
+        Commands of a host are run one after another over a single session.
+        Hosts are run in parallel.
+
+        :param commands: A mapping of hostname to the commands to execute on
+            that host.
+            Required.
+        :type commands: Dict[str, List[str]]
+        :param user: The user to execute the commands.
+            Optional. (Default: None)
+        :type user: str
+        :param as_sudo: Should the user execute the commands as sudo?
+            Optional. (Default: False)
+        :type as_sudo: bool
+        :param chain: Run all commands of a host in one shell invocation
+            instead of one invocation per command?
+            Optional. (Default: False)
+        :type chain: bool
+        :param stop_on_error: Skip the rest of a host's commands once one of
+            them fails?
+            Optional. (Default: True)
+        :type stop_on_error: bool
+        :param identity_file: The identity file used to connect.
+            Optional. (Default: None)
+        :type identity_file: str
+        :param connect_timeout: Seconds to wait for a connection to a host.
+            Optional. (Default: 60)
+        :type connect_timeout: int
+        :param timeout: Seconds each command (or the whole chain if chain is
+            set) may run. Hosts still running when every host had time to
+            connect and run all of its commands are given up on.
+            Optional. (Default: DEFAULT_PARALLEL_TIMEOUT)
+        :type timeout: int
+        """
+        identity_file = kwargs.pop('identity_file', None)
+        kwargs['connect_kwargs'] = self._collect_connect_kwargs(identity_file)
+        self._set_timeouts(kwargs)
+        logger.debug('Execute batch: %s user: %s as_sudo: %s chain: %s ' \
+                     'kwargs: %s', json.dumps(commands), user, as_sudo, chain,
+                     json.dumps(kwargs))
+
+        futures = {
+            self._pool.submit(self._batch_execute_on_host, host, host_commands,
+                              user=user, as_sudo=as_sudo, chain=chain,
+                              stop_on_error=stop_on_error, **kwargs): host
+            for host, host_commands in commands.items()
+        }
+        commands_per_host = 1 if chain else max(map(len, commands.values()),
+                                                default=1)
+        for host, future in self._as_completed(
+                futures, kwargs['connect_timeout'] +
+                kwargs['timeout'] * commands_per_host):
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.error("Remote batch execution on %s failed: %s", host,
+                             e)
+                yield BatchResult(host, [], 0.0, str(e))
+
+    def execute_batch(self, commands: Dict[str, List[str]], user: str = None,
+                      as_sudo: bool = False, chain: bool = False,
+                      stop_on_error: bool = True,
+                      **kwargs) -> Dict[str, BatchResult]:
+        """
+        Execute lists of commands on hosts in parallel.
+
+        Takes the same arguments as execute_batch_stream and returns a dict
+        mapping each host to its BatchResult.
+        """
+        return {result.host: result for result in self.execute_batch_stream(
+            commands, user=user, as_sudo=as_sudo, chain=chain,
+            stop_on_error=stop_on_error, **kwargs)}
+
+
+def _timed_out_future():
+    future = concurrent.futures.Future()
+    future.set_exception(Exception("Remote execution has exceeded timeout"))
+    return future
+
+
+def batch_succeeded(result: BatchResult, commands: List[str]) -> bool:
+    """
+    Check if every command of a batch has been run and returned 0.
+    """
+    return result.error is None and len(result.results) == len(commands) and \
+        all(r.return_code == 0 for r in result.results)
+
+
 class NoDaemonProcess(multiprocessing.Process):
     # make 'daemon' attribute always return False
     def _get_daemon(self):
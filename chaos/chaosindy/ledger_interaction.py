@@ -1,15 +1,109 @@
+import asyncio
+import atexit
 import json
+import os
+import time
+from collections import namedtuple
 from indy import ledger, did, wallet, pool
-from indy.error import IndyError, ErrorCode
+from indy.error import IndyError
 from os.path import expanduser, join
 from chaosindy.common import *
 from logzero import logger
 from datetime import datetime
 
+from typing import Dict, List, Tuple, Union
+
+
+SdkSession = namedtuple('SdkSession', ['pool_name', 'pool_handle',
+                                       'wallet_config', 'wallet_credentials',
+                                       'wallet_handle', 'did'])
+
+NymResult = namedtuple('NymResult', ['did', 'write_latency', 'read_latency',
+                                     'error'])
+
+# Sessions opened by open_sdk_session, keyed by genesis file, pool and seed
+_sdk_sessions = {}
+
+
+async def _write_nym_and_check(session: SdkSession) -> NymResult:
+    # Write a NYM for a new DID and read it back, timing both
+    my_did = None
+    write_latency = None
+    read_latency = None
+    try:
+        (my_did, my_verkey) = await did.create_and_store_my_did(
+            session.wallet_handle, "{}")
+
+        started = time.perf_counter()
+        nym_txn_req = await ledger.build_nym_request(session.did, my_did,
+                                                     my_verkey, None, None)
+        nym_txn_resp = await ledger.sign_and_submit_request(
+            session.pool_handle, session.wallet_handle, session.did,
+            nym_txn_req)
+        write_latency = time.perf_counter() - started
+        nym_txn_resp = json.loads(nym_txn_resp)
+        if nym_txn_resp.get('op') != 'REPLY':
+            raise Exception("NYM {} was not written: {}".format(
+                my_did, nym_txn_resp.get('reason', nym_txn_resp.get('op'))))
+
+        started = time.perf_counter()
+        get_nym_txn_req = await ledger.build_get_nym_request(session.did,
+                                                             my_did)
+        get_nym_txn_resp = await ledger.submit_request(session.pool_handle,
+                                                       get_nym_txn_req)
+        read_latency = time.perf_counter() - started
+        get_nym_txn_resp = json.loads(get_nym_txn_resp)
+        if get_nym_txn_resp['result']['dest'] != my_did:
+            raise Exception("NYM {} was not read back".format(my_did))
+    except Exception as e:
+        logger.info("Failed to write and check NYM %s: %s", my_did, e)
+        return NymResult(my_did, write_latency, read_latency, e)
+    return NymResult(my_did, write_latency, read_latency, None)
+
+
+async def write_nyms_and_check(count: int = 1, seed: str = None,
+                               pool_name: str = None,
+                               wallet_name: str = None,
+                               wallet_key: str = None,
+                               genesis_file: str = None) -> List[NymResult]:
+    """
+    Write NYMs to the ledger and confirm/check each of them by reading it back
+    from the ledger. Not idempotent.
+
+    NYMs are written at the same time, over a pool and wallet session kept
+    open by open_sdk_session, by the DID generated from seed.
+
+    :param count: How many NYMs to write.
+        Optional. (Default: 1)
+    :type count: int
+    :param seed: 32 byte string used to generate did, verkey pair. The seed must
+        be the seed for a Trustee, Steward, or Trust Anchor.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
+    :type seed: str
+    :param pool_name: Pool name
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
+    :type pool_name: str
+    :param wallet_name: Wallet name
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_NAME)
+    :type wallet_name: str
+    :param wallet_key: Wallet key
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
+    :type wallet_key: str
+    :param genesis_file: Relative or absolute path to the pool's genesis
+        transaction file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
+    :type genesis_file: str
+    :return: List[NymResult] - DID, write and read latency (in seconds) and
+        error (None if the NYM was written and read back) of each NYM
+    """
+    session = await open_sdk_session(genesis_file=genesis_file, seed=seed,
+                                     pool_name=pool_name,
+                                     wallet_name=wallet_name,
+                                     wallet_key=wallet_key)
+    return await asyncio.gather(*[_write_nym_and_check(session)
+                                  for _ in range(int(count))])
+
 
-# NOTE: Workaround: Until https://jira.hyperledger.org/browse/IS-903 is
-#       completed, create, populate, use and then delete a new wallet each time
-#       write_nym_and_check is called.
 async def write_nym_and_check(seed: str = None, pool_name: str = None,
                               my_wallet_name: str = None,
                               my_wallet_key: str = None,
@@ -21,7 +115,8 @@ async def write_nym_and_check(seed: str = None, pool_name: str = None,
     Write a NYM to the ledger.
 
     Write a NYM to the ledger and confirm/check that it was successfull by
-    reading the NYM from the ledger. Not idempotent.
+    reading the NYM from the ledger. Not idempotent. Raises an exception if
+    the NYM was not written or read back. See write_nyms_and_check.
 
     :param seed: 32 byte string used to generate did, verkey pair. The seed must
         be the seed for a Trustee, Steward, or Trust Anchor.
@@ -36,186 +131,148 @@ async def write_nym_and_check(seed: str = None, pool_name: str = None,
     :param my_wallet_key: My wallet key
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
     :type my_wallet_key: str
-    :param their_wallet_name: Their wallet name
-        Optional. (Default: chaosindy.common.DEFAULT_THEIR_WALLET_NAME)
+    :param their_wallet_name: Unused. The seed DID is kept in the session
+        wallet.
+        Optional. (Default: None)
     :type their_wallet_name: str
-    :param their_wallet_key: Their wallet key
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
+    :param their_wallet_key: Unused.
+        Optional. (Default: None)
     :type their_wallet_key: str
     :param genesis_file: Relative or absolute path to the pool's genesis
         transaction file.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
     :type genesis_file: str
-    :param cleanup: Delete wallets and pool configuration?
+    :param cleanup: Unused. The wallet and pool configuration are kept open
+        by open_sdk_session and deleted by close_sdk_sessions.
         Optional. (Default: True)
     :type cleanup: bool
     :return: None
     """
-    # TODO: validate inputs
-    if seed is None:
-        seed = DEFAULT_CHAOS_SEED
-
-    if pool_name is None:
-        pool_name = DEFAULT_CHAOS_POOL
-
-    if my_wallet_name is None:
-        my_wallet_name = DEFAULT_CHAOS_MY_WALLET_NAME
-
-    now = datetime.now()
-    pool_name = "{}-{}".format(pool_name,
-                               now.strftime("%Y%m%dT%H%M%S"))
-    my_wallet_name = "{}-{}".format(my_wallet_name,
-                                    now.strftime("%Y%m%dT%H%M%S"))
-
-    if my_wallet_key is None:
-        my_wallet_key = DEFAULT_CHAOS_WALLET_KEY
-
-    if their_wallet_name is None:
-        their_wallet_name = DEFAULT_CHAOS_THEIR_WALLET_NAME
-
-    their_wallet_name = "{}-{}".format(my_wallet_name,
-                                       now.strftime("%Y%m%dT%H%M%S"))
-
-    if their_wallet_key is None:
-        their_wallet_key = DEFAULT_CHAOS_WALLET_KEY
-
-    if genesis_file is None:
-        genesis_file = DEFAULT_CHAOS_GENEIS_FILE
-
-    logger.debug('# 0. Set protocol version to 2')
+    results = await write_nyms_and_check(count=1, seed=seed,
+                                         pool_name=pool_name,
+                                         wallet_name=my_wallet_name,
+                                         wallet_key=my_wallet_key,
+                                         genesis_file=genesis_file)
+    for result in results:
+        if result.error is not None:
+            raise result.error
+        logger.debug("Wrote NYM %s in %.3f seconds, read it in %.3f seconds",
+                     result.did, result.write_latency, result.read_latency)
+
+
+def _fold_pool_txn(validators: Dict[str, Dict], result: Dict) -> None:
+    # Apply a pool ledger transaction to the state of validators
+    result_data_txn_data = result['data']['txn']['data']
+    result_data_txn_data_data = result_data_txn_data['data']
+
+    # Get destination field from the JSON dump of the current transaction
+    #current_dest = result_data_txn_data['dest']
+    current_dest = result_data_txn_data_data['alias']
+
+    # Add destination to the dictionary if it does not exist
+    if not( current_dest in validators.keys() ):
+        validators[current_dest] = {}
+
+    # Update attribute values of the destination with the attributes in the
+    # current transaction dump
+    validators[current_dest].update(result_data_txn_data_data)
+
+    if 'dest' in result_data_txn_data:
+        validators[current_dest]['dest'] = result_data_txn_data['dest']
+
+    if 'identifier' in result:
+        validators[current_dest]['identifier'] = result['identifier']
+
+
+async def _get_pool_txn(session: SdkSession, seq_no: int) -> Union[Dict,None]:
+    # Returns the GET_TXN result or None if there is no such transaction
+    request = await ledger.build_get_txn_request(
+        submitter_did=session.did, seq_no=seq_no, ledger_type="POOL")
+    response = await ledger.sign_and_submit_request(
+        pool_handle=session.pool_handle, wallet_handle=session.wallet_handle,
+        submitter_did=session.did, request_json=request)
+    # TODO: Determine if 'result' will always be present.
+    result = json.loads(response).get('result', None)
+    if result is None or result.get('data', None) is None:
+        return None
+    return result
+
+
+def _load_validator_state_cache(cache_file: str,
+                                genesis_file: str) -> Union[Dict,None]:
     try:
-        await pool.set_protocol_version(2)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        logger.exception(e)
-
-    logger.debug('# 1. Create ledger config from genesis txn file')
-    pool_config = json.dumps({"genesis_txn": str(genesis_file)})
-    logger.debug("pool_name: %s", pool_name)
-    logger.debug("pool_config: %s", pool_config)
-    try:
-        await pool.create_pool_ledger_config(pool_name, pool_config)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        #logger.exception(e)
-        pass
-
-    logger.debug("pool_config: %s", pool_config)
-    pool_handle = await pool.open_pool_ledger(pool_name, "{}")
-    logger.debug("pool_handle is set")
-
-    my_wallet_config = json.dumps({'id': my_wallet_name})
-    my_wallet_credentials = json.dumps({"key": my_wallet_key})
-    try:
-        logger.debug("create_wallet: %s with config %s", my_wallet_name,
-                     my_wallet_config)
-        await wallet.create_wallet(my_wallet_config, my_wallet_credentials)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        #logger.exception(e)
-        pass
-
-    my_wallet_handle = await wallet.open_wallet(my_wallet_config,
-                                                my_wallet_credentials)
-
-    logger.debug('# 4. Create Their Wallet and Get Wallet Handle')
-
-    their_wallet_config = json.dumps({'id': their_wallet_name})
-    their_wallet_credentials = json.dumps({'key': their_wallet_key})
-    try:
-        await wallet.create_wallet(their_wallet_config,
-                                   their_wallet_credentials)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        logger.info(e)
-        pass
-
-    their_wallet_handle = await wallet.open_wallet(their_wallet_config,
-                                                   their_wallet_credentials)
-
-    logger.debug('# 5. Create My DID')
-    (my_did, my_verkey) = await did.create_and_store_my_did(my_wallet_handle,
-                                                            "{}")
-
-    logger.debug('# 6. Create Their DID from Trustee1 seed')
-    try:
-        (their_did, their_verkey) = await did.create_and_store_my_did(
-            their_wallet_handle, json.dumps({"seed": seed}))
-    except IndyError as e:
-        if e.error_code == ErrorCode.DidAlreadyExistsError:
-            # TODO: Generate (their_did, their_verkey) tuple from seed (like
-            #       DidUtils::create_my_did)
-            logger.info("Handled DidAlreadyExistsError exception...")
-            pass
-        else:
-            logger.exception(e)
-            raise e
-
-    their_dict = {'did': their_did, 'verkey': their_verkey}
-    await did.store_their_did(my_wallet_handle, json.dumps(their_dict))
-
-    logger.debug('# 8. Prepare and send NYM transaction')
-    nym_txn_req = await ledger.build_nym_request(their_did, my_did, None, None,
-                                                 None)
-    await ledger.sign_and_submit_request(pool_handle, their_wallet_handle,
-                                         their_did, nym_txn_req)
-
-    logger.debug('# 9. Prepare and send GET_NYM request')
-    get_nym_txn_req = await ledger.build_get_nym_request(their_did, my_did)
-    get_nym_txn_resp = await ledger.submit_request(pool_handle, get_nym_txn_req)
-
-    get_nym_txn_resp = json.loads(get_nym_txn_resp)
-
-    assert get_nym_txn_resp['result']['dest'] == my_did
-
-    # 10. Close wallets and pool
-    await wallet.close_wallet(their_wallet_handle)
-    await wallet.close_wallet(my_wallet_handle)
-    await pool.close_pool_ledger(pool_handle)
-
-    if cleanup:
-        try:
-            await wallet.delete_wallet(their_wallet_config,
-                                       their_wallet_credentials)
-        except Exception as e:
-            logger.info("Best-effort deletion of wallet %s failed.",
-                        their_wallet_name)
-            #logger.exception(e)
-            pass
-
-        try:
-            await wallet.delete_wallet(my_wallet_config, my_wallet_credentials)
-        except Exception as e:
-            logger.info("Best-effort deletion of wallet %s failed.",
-                        my_wallet_name)
-            #logger.exception(e)
-            pass
-
-
-        try:
-            await pool.delete_pool_ledger_config(pool_name)
-        except Exception as e:
-            logger.info("Best-effort deletion of %s pool ledger config failed.",
-                        pool_name)
-            #logger.exception(e)
-            pass
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return None
+    if cache.get('genesis_file') != genesis_file:
+        return None
+    return cache
+
+
+async def read_pool_ledger(session: SdkSession, validators: Dict[str, Dict],
+                           start: int = 1,
+                           window: int = DEFAULT_CHAOS_POOL_LEDGER_WINDOW
+                           ) -> Union[Tuple[int, Dict],None]:
+    """
+    Fold pool ledger transactions into the state of validators.
+
+    Transactions are requested window at a time, all of a window at the same
+    time, starting from seqNo start. Reading stops at the first seqNo which
+    is not on the ledger.
+
+    :param session: Session returned by open_sdk_session.
+        Required.
+    :type session: SdkSession
+    :param validators: State of validators to update, maps alias to the
+        current values of the node attributes.
+        Required.
+    :type validators: Dict[str, Dict]
+    :param start: The first seqNo to read.
+        Optional. (Default: 1)
+    :type start: int
+    :param window: How many transactions to request at the same time.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL_LEDGER_WINDOW)
+    :type window: int
+    :return: Union[Tuple[int, Dict],None] - The seqNo and result of the last
+        transaction read, None if there are no transactions from start on.
+    """
+    last_txn = None
+    seq_no = start
+    while True:
+        results = await asyncio.gather(*[_get_pool_txn(session, n)
+            for n in range(seq_no, seq_no + window)])
+        for offset, result in enumerate(results):
+            if result is None:
+                return last_txn
+            _fold_pool_txn(validators, result)
+            last_txn = (seq_no + offset, result)
+        seq_no += window
 
 
 async def get_validator_state(genesis_file: str = None, seed: str = None,
                               pool_name: str = None, wallet_name: str = None,
-                              wallet_key: str = None, cleanup=True) -> None:
+                              wallet_key: str = None, cleanup=True,
+                              window: int = DEFAULT_CHAOS_POOL_LEDGER_WINDOW
+                              ) -> None:
     """
     Not to be confused with the validator-info script or the indy-cli
     `ledger get-validator-info`.
 
-    This version of validator info is extracted from the pool ledger.
+    This version of validator info is extracted from the pool ledger and
+    written to 'validator-state' in the Chaos temp dir.
+
+    The state is cached on disk together with the last transaction read. A
+    later call reads only the transactions past it, unless the last
+    transaction changed (i.e. the pool was rebuilt), in which case the whole
+    pool ledger is read again.
 
     :param genesis_file: Relative or absolute path to the pool's genesis
         transaction file.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
     :type genesis_file: str
     :param seed: 32 byte string used to generate did, verkey pair.
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_STEWARD_SEED)
     :type seed: str
     :param pool_name: Pool name.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
@@ -226,13 +283,16 @@ async def get_validator_state(genesis_file: str = None, seed: str = None,
     :param wallet_key: Wallet key
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
     :type wallet_key: str
-    :param cleanup: Delete the wallet and pool configuration?
+    :param cleanup: Unused. The wallet and pool configuration are kept open
+        by open_sdk_session and deleted by close_sdk_sessions.
         Optional. (Default: True)
     :type cleanup: bool
+    :param window: How many transactions to request at the same time.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL_LEDGER_WINDOW)
+    :type window: int
     :return: None
     """
     output_dir = get_chaos_temp_dir()
-    validators = {}
     # validators is a dictionary of dictionaries that maps dest to the current
     # values of the attritubes for that dest
     #  {
@@ -244,151 +304,294 @@ async def get_validator_state(genesis_file: str = None, seed: str = None,
     if seed is None:
         seed = DEFAULT_CHAOS_STEWARD_SEED
 
+    if genesis_file is None:
+        genesis_file = DEFAULT_CHAOS_GENESIS_FILE
+
+    session = await open_sdk_session(genesis_file=genesis_file, seed=seed,
+                                     pool_name=pool_name,
+                                     wallet_name=wallet_name,
+                                     wallet_key=wallet_key)
+
+    cache_file = join(output_dir, 'validator-state-cache')
+    cache = _load_validator_state_cache(cache_file, expanduser(genesis_file))
+    if cache:
+        # The last transaction read is read again to check the ledger is
+        # still the same one
+        last_txn = await _get_pool_txn(session, cache['seq_no'])
+        if last_txn is None or last_txn['data'] != cache['last_txn']['data']:
+            logger.info("Pool ledger changed, reading it from the beginning")
+            cache = None
+
+    if cache:
+        validators = cache['validators']
+        start = cache['seq_no'] + 1
+    else:
+        validators = {}
+        start = 1
+
+    logger.info("Traversing through transactions in the pool ledger from " \
+                "seqNo %d", start)
+    last_txn = await read_pool_ledger(session, validators, start=start,
+                                      window=window)
+    if last_txn is not None:
+        seq_no, result = last_txn
+        with open(cache_file, 'w') as json_file:
+            json.dump({'genesis_file': expanduser(genesis_file),
+                       'seq_no': seq_no, 'last_txn': result,
+                       'validators': validators}, json_file)
+
+    logger.debug("Dumping data to validator-state state file")
+    with open(join(output_dir, 'validator-state'), 'w') as json_file:
+        json.dump(validators, json_file, sort_keys=True, indent=4)
+
+
+async def open_sdk_session(genesis_file: str = None, seed: str = None,
+                           pool_name: str = None, wallet_name: str = None,
+                           wallet_key: str = None) -> SdkSession:
+    """
+    Get a pool and wallet session that stays open for the life of the process.
+
+    The first call for a genesis file, pool and seed creates the pool ledger
+    config, a wallet holding the DID generated from the seed and opens both.
+    Subsequent calls return the already open session, saving a pool connect
+    and a wallet open per request. Sessions are closed and their
+    configuration deleted by close_sdk_sessions.
+
+    :param genesis_file: Relative or absolute path to the pool's genesis
+        transaction file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
+    :type genesis_file: str
+    :param seed: 32 byte string used to generate did, verkey pair.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
+    :type seed: str
+    :param pool_name: Pool name.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
+    :type pool_name: str
+    :param wallet_name: Wallet name
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_NAME)
+    :type wallet_name: str
+    :param wallet_key: Wallet key
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
+    :type wallet_key: str
+    :return: SdkSession
+    """
+    if genesis_file is None:
+        genesis_file = DEFAULT_CHAOS_GENESIS_FILE
+
+    if seed is None:
+        seed = DEFAULT_CHAOS_SEED
+
     if pool_name is None:
         pool_name = DEFAULT_CHAOS_POOL
 
     if wallet_name is None:
         wallet_name = DEFAULT_CHAOS_WALLET_NAME
 
-    now = datetime.now()
-    pool_name = "{}-{}".format(pool_name,
-                                 now.strftime("%Y%m%dT%H%M%S"))
-    wallet_name = "{}-{}".format(wallet_name,
-                                 now.strftime("%Y%m%dT%H%M%S"))
-
     if wallet_key is None:
         wallet_key = DEFAULT_CHAOS_WALLET_KEY
 
-    if genesis_file is None:
-        genesis_file = DEFAULT_CHAOS_GENEIS_FILE
+    key = (expanduser(genesis_file), pool_name, seed)
+    session = _sdk_sessions.get(key)
+    if session:
+        return session
+
+    # Names are unique per process, so the wallet never holds a DID from a
+    # previous run and concurrent experiments do not share configuration
+    suffix = "{}-{}-{}".format(datetime.now().strftime("%Y%m%dT%H%M%S"),
+                               os.getpid(), len(_sdk_sessions))
+    session_pool_name = "{}-{}".format(pool_name, suffix)
+    wallet_config = json.dumps({'id': "{}-{}".format(wallet_name, suffix)})
+    wallet_credentials = json.dumps({'key': wallet_key})
 
-    logger.debug('# 0. Set protocol version to 2')
     try:
         await pool.set_protocol_version(2)
     except IndyError as e:
         logger.info("Handled IndyError")
         logger.exception(e)
-        pass
 
-    logger.debug('# 1. Create ledger config from genesis txn file')
-    pool_config = json.dumps({"genesis_txn": str(genesis_file)})
-    logger.debug("pool_name: %s", pool_name)
-    logger.debug("pool_config: %s", pool_config)
+    pool_config = json.dumps({"genesis_txn": expanduser(genesis_file)})
+    logger.debug("Open SDK session pool_name: %s pool_config: %s",
+                 session_pool_name, pool_config)
+    # Whatever was created is deleted if opening the session fails half way,
+    # None marks what was not
+    session = SdkSession(None, None, None, wallet_credentials, None, None)
     try:
-        await pool.create_pool_ledger_config(pool_name, pool_config)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        #logger.exception(e)
-        pass
+        await pool.create_pool_ledger_config(session_pool_name, pool_config)
+        session = session._replace(pool_name=session_pool_name)
+        session = session._replace(
+            pool_handle=await pool.open_pool_ledger(session_pool_name, "{}"))
 
-    logger.debug("# 2. Open pool ledger - pool_config: %s", pool_config)
-    pool_handle = await pool.open_pool_ledger(pool_name, "{}")
-    logger.debug("pool_handle is set")
-
-    wallet_config = json.dumps({'id': wallet_name})
-    wallet_credentials = json.dumps({'key': wallet_key})
-    try:
-        logger.debug("# 3. Create wallet %s with config %s credentials %s",
-                     wallet_name, wallet_config, wallet_credentials)
         await wallet.create_wallet(wallet_config, wallet_credentials)
-    except IndyError as e:
-        logger.info("Handled IndyError")
-        #logger.exception(e)
-        pass
+        session = session._replace(wallet_config=wallet_config)
+        session = session._replace(wallet_handle=await wallet.open_wallet(
+            wallet_config, wallet_credentials))
+        (my_did, my_verkey) = await did.create_and_store_my_did(
+            session.wallet_handle, json.dumps({'seed': seed}))
+    except Exception:
+        await _delete_sdk_session(session)
+        raise
 
-    wallet_handle = await wallet.open_wallet(wallet_config, wallet_credentials)
+    session = session._replace(did=my_did)
+    _sdk_sessions[key] = session
+    return session
 
-    try:
-        logger.debug('# 4. Create My DID')
-        did_json = json.dumps({'seed': seed})
-        (my_did, my_verkey) = await did.create_and_store_my_did(wallet_handle,
-                                                                did_json)
-    except IndyError as e:
-        if e.error_code == ErrorCode.DidAlreadyExistsError:
-            # TODO: Generate (their_did, their_verkey) tuple from seed (like
-            #       DidUtils::create_my_did)
-            #my_did = "Th7MpTaRZVRYnPiabds81Y"
-            logger.info("Handled DidAlreadyExistsError exception...")
-            pass
-        else:
-            logger.exception(e)
-            raise e
-        pass
-
-    end_of_ledger = False
-    current_txn = 0
-
-    logger.info("Traversing through transactions in the pool ledger")
-
-    while (not (end_of_ledger)):
-        current_txn = current_txn + 1
-        nym_transaction_request = await ledger.build_get_txn_request(
-            submitter_did=my_did, seq_no=current_txn, ledger_type="POOL")
-
-        nym_transaction_response = await ledger.sign_and_submit_request(
-            pool_handle=pool_handle, wallet_handle=wallet_handle,
-            submitter_did=my_did, request_json=nym_transaction_request)
-        txn_json_dump = json.loads(nym_transaction_response)
-
-        # No more transactions?
-        # TODO: Determine if 'result' will always be present.
-        result = txn_json_dump.get('result', None)
-        if (result is None ) :
-            break
-        result_data = result.get('data', None)
-        if (result_data is None ) :
-            break
 
-        result_data_txn_data = result_data['txn']['data']
-        result_data_txn_data_data = result_data_txn_data['data']
+async def close_sdk_sessions() -> None:
+    """
+    Close all sessions opened by open_sdk_session and delete their wallets
+    and pool configuration.
 
-        # Get destination field from the JSON dump of the current transaction
-        #current_dest = result_data_txn_data['dest']
-        current_dest = result_data_txn_data_data['alias']
+    :return: None
+    """
+    while _sdk_sessions:
+        key, session = _sdk_sessions.popitem()
+        await _delete_sdk_session(session)
+
+
+async def _delete_sdk_session(session: SdkSession) -> None:
+    # Best-effort, every step is tried. Handles and names which are None were
+    # never opened or created.
+    steps = []
+    if session.wallet_handle is not None:
+        steps.append(lambda: wallet.close_wallet(session.wallet_handle))
+    if session.pool_handle is not None:
+        steps.append(lambda: pool.close_pool_ledger(session.pool_handle))
+    if session.wallet_config is not None:
+        steps.append(lambda: wallet.delete_wallet(session.wallet_config,
+                                                  session.wallet_credentials))
+    if session.pool_name is not None:
+        steps.append(lambda: pool.delete_pool_ledger_config(session.pool_name))
+    for step in steps:
+        try:
+            await step()
+        except Exception as e:
+            logger.info("Best-effort clean up of SDK session %s failed: %s",
+                        session.pool_name, e)
 
-        # Add destination to the dictionary if it does not exist
-        if not( current_dest in validators.keys() ):
-            validators[current_dest] = {}
 
-        for key in result_data_txn_data_data.keys():
-            # Update attribute value of the destination if the attributes exists
-            # in the current transaction dump
-            try:
-                validators[current_dest][key]  = result_data_txn_data_data[key]
-            except KeyError:
-                pass
+def _close_sdk_sessions_at_exit():
+    if not _sdk_sessions:
+        return
+    try:
+        asyncio.get_event_loop().run_until_complete(close_sdk_sessions())
+    except Exception as e:
+        logger.info("Failed to close SDK sessions: %s", e)
 
-        try:
-            validators[current_dest]['dest']  = result_data_txn_data['dest']
-        except KeyError:
-            pass
 
-        try:
-            validators[current_dest]['identifier']  = result['identifier']
-        except KeyError:
-            pass
+atexit.register(_close_sdk_sessions_at_exit)
+# libindy handles are not valid in forked children (i.e. NonDaemonicChaosPool
+# workers), they open their own sessions
+os.register_at_fork(after_in_child=_sdk_sessions.clear)
 
-    logger.debug("Dumping data to validator-state state file")
-    with open(join(output_dir, 'validator-state'), 'w') as json_file:
-        json.dump(validators, json_file, sort_keys=True, indent=4)
 
-    logger.debug('# 5. Close wallet and pool')
-    await wallet.close_wallet(wallet_handle)
-    await pool.close_pool_ledger(pool_handle)
+def _consume_result(task):
+    # Replies arriving after the quorum are not awaited, retrieve their errors
+    # so they are not reported as never retrieved
+    if not task.cancelled():
+        task.exception()
 
-    if cleanup:
-        try:
-            await wallet.delete_wallet(wallet_config, wallet_credentials)
-        except Exception as e:
-            logger.info("Best-effort deletion of wallet %s failed.",
-                        wallet_name)
-            #logger.exception(e)
-            pass
 
+async def get_validator_info_from_nodes(aliases: List[str],
+                                        output_dir: str,
+                                        genesis_file: str = None,
+                                        seed: str = None,
+                                        pool_name: str = None,
+                                        wallet_name: str = None,
+                                        wallet_key: str = None,
+                                        timeout: int = 20,
+                                        quorum: int = None) -> Dict[str, Dict]:
+    """
+    Get validator info from nodes using Indy SDK.
+
+    One signed GET_VALIDATOR_INFO request is sent to every node at the same
+    time over a pool session kept open by open_sdk_session. Each reply is
+    written to '<alias>-validator-info' in output_dir as soon as it arrives.
+    Returns once quorum nodes replied or every node replied or timed out,
+    without waiting for the slowest nodes. Files of nodes which did not reply
+    are removed, so stale validator info is never read.
+
+    :param aliases: Node aliases to get validator info from.
+        Required.
+    :type aliases: List[str]
+    :param output_dir: Directory to write validator info files to.
+        Required.
+    :type output_dir: str
+    :param genesis_file: Relative or absolute path to the pool's genesis
+        transaction file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
+    :type genesis_file: str
+    :param seed: 32 byte string used to generate a Trustee or Steward did.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
+    :type seed: str
+    :param pool_name: Pool name.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
+    :type pool_name: str
+    :param wallet_name: Wallet name
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_NAME)
+    :type wallet_name: str
+    :param wallet_key: Wallet key
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
+    :type wallet_key: str
+    :param timeout: How long to wait for each node to reply.
+        Optional. (Default: 20)
+    :type timeout: int
+    :param quorum: How many replies are enough to return.
+        Optional. (Default: n - f, where f = (n - 1) / 3 for n aliases)
+    :type quorum: int
+    :return: Dict[str, Dict] - validator info of each node which replied
+    """
+    if quorum is None:
+        quorum = len(aliases) - (len(aliases) - 1) // 3
+
+    session = await open_sdk_session(genesis_file=genesis_file, seed=seed,
+                                     pool_name=pool_name,
+                                     wallet_name=wallet_name,
+                                     wallet_key=wallet_key)
+    request = await ledger.build_get_validator_info_request(session.did)
+    request = await ledger.sign_request(session.wallet_handle, session.did,
+                                        request)
+
+    async def query(alias):
+        response = await ledger.submit_action(session.pool_handle, request,
+                                              json.dumps([alias]), timeout)
+        reply = json.loads(response)[alias]
+        if reply == 'timeout':
+            raise TimeoutError("{} did not reply in time".format(alias))
+        result = json.loads(reply)['result']
+        return alias, result['data']
+
+    loop = asyncio.get_event_loop()
+    tasks = [loop.create_task(query(alias)) for alias in aliases]
+    for task in tasks:
+        task.add_done_callback(_consume_result)
+
+    validator_info = {}
+    writes = []
+    for next_reply in asyncio.as_completed(tasks):
         try:
-            await pool.delete_pool_ledger_config(pool_name)
+            alias, data = await next_reply
         except Exception as e:
-            logger.info("Best-effort deletion of %s pool ledger config failed.",
-                        pool_name)
-            #logger.exception(e)
-            pass
+            logger.info("Failed to get validator info: %s", e)
+            continue
+        validator_info[alias] = data
+        writes.append(loop.run_in_executor(
+            None, _write_validator_info, output_dir, alias, data))
+        if len(validator_info) >= quorum:
+            break
+    await asyncio.gather(*writes)
+
+    for alias in aliases:
+        if alias not in validator_info:
+            try:
+                os.remove(join(output_dir, "{}-validator-info".format(alias)))
+            except FileNotFoundError:
+                pass
+
+    logger.debug("Got validator info from %d of %d nodes (quorum %d)",
+                 len(validator_info), len(aliases), quorum)
+    return validator_info
+
+
+def _write_validator_info(output_dir, alias, data):
+    with open(join(output_dir, "{}-validator-info".format(alias)), "w") as f:
+        f.write(json.dumps(data))
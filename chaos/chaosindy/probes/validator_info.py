@@ -1,7 +1,11 @@
 import argparse
+import asyncio
 import json
 import subprocess
 import sys
+import threading
+import time
+from collections import namedtuple
 from chaosindy.common import *
 from chaosindy.execute.execute import FabricExecutor, ParallelFabricExecutor
 from chaosindy.probes.validator_state import get_current_validator_list
@@ -10,9 +14,124 @@ from logzero import logger
 from multiprocessing import Pool
 
 from chaosindy.helpers import run
-from chaosindy.ledger_interaction import get_validator_state
+from chaosindy.ledger_interaction import (get_validator_state,
+    get_validator_info_from_nodes)
 
-from typing import Union
+from typing import Dict, Union
+
+
+NodeValidatorInfo = namedtuple('NodeValidatorInfo',
+                               ['alias', 'mode', 'primary', 'catchup_status',
+                                'data'])
+ValidatorInfoCacheEntry = namedtuple('ValidatorInfoCacheEntry',
+                                     ['collected_at', 'succeeded',
+                                      'validator_info'])
+
+
+def parse_validator_info(alias: str, data: Dict) -> NodeValidatorInfo:
+    """
+    Parse validator info of a node.
+
+    Fields missing from the validator info (i.e. a node which is still
+    starting) are set to "Unknown".
+
+    :param alias: The node alias. Required.
+    :type alias: str
+    :param data: Validator info as returned by the validator-info script, Indy
+        CLI or Indy SDK. Required.
+    :type data: Dict
+    :return: NodeValidatorInfo
+    """
+    # For each node, Indy CLI returns json in a 'data' element
+    if 'data' in data:
+        data = data['data']
+    node_info = data.get('Node_info', {})
+    master_replica = node_info.get('Replicas_status', {}).get(
+        "{}:0".format(alias))
+    if master_replica is None:
+        primary = "Unknown"
+    else:
+        primary = master_replica.get('Primary')
+        primary = primary.split(":", 1)[0] if primary else None
+    return NodeValidatorInfo(alias, node_info.get('Mode', "Unknown"), primary,
+                             node_info.get('Catchup_status'), data)
+
+
+def load_validator_info(genesis_file: str) -> Dict[str, NodeValidatorInfo]:
+    """
+    Load validator info of each node in the genesis file from the Chaos temp
+    dir. Nodes without (valid) validator info are left out.
+
+    :param genesis_file: The relative or absolute path to a genesis file.
+        Required.
+    :type genesis_file: str
+    :return: Dict[str, NodeValidatorInfo]
+    """
+    output_dir = get_chaos_temp_dir()
+    validator_info = {}
+    for alias in get_aliases(genesis_file):
+        try:
+            with open(join(output_dir, "{}-validator-info".format(alias)),
+                      'r') as f:
+                validator_info[alias] = parse_validator_info(alias,
+                                                             json.load(f))
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            logger.info("Failed to load validator info for alias %s", alias)
+        except Exception as e:
+            logger.error("Failed to parse validator info for alias %s", alias)
+            logger.exception(e)
+    return validator_info
+
+
+class ValidatorInfoCache(object):
+    """
+    Validator info collected by get_validator_info, parsed and kept in memory.
+
+    Probes and actions run in the chaos process, so back-to-back probes (i.e.
+    in a steady state hypothesis) reuse validator info collected within the
+    last ttl seconds instead of collecting it from the pool again. Actions
+    changing the state of the pool invalidate the cache.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl: int = None) -> Union[ValidatorInfoCacheEntry,None]:
+        """
+        Get an entry not older than ttl seconds, or regardless of its age if
+        ttl is None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if ttl is not None and time.monotonic() - entry.collected_at >= ttl:
+            return None
+        return entry
+
+    def put(self, key, succeeded: bool,
+            validator_info: Dict[str, NodeValidatorInfo]):
+        with self._lock:
+            self._entries[key] = ValidatorInfoCacheEntry(time.monotonic(),
+                                                         succeeded,
+                                                         validator_info)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+validator_info_cache = ValidatorInfoCache()
+
+
+def invalidate_validator_info() -> None:
+    """
+    Drop cached validator info. Called by actions changing the pool state.
+
+    :return: None
+    """
+    logger.debug("Invalidating cached validator info")
+    validator_info_cache.invalidate()
 
 
 def get_validator_info_from_node_serial(genesis_file: str,
@@ -45,11 +164,8 @@ def get_validator_info_from_node_serial(genesis_file: str,
     output_dir = get_chaos_temp_dir()
     logger.debug("genesis_file: %s ssh_config_file: %s", genesis_file,
                  ssh_config_file)
-    # 1. Open genesis_file and load all aliases into an array
-    aliases = []
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            aliases.append(json.loads(line)['txn']['data']['data']['alias'])
+    # 1. Load all aliases from the genesis file into an array
+    aliases = get_aliases(genesis_file)
     logger.debug(str(aliases))
 
     executor = FabricExecutor(ssh_config_file=expanduser(ssh_config_file))
@@ -110,11 +226,8 @@ def get_validator_info_from_node_parallel(genesis_file: str,
     output_dir = get_chaos_temp_dir()
     logger.debug("genesis_file: %s ssh_config_file: %s", genesis_file,
                  ssh_config_file)
-    # 1. Open genesis_file and load all aliases into an array
-    aliases = []
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            aliases.append(json.loads(line)['txn']['data']['data']['alias'])
+    # 1. Load all aliases from the genesis file into an array
+    aliases = get_aliases(genesis_file)
     logger.debug(str(aliases))
 
     expanded_ssh_config_file = expanduser(ssh_config_file)
@@ -147,36 +260,30 @@ def get_validator_info_from_node_parallel(genesis_file: str,
     return True
 
 
-def get_validator_info_from_sdk(genesis_file: str, did: str,
+def get_validator_info_from_sdk(genesis_file: str,
     seed: str = DEFAULT_CHAOS_SEED,
     wallet_name: str = DEFAULT_CHAOS_WALLET_NAME,
     wallet_key: str = DEFAULT_CHAOS_WALLET_KEY, pool: str = DEFAULT_CHAOS_POOL,
     timeout: Union[str,int] = DEFAULT_CHAOS_GET_VALIDATOR_INFO_TIMEOUT,
     ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE) -> bool:
     """
-    *NYI*
-
     Get validator info using Indy SDK
 
-    Perhaps enhancing chaosindy.ledger_intaraction.get_validator_state
-    would be a good idea? It currently returns the latest pool ledger
-    transaction for each node, but could be enhanced to include a superset of
-    data for:
-    1. What is currently included when calling get_validator_state
-    2. Everything in the response from the 'validator-info' script or
-       `ledger get-validator-info` indy-cli command
+    A single signed GET_VALIDATOR_INFO request is sent to all nodes at once
+    over a pool and wallet session kept open between calls (see
+    chaosindy.ledger_interaction.open_sdk_session). Each node's reply is
+    written to a file in the Chaos temp dir (see
+    chaosindy.common.get_chaos_temp_dir) named '<node>-validator-info' as soon
+    as it arrives. Returns as soon as a quorum (n - f) of nodes replied
+    instead of waiting for the slowest/unreachable nodes to time out.
+
+    The request is signed with the did generated from the seed, so unlike the
+    other validator info sources it takes no did.
 
     :param genesis_file: The relative or absolute path to a genesis file.
         Required.
     :type genesis_file: str
-    :param did: A steward or trustee DID. A did OR a seed is required, but not
-        both. The did will be used if both are given. Needed to get validator
-        info.
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_DID)
-    :type did: str
-    :param seed : A steward or trustee seed. A did OR a seed is required, but
-        not both. The did will be used if both are given. Needed to get
-        validator info.
+    :param seed : A steward or trustee seed. Needed to get validator info.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
     :type seed: str
     :param wallet_name: The name of the wallet to use when getting validator
@@ -190,21 +297,42 @@ def get_validator_info_from_sdk(genesis_file: str, did: str,
     :param pool: The pool to connect to when getting validator info.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
     :type pool: str
-    :param timeout: How long indy-cli can take to perform the operation before
-        timing out.
+    :param timeout: How long to wait for each node to reply.
         Optional.
         (Default: chaosindy.common.DEFAULT_CHAOS_GET_VALIDATOR_INFO_TIMEOUT)
     :type timeout: Union[str,int]
-    :param ssh_config_file: The relative or absolute path to the SSH config
-        file.
+    :param ssh_config_file: Not used. Kept for a signature common with the
+        other validator info sources.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SSH_CONFIG_FILE)
     :type ssh_config_file: str
     :return: bool
     """
-    #output_dir = get_chaos_temp_dir()
-    #return True
-    logger.error("NYI - get_validator_info_from_sdk is not yet implemented.")
-    return False
+    output_dir = get_chaos_temp_dir()
+    aliases = get_aliases(genesis_file)
+    logger.debug("Getting validator data from %d nodes using indy-sdk...",
+                 len(aliases))
+
+    loop = asyncio.get_event_loop()
+    try:
+        # NOTE: Allow 5 seconds more than nodes are given to reply to open the
+        #       session on the first call
+        validator_info = loop.run_until_complete(asyncio.wait_for(
+            get_validator_info_from_nodes(aliases, output_dir,
+                                          genesis_file=genesis_file,
+                                          seed=seed, pool_name=pool,
+                                          wallet_name=wallet_name,
+                                          wallet_key=wallet_key,
+                                          timeout=int(timeout)),
+            timeout=int(timeout) + 5))
+    except Exception as e:
+        logger.error("Failed to get validator info using indy-sdk")
+        logger.exception(e)
+        return False
+
+    quorum = len(aliases) - (len(aliases) - 1) // 3
+    logger.debug("are_queried: %d quorum: %d len-aliases: %d",
+                 len(validator_info), quorum, len(aliases))
+    return len(validator_info) >= quorum
 
 
 def get_validator_info_from_cli(genesis_file: str, did: str,
@@ -426,7 +554,8 @@ def get_validator_info(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
     wallet_key: str = DEFAULT_CHAOS_WALLET_KEY, pool: str = DEFAULT_CHAOS_POOL,
     timeout: Union[str,int] = DEFAULT_CHAOS_GET_VALIDATOR_INFO_TIMEOUT,
     ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE,
-    source: int = DEFAULT_CHAOS_VALIDATOR_INFO_SOURCE) -> bool:
+    source: int = DEFAULT_CHAOS_VALIDATOR_INFO_SOURCE,
+    ttl: Union[str,int] = DEFAULT_CHAOS_VALIDATOR_INFO_TTL) -> bool:
     """
     Get validator info
 
@@ -439,7 +568,9 @@ def get_validator_info(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
         This option provides quicker results, but the data may be up to 60
         seconds stale/out-of-date.  See ValidatorInfoSource.NODE in
         chaosindy/common.
-      - Possibly Indy SDK - TBD
+      - Indy SDK, sending one request to all nodes at once over a session
+        kept open between calls and returning once a quorum of nodes replied.
+        See ValidatorInfoSource.SDK in chaosindy/common.
 
     :param genesis_file: The relative or absolute path to a genesis file.
         Required.
@@ -479,8 +610,66 @@ def get_validator_info(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
         Options: see chaosindy.common.ValidatorInfoSource
         - NODE (1) - validator-info script executed on each node
         - CLI (2) - Indy CLI
-        - SDK (3) - Not Yet Implemented - Use Indy SDK
+        - SDK (3) - Indy SDK
     :type source: int
+    :param ttl: How old (in seconds) validator info collected by a previous
+        call may be to be reused. See ValidatorInfoCache.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_VALIDATOR_INFO_TTL)
+    :type ttl: Union[str,int]
+    :return: bool
+    """
+    key = (expanduser(genesis_file), int(source))
+    cached = validator_info_cache.get(key, ttl=int(ttl))
+    if cached:
+        logger.debug("Using validator info collected %.1f seconds ago",
+                     time.monotonic() - cached.collected_at)
+        return cached.succeeded
+
+    succeeded = collect_validator_info(genesis_file, did=did, seed=seed,
+                                       wallet_name=wallet_name,
+                                       wallet_key=wallet_key, pool=pool,
+                                       timeout=timeout,
+                                       ssh_config_file=ssh_config_file,
+                                       source=source)
+    validator_info_cache.put(key, succeeded, load_validator_info(genesis_file))
+    return succeeded
+
+
+def get_validator_info_by_alias(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
+    seed: str = DEFAULT_CHAOS_SEED,
+    wallet_name: str = DEFAULT_CHAOS_WALLET_NAME,
+    wallet_key: str = DEFAULT_CHAOS_WALLET_KEY, pool: str = DEFAULT_CHAOS_POOL,
+    timeout: Union[str,int] = DEFAULT_CHAOS_GET_VALIDATOR_INFO_TIMEOUT,
+    ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE,
+    source: int = DEFAULT_CHAOS_VALIDATOR_INFO_SOURCE,
+    ttl: Union[str,int] = DEFAULT_CHAOS_VALIDATOR_INFO_TTL
+    ) -> Dict[str, NodeValidatorInfo]:
+    """
+    Get parsed validator info of each node, collecting it only if the cached
+    one is older than ttl. Takes the same parameters as get_validator_info.
+    Nodes validator info could not be collected from are left out.
+
+    :return: Dict[str, NodeValidatorInfo]
+    """
+    get_validator_info(genesis_file, did=did, seed=seed,
+                       wallet_name=wallet_name, wallet_key=wallet_key,
+                       pool=pool, timeout=timeout,
+                       ssh_config_file=ssh_config_file, source=source, ttl=ttl)
+    cached = validator_info_cache.get((expanduser(genesis_file), int(source)))
+    return cached.validator_info if cached else {}
+
+
+def collect_validator_info(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
+    seed: str = DEFAULT_CHAOS_SEED,
+    wallet_name: str = DEFAULT_CHAOS_WALLET_NAME,
+    wallet_key: str = DEFAULT_CHAOS_WALLET_KEY, pool: str = DEFAULT_CHAOS_POOL,
+    timeout: Union[str,int] = DEFAULT_CHAOS_GET_VALIDATOR_INFO_TIMEOUT,
+    ssh_config_file: str = DEFAULT_CHAOS_SSH_CONFIG_FILE,
+    source: int = DEFAULT_CHAOS_VALIDATOR_INFO_SOURCE) -> bool:
+    """
+    Collect validator info from the pool, bypassing the cache. Takes the same
+    parameters as get_validator_info.
+
     :return: bool
     """
     logger.debug("Getting validator info timeout: %d", int(timeout))
@@ -498,7 +687,7 @@ def get_validator_info(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
                                            ssh_config_file=ssh_config_file)
     elif source == ValidatorInfoSource.SDK.value:
         logger.debug("Getting validator info using indy-sdk")
-        return get_validator_info_from_sdk(genesis_file, did=did, seed=seed,
+        return get_validator_info_from_sdk(genesis_file, seed=seed,
                                            wallet_name=wallet_name,
                                            wallet_key=wallet_key, pool=pool,
                                            timeout=timeout,
@@ -553,19 +742,18 @@ def detect_primary(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
     :return: bool
     """
     # 1. Get validator info from all nodes
-    get_validator_info(genesis_file, did=did, seed=seed,
-                       wallet_name=wallet_name,
-                       wallet_key=wallet_key, pool=pool, timeout=timeout,
-                       ssh_config_file=ssh_config_file)
+    validator_info = get_validator_info_by_alias(genesis_file, did=did,
+                                                 seed=seed,
+                                                 wallet_name=wallet_name,
+                                                 wallet_key=wallet_key,
+                                                 pool=pool, timeout=timeout,
+                                                 ssh_config_file=ssh_config_file)
     output_dir = get_chaos_temp_dir()
 
     logger.debug("genesis_file: %s ssh_config_file: %s", genesis_file,
                  ssh_config_file)
     # 2. Open genesis_file and load all aliases into an array
-    aliases = []
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            aliases.append(json.loads(line)['txn']['data']['data']['alias'])
+    aliases = get_aliases(genesis_file)
     logger.debug(str(aliases))
 
     # Get the list of currently participating validator nodes
@@ -591,40 +779,15 @@ def detect_primary(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
             continue
         count_participating += 1
         logger.debug("alias to query primary from validator info: %s", alias)
-        validator_info = join(output_dir, "{}-validator-info".format(alias))
-        logger.debug("Extract primary from %s", validator_info)
-
-        try:
-            with open(validator_info, 'r') as f:
-                node_info = json.load(f)
-
-            # For each node, Indy CLI returns json in a 'data' element
-            if 'data' in node_info:
-                data_node_info = node_info['data']['Node_info']
-                replica_status = data_node_info['Replicas_status']
-                primary = replica_status["{}:0".format(alias)]['Primary']
-                primary = primary.split(":", 1)[0] if primary else None
-                mode = data_node_info['Mode']
-            else:
-                # For each node, validator-info script does NOT return json in a
-                # 'data' element
-                replica_status = node_info['Node_info']['Replicas_status']
-                primary = replica_status["{}:0".format(alias)]['Primary']
-                primary = primary.split(":", 1)[0] if primary else None
-                mode = node_info['Node_info']['Mode']
-        except (FileNotFoundError, json.decoder.JSONDecodeError) as e:
-            #logger.exception(e)
-            logger.info("Failed to load validator info for alias " \
-                        "{}".format(alias))
+        node_info = validator_info.get(alias)
+        if node_info:
+            primary = node_info.primary
+            mode = node_info.mode
+        else:
             logger.info("Setting primary to Unknown for alias {}".format(alias))
             primary = "Unknown"
             logger.info("Setting mode to Unknown for alias {}".format(alias))
             mode = "Unknown"
-        except Exception as e:
-            logger.error("Failed to load validator info for alias " \
-                         "{}".format(alias))
-            logger.exception(e)
-            return False
 
         # Set the alias' primary
         alias_map = primary_map.get(alias, {})
@@ -718,19 +881,18 @@ def detect_mode(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
     :return: bool
     """
     # 1. Get validator info from all nodes
-    get_validator_info(genesis_file, did=did, seed=seed,
-                       wallet_name=wallet_name,
-                       wallet_key=wallet_key, pool=pool, timeout=timeout,
-                       ssh_config_file=ssh_config_file)
+    validator_info = get_validator_info_by_alias(genesis_file, did=did,
+                                                 seed=seed,
+                                                 wallet_name=wallet_name,
+                                                 wallet_key=wallet_key,
+                                                 pool=pool, timeout=timeout,
+                                                 ssh_config_file=ssh_config_file)
     output_dir = get_chaos_temp_dir()
 
     logger.debug("genesis_file: %s ssh_config_file: %s", genesis_file,
                  ssh_config_file)
     # 2. Open genesis_file and load all aliases into an array
-    aliases = []
-    with open(expanduser(genesis_file), 'r') as genesisfile:
-        for line in genesisfile:
-            aliases.append(json.loads(line)['txn']['data']['data']['alias'])
+    aliases = get_aliases(genesis_file)
     logger.debug(str(aliases))
 
     # 3. Get mode from each nodes validator-info
@@ -741,26 +903,12 @@ def detect_mode(genesis_file: str, did: str = DEFAULT_CHAOS_DID,
     tried_to_query= 0
     for alias in aliases:
         logger.debug("alias to query mode from validator info: %s", alias)
-        validator_info = join(output_dir, "{}-validator-info".format(alias))
-        logger.debug("Extract mode from %s", validator_info)
-
-        try:
-            with open(validator_info, 'r') as f:
-                node_info = json.load(f)
-            if 'data' in node_info:
-                mode = node_info['data']['Node_info']['Mode']
-            else:
-                mode = node_info['Node_info']['Mode']
-        except FileNotFoundError:
-            logger.info("Failed to load validator info for alias " \
-                        "{}".format(alias))
+        node_info = validator_info.get(alias)
+        if node_info:
+            mode = node_info.mode
+        else:
             logger.info("Setting mode to Unknown for alias {}".format(alias))
             mode = "Unknown"
-        except Exception as e:
-            logger.error("Failed to load validator info for alias " \
-                         "{}".format(alias))
-            logger.exception(e)
-            return False
 
         logger.info("%s's mode is %s", alias, mode)
         # Set the alias' mode
@@ -1,7 +1,8 @@
 import argparse
 import sys
 
-from chaosindy.ledger_interaction import write_nym_and_check
+from chaosindy.ledger_interaction import (write_nym_and_check,
+    write_nyms_and_check)
 from chaosindy.helpers import run
 from logzero import logger
 
@@ -10,48 +11,66 @@ from typing import Union
 
 def write_nym(seed: str, genesis_file: str, pool_name: str = None,
               my_wallet_name: str = None, their_wallet_name: str = None,
-              timeout: Union[str,int] = '60') -> None:
+              timeout: Union[str,int] = '60',
+              count: Union[str,int] = 1) -> bool:
     """
-    Write a NYM to the ledger.
+    Write NYMs to the ledger.
 
-    Write a NYM to the ledger and confirm/check that it was successfull by
-    reading the NYM from the ledger. Not idempotent.
+    Write NYMs to the ledger and confirm/check that it was successfull by
+    reading each NYM from the ledger. Not idempotent. The pool and wallet are
+    opened by the first call and reused by the following ones.
 
     :param seed: 32 byte string used to generate did, verkey pair. The seed must
         be the seed for a Trustee, Steward, or Trust Anchor.
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_SEED)
     :type seed: str
+    :param genesis_file: Relative or absolute path to the pool's genesis
+        transaction file.
+        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
+    :type genesis_file: str
     :param pool_name: Pool name
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_POOL)
     :type pool_name: str
     :param my_wallet_name: My wallet name
         Optional. (Default: chaosindy.common.DEFAULT_CHAOS_MY_WALLET_NAM)
     :type my_wallet_name: str
-    :param my_wallet_key: My wallet key
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
-    :type my_wallet_key: str
-    :param their_wallet_name: Their wallet name
-        Optional. (Default: chaosindy.common.DEFAULT_THEIR_WALLET_NAME)
+    :param their_wallet_name: Unused. The seed DID is kept in my wallet.
+        Optional. (Default: None)
     :type their_wallet_name: str
-    :param their_wallet_key: Their wallet key
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_WALLET_KEY)
-    :type their_wallet_key: str
-    :param genesis_file: Relative or absolute path to the pool's genesis
-        transaction file.
-        Optional. (Default: chaosindy.common.DEFAULT_CHAOS_GENESIS_FILE)
-    :type genesis_file: str
-    :param cleanup: Delete wallets and pool configuration?
-        Optional. (Default: True)
-    :type cleanup: bool
-    :return: None
+    :param timeout: How long writing and checking all NYMs may take.
+        Optional. (Default: 60)
+    :type timeout: Union[str,int]
+    :param count: How many NYMs to write at the same time.
+        Optional. (Default: 1)
+    :type count: Union[str,int]
+    :return: bool
     """
     logger.debug("seed: %s genesis_file: %s pool_name: %s my_wallet_name: %s " \
-                 "their_wallet_name: %s timeout: %s", seed, genesis_file,
-                 pool_name, my_wallet_name, their_wallet_name, timeout)
-    return run(write_nym_and_check, seed=seed, pool_name=pool_name,
-               my_wallet_name=my_wallet_name,
-               their_wallet_name=their_wallet_name, genesis_file=genesis_file,
-               timeout=int(timeout))
+                 "their_wallet_name: %s timeout: %s count: %s", seed,
+                 genesis_file, pool_name, my_wallet_name, their_wallet_name,
+                 timeout, count)
+    results = []
+
+    async def write_and_check():
+        results.extend(await write_nyms_and_check(count=int(count), seed=seed,
+                                                  pool_name=pool_name,
+                                                  wallet_name=my_wallet_name,
+                                                  genesis_file=genesis_file))
+
+    if not run(write_and_check, timeout=int(timeout)):
+        return False
+
+    succeeded = True
+    for result in results:
+        if result.error is not None:
+            logger.error("Failed to write and check NYM %s: %s", result.did,
+                         result.error)
+            succeeded = False
+        else:
+            logger.info("Wrote NYM %s in %.3f seconds, read it in %.3f " \
+                        "seconds", result.did, result.write_latency,
+                        result.read_latency)
+    return succeeded
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
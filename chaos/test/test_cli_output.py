@@ -0,0 +1,66 @@
+from chaosindy.common.cli import parse_payment_source_rows
+from chaosindy.common.cli.cli_output import is_error_line, parse_cli_output
+
+TRANSCRIPT = b'''indy> wallet open w1 key=k
+Wallet "w1" has been opened
+wallet(w1):indy> load-plugin library=libnullpay.so initializer=nullpay_init
+Plugin has been loaded: "libnullpay.so"
+wallet(w1):indy> ledger mint-prepare outputs=(pay:null:a,100)
+MINT transaction has been created:
+     {"operation":{"type":"10000","outputs":[]},"reqId":1}
+pool(p1):wallet(w1):indy> ledger get-payment-sources payment_address=pay:null:a
++--------------+-------------------+--------+-------+
+| Source       | Payment Address   | Amount | Extra |
++--------------+-------------------+--------+-------+
+| txo:null:1   | pay:null:a        | 100    |       |
++--------------+-------------------+--------+-------+
+| txo:null:2   | pay:null:a        | 5      | 1     |
++--------------+-------------------+--------+-------+
+pool(p1):wallet(w1):indy> ledger get-payment-sources payment_address=pay:null:b
+\x1b[1;31mPayment address not found\x1b[0m
+Batch execution failed at line 5
+'''
+
+
+def test_parse_cli_output():
+    output = parse_cli_output(TRANSCRIPT)
+
+    assert output.failed
+    assert output.failed_line == 5
+    assert [command.command for command in output.commands] == [
+        'wallet open w1 key=k',
+        'load-plugin library=libnullpay.so initializer=nullpay_init',
+        'ledger mint-prepare outputs=(pay:null:a,100)',
+        'ledger get-payment-sources payment_address=pay:null:a',
+        'ledger get-payment-sources payment_address=pay:null:b']
+    assert [command.failed for command in output.commands] == [
+        False, False, False, False, True]
+    assert output.find_lines('has been opened') == \
+        ['Wallet "w1" has been opened']
+
+    [body] = output.json('ledger mint-prepare')
+    assert body.value['reqId'] == 1
+    assert body.text.startswith('{"operation"')
+
+    sources = output.commands[3]
+    [table] = sources.tables
+    assert table.header == ['Source', 'Payment Address', 'Amount', 'Extra']
+    assert table.rows == [['txo:null:1', 'pay:null:a', '100', ''],
+                          ['txo:null:2', 'pay:null:a', '5', '1']]
+    assert parse_payment_source_rows(
+        output.rows('ledger get-payment-sources')) == {
+            'txo:null:1': {'payment_address': 'pay:null:a', 'amount': 100,
+                           'extra': 0},
+            'txo:null:2': {'payment_address': 'pay:null:a', 'amount': 5,
+                           'extra': 1}}
+    assert output.commands[4].lines == ['Payment address not found']
+
+
+def test_is_error_line():
+    assert is_error_line('Wallet "w1" not found or unavailable')
+    assert is_error_line('Pool "p1" does not exist.')
+    assert is_error_line('Transaction has been rejected: fake')
+    assert is_error_line('\x1b[1;31mPayment address not found\x1b[0m')
+    assert not is_error_line('NYM not found')
+    assert not is_error_line('| txo:null:1 | Wallet "w1" not found |')
+    assert not is_error_line('{"reason": "Error: Invalid signature"}')
@@ -0,0 +1,181 @@
+import os
+import stat
+import sys
+import tempfile
+
+from chaosindy.common.cli.cli_runner import (BatchIndex, CliRunner,
+    CliSession, close_cli_sessions, get_batch_index)
+
+# Emulates indy-cli reading commands from a pipe: prints a prompt showing the
+# open wallet and pool, but no colours, and logs every command it runs but the
+# 'show' of the session marker. 'crash' fails like a batch run from a pipe does.
+FAKE_CLI = '''#!{python}
+import sys
+wallet = None
+pool = None
+log = open({log!r}, 'a')
+
+def prompt():
+    state = ''
+    if pool:
+        state += 'pool({{}}):'.format(pool)
+    if wallet:
+        state += 'wallet({{}}):'.format(wallet)
+    sys.stdout.write(state + 'indy> ')
+    sys.stdout.flush()
+
+prompt()
+for line in sys.stdin:
+    words = line.split()
+    if words[0] == 'show':
+        print(open(words[1]).read().strip())
+        prompt()
+        continue
+    log.write(line)
+    log.flush()
+    if words == ['exit']:
+        break
+    if words[:2] == ['wallet', 'open']:
+        wallet = words[2]
+        print('Wallet "{{}}" has been opened'.format(wallet))
+    elif words == ['wallet', 'close']:
+        print('Wallet "{{}}" has been closed'.format(wallet))
+        wallet = None
+    elif words[:2] == ['pool', 'connect']:
+        pool = words[2]
+        print('Pool "{{}}" has been connected'.format(pool))
+    elif words == ['fail']:
+        print('Transaction has been rejected: fake')
+    elif words == ['crash']:
+        print('Batch execution failed at line 1')
+        break
+    else:
+        print('ran ' + line.strip())
+        print('+------+')
+    prompt()
+'''
+
+
+def write_fake_cli(directory):
+    cli = os.path.join(directory, 'fake-indy-cli')
+    with open(cli, 'w') as f:
+        f.write(FAKE_CLI.format(python=sys.executable,
+                                log=os.path.join(directory, 'log')))
+    os.chmod(cli, os.stat(cli).st_mode | stat.S_IEXEC)
+    return cli
+
+
+def read_log(directory):
+    with open(os.path.join(directory, 'log')) as f:
+        return [line.strip() for line in f]
+
+
+def test_cli_session_reuses_wallet_and_pool():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session = CliSession(write_fake_cli(temp_dir), timeout=10)
+        try:
+            batch = "### OPENING WALLET ###\nwallet open w1 key=k\n" \
+                    "pool connect p1\nledger get-nym did=1\n" \
+                    "pool disconnect\nwallet close\nexit\n"
+            results = session.run_batch(batch)
+            assert [r.command for r in results if not r.skipped] == \
+                ['wallet open w1 key=k', 'pool connect p1',
+                 'ledger get-nym did=1']
+            assert results[3].output == b'ran ledger get-nym did=1\n+------+\n'
+            assert not any(r.failed for r in results)
+
+            # The second batch only runs the command itself
+            session.run_batch(batch)
+            results = session.run_batch(
+                "wallet open w2 key=k\nfail\nledger get-nym did=2\n")
+            assert results[-1].command == 'fail'
+            assert results[-1].failed
+            assert results[-1].output == b'Transaction has been rejected: fake\n'
+        finally:
+            session.close()
+
+        assert read_log(temp_dir) == [
+            'wallet open w1 key=k', 'pool connect p1', 'ledger get-nym did=1',
+            'ledger get-nym did=1', 'wallet close', 'wallet open w2 key=k',
+            'fail', 'exit']
+
+
+def test_cli_session_did_and_exit():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        session = CliSession(write_fake_cli(temp_dir), timeout=10)
+        try:
+            batch = "wallet open w1 key=k\ndid use d1\nledger nym did=1\n"
+            session.run_batch(batch)
+            session.run_batch(batch)
+            # A batch using no did does not get the one of the previous batch
+            session.run_batch("wallet open w1 key=k\nledger get-nym did=1\n")
+
+            # The CLI exiting on a failure fails the command and the session
+            # starts again on the next command
+            [result] = session.run_batch("crash\n")
+            assert result.failed
+            assert session.wallet is None
+            assert not session.run_batch("ledger get-nym did=2")[0].failed
+        finally:
+            session.close()
+
+        assert read_log(temp_dir) == [
+            'wallet open w1 key=k', 'did use d1', 'ledger nym did=1',
+            'ledger nym did=1', 'wallet close', 'wallet open w1 key=k',
+            'ledger get-nym did=1', 'crash', 'ledger get-nym did=2', 'exit']
+
+
+def test_cli_runner_persistent_transcript():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cli = write_fake_cli(temp_dir)
+        runner = CliRunner(temp_dir, cli_cmd_name=cli, persistent=True)
+        try:
+            rtn = runner.run("wallet open w1\nfail\nexit\n", "fail-batch")
+            assert rtn.return_code == 1
+            assert b"indy> wallet open w1\n" in rtn.std_out
+            assert b"Batch execution failed at line 2" in rtn.std_out
+            [out_file] = runner.find_batches('fail-batch')
+            with open(out_file, 'rb') as f:
+                assert f.read() == rtn.std_out
+        finally:
+            close_cli_sessions()
+
+
+def test_batch_index_names_and_retention():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = BatchIndex(temp_dir, max_batches=3)
+        names = [index.reserve(run_name)
+                 for run_name in ['create-pool', 'mint', 'mint', 'mint']]
+        assert names == ['create-pool-00001', 'mint-00002', 'mint-00003',
+                         'mint-00004']
+        assert index.find('create-pool') == []
+        assert index.find('mint') == names[1:]
+        assert not os.path.exists(os.path.join(temp_dir,
+                                               'create-pool-00001.cli.in'))
+
+        # Another process carries on the sequence and sees the same batches
+        index = BatchIndex(temp_dir, max_batches=3)
+        assert index.find('mint') == names[1:]
+        assert index.reserve('mint') == 'mint-00005'
+
+        # A name reserved by another process is skipped
+        open(os.path.join(temp_dir, 'mint-00006.cli.in'), 'w').close()
+        assert index.reserve('mint') == 'mint-00007'
+
+        # The index file is compacted to the retained batches once it has
+        # more than twice as many entries
+        for _ in range(3):
+            index.reserve('mint')
+        with open(os.path.join(temp_dir, BatchIndex.INDEX_FILE_NAME)) as f:
+            assert [line.split()[2] for line in f] == [
+                'mint-00005', 'mint-00007', 'mint-00008', 'mint-00009',
+                'mint-00010']
+        assert index.find('mint') == ['mint-00008', 'mint-00009', 'mint-00010']
+        assert not os.path.exists(os.path.join(temp_dir, 'mint-00007.cli.in'))
+
+
+def test_batch_index_retention_is_fixed():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = get_batch_index(temp_dir, max_batches=3)
+        assert get_batch_index(temp_dir, max_batches=1) is index
+        assert index.max_batches == 3
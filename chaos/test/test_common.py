@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+
+from chaosindy.common import (get_aliases, get_genesis_index,
+    get_info_by_node_name)
+
+
+def write_genesis_file(genesis_file, aliases, mtime):
+    with open(genesis_file, 'w') as f:
+        for i, alias in enumerate(aliases, start=1):
+            txn = {'txn': {'data': {'dest': 'dest{}'.format(i), 'data': {
+                'alias': alias, 'node_ip': '10.0.0.{}'.format(i),
+                'node_port': 9700 + i, 'client_ip': '10.0.0.{}'.format(i),
+                'client_port': 9800 + i}}}}
+            f.write(json.dumps(txn) + '\n')
+    os.utime(genesis_file, (mtime, mtime))
+
+
+def test_genesis_index():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        genesis_file = os.path.join(temp_dir, 'pool_transactions_genesis')
+        write_genesis_file(genesis_file, ['Node1', 'Node2'], 1000)
+
+        index = get_genesis_index(genesis_file)
+        assert index.aliases == ['Node1', 'Node2']
+        assert index.get('Node2').dest == 'dest2'
+        assert index.get('Node2').node_port == 9702
+        assert index.get('Node3') is None
+        assert get_info_by_node_name(genesis_file, 'Node1')['client_port'] == 9801
+        assert get_info_by_node_name(genesis_file, 'Node1',
+                                     path='txn.data')['dest'] == 'dest1'
+        assert get_info_by_node_name(genesis_file, 'Node3') is None
+
+        # Unchanged file is parsed only once
+        assert get_genesis_index(genesis_file) is index
+
+        # Changed file is parsed again
+        write_genesis_file(genesis_file, ['Node1', 'Node2', 'Node3'], 2000)
+        assert get_aliases(genesis_file) == ['Node1', 'Node2', 'Node3']
+        assert get_genesis_index(genesis_file) is not index
+
+
+def test_genesis_index_duplicate_alias():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        genesis_file = os.path.join(temp_dir, 'pool_transactions_genesis')
+        write_genesis_file(genesis_file, ['Node1', 'Node2', 'Node1'], 1000)
+        assert get_info_by_node_name(genesis_file, 'Node1',
+                                     path='txn.data')['dest'] == 'dest1'
@@ -1,20 +1,84 @@
 import logging
+import os
+import socket
 import tempfile
+import time
 import pytest
 
+import chaosindy.execute.execute as execute_module
 from chaosindy.execute.execute import *
+from invoke.exceptions import CommandTimedOut
 from test import patch
 
 
 def noop_do_execute(*args, **kwargs):
     args[0].put(Result(return_code=0, stdout='devin\n', stderr=''))
 
-def parallel_noop_do_execute(*args, **kwargs):
-    with open('/tmp/corin.txt', 'a') as f:
-        f.write("In parallel_noop_do_execute...")
-        f.write("Writing ParallelResul to results queue...")
-        args[0].put(ParallelResult(args[1], return_code=0, stdout='corin\n', stderr=''))
-        f.write("Wrote ParallelResul to results queue...")
+def parallel_noop_do_execute(self, host, action, **kwargs):
+    return ParallelResult(host, return_code=0, stdout='corin\n', stderr='')
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = False
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        pass
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+
+class FakeConnection(object):
+    opened = 0
+    ran = 0
+    # Errors raised by the next opens
+    open_errors = []
+
+    def __init__(self, host, **kwargs):
+        self.host = host
+        self.is_connected = False
+        self.transport = FakeTransport()
+
+    def open(self):
+        FakeConnection.opened += 1
+        if FakeConnection.open_errors:
+            raise FakeConnection.open_errors.pop(0)
+        self.is_connected = True
+        self.transport.active = True
+
+    def close(self):
+        self.is_connected = False
+        self.transport.active = False
+
+    def run(self, action, hide=True, timeout=None, warn=False):
+        FakeConnection.ran += 1
+        if action == 'drop':
+            # The connection dies once the command was sent
+            raise EOFError()
+        if action == 'sleep':
+            raise CommandTimedOut(None, timeout)
+        if action == 'hang':
+            # A host which does not honour the command timeout
+            time.sleep(1)
+        if action == 'false':
+            return Result(return_code=1, stdout='', stderr='failed\n')
+        return Result(return_code=0, stdout='{}\n'.format(self.host), stderr='')
+
+    sudo = run
+
+
+@pytest.fixture
+def fake_connections():
+    FakeConnection.opened = 0
+    FakeConnection.ran = 0
+    FakeConnection.open_errors = []
+    with patch(execute_module, 'Connection', FakeConnection):
+        with patch(execute_module, 'connection_pool', ConnectionPool()) as pool:
+            yield pool
 
 
 def test_verify_identity_file():
@@ -41,7 +105,7 @@ def test_verify_identity_file():
 
 
 def test_simple_fabric_test():
-    executor = FabricExecutor()
+    executor = FabricExecutor(persistent_connections=False)
     with tempfile.NamedTemporaryFile(mode='w') as f:
         f.write("")
         f.flush()
@@ -58,29 +122,16 @@ def test_simple_parallel_fabric_test(caplog):
     with tempfile.NamedTemporaryFile(mode='w') as f:
         f.write("")
         f.flush()
-        # TODO: mock _parallel_execute_on_host to return a ParallelResult
-        #       (4 tuple) for each host.
-        #
-        # I have tried to patch _parallel_execute_on_host with
-        # parallel_noop_do_execute with _parallel_execute_on_host decordated with
-        # and without @staticmethod. No change in behavior. All Processes spawned
-        # call the ParallelFabricExecutor.__init__ and use an un-patched
-        # instance. Additional mocking must be done to get this right. Until then
-        # _parallel_execute_on_host will return a static ParallelResult if the
-        # 'action' is "pytest".
-        #
-        # Perhaps mocking Process or Pool in the multiprocess package will be
-        # required to get this working properly?
-        #
-        #with patch(ParallelFabricExecutor, '_parallel_execute_on_host',
-        #           parallel_noop_do_execute):
-        #    rtn = executor.execute(['Node1', 'Node2'],
-        #                           'echo "corin"',
-        #                           user='ubuntu',
-        #                           identity_file=f.name)
-        #    for key in rtn.keys():
-        #        assert rtn[key]['return_code'] == 0
-        #        assert rtn[key]['stdout'] == 'corin\n'
+        with patch(ParallelFabricExecutor, '_parallel_execute_on_host',
+                   parallel_noop_do_execute):
+            rtn = executor.execute(['Node1', 'Node2'],
+                                   'echo "corin"',
+                                   user='ubuntu',
+                                   identity_file=f.name)
+            assert sorted(rtn.keys()) == ['Node1', 'Node2']
+            for key in rtn.keys():
+                assert rtn[key]['return_code'] == 0
+                assert rtn[key]['stdout'] == 'corin\n'
         rtn = executor.execute(['Node1', 'Node2'],
                                 'pytest',
                                 user='ubuntu',
@@ -98,7 +149,166 @@ IdentityFile /tmp/QA-Pool.pem"""
         f.write(ssh_config)
         f.flush()
 
-        executor = FabricExecutor(ssh_config_file=f.name)
+        executor = FabricExecutor(ssh_config_file=f.name,
+                                  persistent_connections=False)
         with patch(FabricExecutor, '_multiprocess_execute_on_host', noop_do_execute):
             rtn = executor.execute('Node1', 'echo "devin"')
             assert rtn.return_code == 0
+
+
+def test_pooled_fabric_reuses_connection(fake_connections):
+    executor = FabricExecutor()
+    assert executor.execute('Node1', 'echo "devin"').stdout == 'Node1\n'
+    assert FabricExecutor().execute('Node1', 'echo "devin"',
+                                    as_sudo=True).return_code == 0
+    assert FakeConnection.opened == 1
+
+    executor.execute('Node2', 'echo "devin"')
+    assert FakeConnection.opened == 2
+
+
+def test_pooled_fabric_reconnects_dead_connection(fake_connections):
+    executor = FabricExecutor()
+    executor.execute('Node1', 'echo "devin"')
+    with fake_connections.connection(
+            'Node1', executor.config,
+            connect_timeout=10) as connection:
+        assert FakeConnection.opened == 1
+        connection.close()
+
+    assert executor.execute('Node1', 'echo "devin"').return_code == 0
+    assert FakeConnection.opened == 2
+
+
+def test_pooled_fabric_does_not_rerun_commands(fake_connections):
+    executor = FabricExecutor()
+    with pytest.raises(EOFError):
+        executor.execute('Node1', 'drop')
+    assert FakeConnection.ran == 1
+
+    # The dropped connection is reopened on the next use
+    assert executor.execute('Node1', 'echo "devin"').return_code == 0
+    assert FakeConnection.opened == 2
+
+
+def test_pooled_fabric_retries_connect(fake_connections):
+    FakeConnection.open_errors = [ConnectionResetError()]
+    assert FabricExecutor().execute('Node1', 'echo "devin"').return_code == 0
+    assert FakeConnection.opened == 2
+
+    # Timeouts are not retried
+    FakeConnection.open_errors = [socket.timeout()]
+    with pytest.raises(socket.timeout):
+        FabricExecutor().execute('Node2', 'echo "devin"')
+    assert FakeConnection.opened == 3
+
+
+def test_pooled_fabric_forgotten_in_forked_child(fake_connections):
+    FabricExecutor().execute('Node1', 'echo "devin"')
+    pid = os.fork()
+    if pid == 0:
+        # The child must not touch the parent's connections
+        os._exit(len(execute_module.connection_pool._connections))
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert len(fake_connections._connections) == 1
+
+
+def test_pooled_fabric_timeout(fake_connections):
+    with pytest.raises(Exception, match="exceeded timeout"):
+        FabricExecutor().execute('Node1', 'sleep', timeout=1)
+
+
+def test_parallel_fabric_reuses_executor(fake_connections):
+    hosts = ['Node{}'.format(i) for i in range(1, 9)]
+    with ParallelFabricExecutor(fan_out=3) as executor:
+        for _ in range(2):
+            rtn = executor.execute(hosts, 'echo "corin"', as_sudo=True)
+            assert sorted(rtn.keys()) == sorted(hosts)
+            for host in hosts:
+                assert rtn[host]['return_code'] == 0
+                assert rtn[host]['stdout'] == '{}\n'.format(host)
+    assert FakeConnection.opened == len(hosts)
+
+
+def test_parallel_fabric_streams_failures(fake_connections):
+    executor = ParallelFabricExecutor()
+    results = list(executor.execute_stream(['Node1', 'Node2'], 'sleep',
+                                           timeout=1))
+    assert sorted(result.host for result in results) == ['Node1', 'Node2']
+    for result in results:
+        assert result.return_code == -1
+        assert 'exceeded timeout' in result.stderr
+
+
+def test_parallel_fabric_gives_up_on_hung_hosts(fake_connections):
+    with ParallelFabricExecutor(fan_out=1) as executor:
+        started = time.perf_counter()
+        rtn = executor.execute(['Node1', 'Node2'], 'hang', timeout=0.1,
+                               connect_timeout=0.1)
+        assert time.perf_counter() - started < 1
+    assert sorted(rtn.keys()) == ['Node1', 'Node2']
+    for host in rtn:
+        assert rtn[host]['return_code'] == -1
+        assert 'exceeded timeout' in rtn[host]['stderr']
+
+
+def test_parallel_fabric_batch(fake_connections):
+    commands = {
+        'Node1': ['echo "one"', 'echo "two"'],
+        'Node2': ['echo "one"', 'false', 'echo "three"'],
+        'Node3': ['sleep']
+    }
+    rtn = ParallelFabricExecutor().execute_batch(commands, as_sudo=True,
+                                                 timeout=1)
+    assert FakeConnection.opened == 3
+
+    assert batch_succeeded(rtn['Node1'], commands['Node1'])
+    assert [r.stdout for r in rtn['Node1'].results] == ['Node1\n', 'Node1\n']
+
+    # Commands after a failed one are not run
+    assert not batch_succeeded(rtn['Node2'], commands['Node2'])
+    assert [r.return_code for r in rtn['Node2'].results] == [0, 1]
+
+    assert rtn['Node3'].results == []
+    assert 'exceeded timeout' in rtn['Node3'].error
+
+
+def test_parallel_fabric_chained_output():
+    commands = ['echo "one"; echo "err" >&2', "printf 'two'", 'false',
+                'echo "never"']
+    marker = 'chaosindy-test'
+    stdout = 'chaosindy-test begin 0 1000000000\none\n\n' \
+             'chaosindy-test end 0 0 1500000000\n' \
+             'chaosindy-test begin 1 1500000000\ntwo\n' \
+             'chaosindy-test end 1 0 2000000000\n' \
+             'chaosindy-test begin 2 2000000000\n\n' \
+             'chaosindy-test end 2 1 2000000000\n'
+    stderr = 'chaosindy-test 0\nerr\nchaosindy-test 1\nchaosindy-test 2\n'
+    results = ParallelFabricExecutor._split_chained_output(commands, marker,
+                                                           stdout, stderr)
+    assert results == [
+        CommandResult(commands[0], 0, 'one\n', 'err\n', 0.5),
+        CommandResult(commands[1], 0, 'two', '', 0.5),
+        CommandResult(commands[2], 1, '', '', 0.0)
+    ]
+
+
+def test_local_connection_backend():
+    executor = FabricExecutor(connection_class=LocalConnection)
+    rtn = executor.execute('Node1', 'echo $CHAOS_HOST', timeout=10)
+    assert rtn == Result(0, 'Node1\n', '')
+
+    with pytest.raises(Exception, match="exceeded timeout"):
+        executor.execute('Node1', 'sleep 5', timeout=1)
+
+    with ParallelFabricExecutor(connection_class=LocalConnection) as executor:
+        rtn = executor.execute(['Node1', 'Node2'],
+                               'echo $CHAOS_HOST; exit 3', timeout=10)
+        assert rtn['Node1'] == {'return_code': 3, 'stdout': 'Node1\n',
+                                'stderr': ''}
+        assert rtn['Node2']['stdout'] == 'Node2\n'
+
+        rtn = executor.execute_batch({'Node1': ['echo "one"', 'echo "two"']},
+                                     chain=True, timeout=10)
+        assert [r.stdout for r in rtn['Node1'].results] == ['one\n', 'two\n']
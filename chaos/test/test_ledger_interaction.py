@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+
+import chaosindy.ledger_interaction as ledger_interaction
+from chaosindy.ledger_interaction import SdkSession, get_validator_info_from_nodes
+from test import patch
+
+
+class FakeLedger(object):
+    def __init__(self, slow_aliases=(), failing_aliases=()):
+        self.slow_aliases = slow_aliases
+        self.failing_aliases = failing_aliases
+        self.release = asyncio.Event()
+        self.requests = []
+
+    async def build_get_validator_info_request(self, submitter_did):
+        return json.dumps({'identifier': submitter_did})
+
+    async def sign_request(self, wallet_handle, submitter_did, request):
+        return request
+
+    async def submit_action(self, pool_handle, request, nodes, timeout):
+        alias = json.loads(nodes)[0]
+        self.requests.append(alias)
+        if alias in self.slow_aliases:
+            await self.release.wait()
+        if alias in self.failing_aliases:
+            return json.dumps({alias: 'timeout'})
+        reply = {'op': 'REPLY', 'result': {'data': {'Node_info': {'Name': alias}}}}
+        return json.dumps({alias: json.dumps(reply)})
+
+
+async def fake_open_sdk_session(**kwargs):
+    return SdkSession('pool', 1, '{}', '{}', 2, 'V4SGRU86Z58d6TV7PBUe6f')
+
+
+def run_get_validator_info(fake_ledger, aliases, output_dir, **kwargs):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with patch(ledger_interaction, 'ledger', fake_ledger), \
+                patch(ledger_interaction, 'open_sdk_session',
+                      fake_open_sdk_session):
+            rtn = loop.run_until_complete(get_validator_info_from_nodes(
+                aliases, output_dir, **kwargs))
+            # Let the slow nodes finish
+            fake_ledger.release.set()
+            loop.run_until_complete(asyncio.sleep(0.01))
+        return rtn
+    finally:
+        loop.close()
+
+
+def test_get_validator_info_from_nodes_returns_on_quorum():
+    aliases = ['Node1', 'Node2', 'Node3', 'Node4']
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Stale file from a previous call
+        with open(os.path.join(output_dir, 'Node4-validator-info'), 'w') as f:
+            f.write('{}')
+
+        fake_ledger = FakeLedger(slow_aliases=['Node4'])
+        rtn = run_get_validator_info(fake_ledger, aliases, output_dir)
+
+        assert sorted(fake_ledger.requests) == aliases
+        assert sorted(rtn.keys()) == ['Node1', 'Node2', 'Node3']
+        for alias in rtn.keys():
+            with open(os.path.join(output_dir,
+                                   '{}-validator-info'.format(alias))) as f:
+                assert json.load(f) == {'Node_info': {'Name': alias}}
+        assert not os.path.exists(os.path.join(output_dir,
+                                               'Node4-validator-info'))
+
+
+def test_get_validator_info_from_nodes_skips_failed_nodes():
+    aliases = ['Node1', 'Node2', 'Node3', 'Node4']
+    with tempfile.TemporaryDirectory() as output_dir:
+        fake_ledger = FakeLedger(failing_aliases=['Node2', 'Node3'])
+        rtn = run_get_validator_info(fake_ledger, aliases, output_dir,
+                                     quorum=4)
+        assert sorted(rtn.keys()) == ['Node1', 'Node4']
+
+
+class FakePoolLedger(object):
+    def __init__(self, txns):
+        self.txns = txns
+        self.requests = []
+
+    async def build_get_txn_request(self, submitter_did, seq_no, ledger_type):
+        return json.dumps({'seqNo': seq_no})
+
+    async def sign_and_submit_request(self, pool_handle, wallet_handle,
+                                      submitter_did, request_json):
+        seq_no = json.loads(request_json)['seqNo']
+        self.requests.append(seq_no)
+        data = None
+        if seq_no <= len(self.txns):
+            alias, services = self.txns[seq_no - 1]
+            data = {'txn': {'data': {'dest': 'dest-' + alias, 'data': {
+                'alias': alias, 'services': services}}}}
+        return json.dumps({'result': {'seqNo': seq_no, 'data': data,
+                                      'identifier': 'steward'}})
+
+
+def run_get_validator_state(fake_ledger, output_dir):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with patch(ledger_interaction, 'ledger', fake_ledger), \
+                patch(ledger_interaction, 'open_sdk_session',
+                      fake_open_sdk_session), \
+                patch(ledger_interaction, 'get_chaos_temp_dir',
+                      lambda: output_dir):
+            loop.run_until_complete(ledger_interaction.get_validator_state(
+                genesis_file='genesis', window=4))
+        with open(os.path.join(output_dir, 'validator-state')) as f:
+            return json.load(f)
+    finally:
+        loop.close()
+
+
+def test_get_validator_state_reads_new_txns_only():
+    txns = [('Node1', ['VALIDATOR']), ('Node2', ['VALIDATOR']),
+            ('Node3', ['VALIDATOR']), ('Node4', ['VALIDATOR']),
+            ('Node5', ['VALIDATOR'])]
+    with tempfile.TemporaryDirectory() as output_dir:
+        fake_ledger = FakePoolLedger(txns)
+        state = run_get_validator_state(fake_ledger, output_dir)
+        assert sorted(state.keys()) == ['Node1', 'Node2', 'Node3', 'Node4',
+                                        'Node5']
+        assert state['Node2']['dest'] == 'dest-Node2'
+        assert sorted(fake_ledger.requests) == list(range(1, 9))
+
+        # Only the last known txn and new ones are read
+        txns.append(('Node2', []))
+        fake_ledger.requests = []
+        state = run_get_validator_state(fake_ledger, output_dir)
+        assert state['Node2']['services'] == []
+        assert sorted(fake_ledger.requests) == [5, 6, 7, 8, 9]
+
+        # The ledger was rebuilt, it is read from the beginning
+        fake_ledger.txns = txns[:3]
+        fake_ledger.requests = []
+        state = run_get_validator_state(fake_ledger, output_dir)
+        assert sorted(state.keys()) == ['Node1', 'Node2', 'Node3']
+        assert sorted(fake_ledger.requests) == [1, 2, 3, 4, 6]
+
+
+class FakeNymLedger(object):
+    def __init__(self, rejected_count=0):
+        self.rejected_count = rejected_count
+        self.nyms = []
+
+    async def build_nym_request(self, submitter_did, target_did, verkey,
+                                alias, role):
+        return json.dumps({'dest': target_did})
+
+    async def sign_and_submit_request(self, pool_handle, wallet_handle,
+                                      submitter_did, request_json):
+        if self.rejected_count:
+            self.rejected_count -= 1
+            return json.dumps({'op': 'REJECT', 'reason': 'rejected'})
+        self.nyms.append(json.loads(request_json)['dest'])
+        return json.dumps({'op': 'REPLY'})
+
+    async def build_get_nym_request(self, submitter_did, target_did):
+        return json.dumps({'dest': target_did})
+
+    async def submit_request(self, pool_handle, request_json):
+        dest = json.loads(request_json)['dest']
+        return json.dumps({'result': {
+            'dest': dest if dest in self.nyms else None}})
+
+
+class FakeDid(object):
+    def __init__(self):
+        self.count = 0
+
+    async def create_and_store_my_did(self, wallet_handle, did_json):
+        self.count += 1
+        return 'did{}'.format(self.count), 'verkey{}'.format(self.count)
+
+
+def test_write_nyms_and_check():
+    fake_ledger = FakeNymLedger(rejected_count=1)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with patch(ledger_interaction, 'ledger', fake_ledger), \
+                patch(ledger_interaction, 'did', FakeDid()), \
+                patch(ledger_interaction, 'open_sdk_session',
+                      fake_open_sdk_session):
+            results = loop.run_until_complete(
+                ledger_interaction.write_nyms_and_check(count=3))
+    finally:
+        loop.close()
+
+    assert [result.did for result in results] == ['did1', 'did2', 'did3']
+    assert results[0].error is not None
+    assert results[0].read_latency is None
+    for result in results[1:]:
+        assert result.error is None
+        assert result.write_latency >= 0
+        assert result.read_latency >= 0
+    assert sorted(fake_ledger.nyms) == ['did2', 'did3']
+
+
+class FakeIndy(object):
+    # Records calls of the pool, wallet and did modules, failing the named one
+    def __init__(self, failing):
+        self.failing = failing
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args):
+            self.calls.append(name)
+            if name == self.failing:
+                raise ValueError(name)
+            return len(self.calls)
+        return call
+
+
+def test_open_sdk_session_cleans_up_on_failure():
+    indy = FakeIndy('create_and_store_my_did')
+    loop = asyncio.new_event_loop()
+    try:
+        with patch(ledger_interaction, 'pool', indy), \
+                patch(ledger_interaction, 'wallet', indy), \
+                patch(ledger_interaction, 'did', indy):
+            with pytest.raises(ValueError):
+                loop.run_until_complete(ledger_interaction.open_sdk_session(
+                    genesis_file='genesis', seed='0' * 32))
+    finally:
+        loop.close()
+    assert indy.calls[-4:] == ['close_wallet', 'close_pool_ledger',
+                               'delete_wallet', 'delete_pool_ledger_config']
+    assert not ledger_interaction._sdk_sessions
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+
+import chaosindy.probes.validator_info as validator_info
+from chaosindy.probes.validator_info import (get_validator_info,
+    get_validator_info_by_alias, invalidate_validator_info,
+    parse_validator_info)
+from test import patch
+
+
+def write_genesis_file(directory, aliases):
+    genesis_file = os.path.join(directory, 'pool_transactions_genesis')
+    with open(genesis_file, 'w') as f:
+        for alias in aliases:
+            txn = {'txn': {'data': {'data': {'alias': alias}}}}
+            f.write(json.dumps(txn) + '\n')
+    return genesis_file
+
+
+def node_info(alias, primary, mode='participating'):
+    return {'Node_info': {
+        'Mode': mode,
+        'Catchup_status': {'Ledger_statuses': {'0': 'synced'}},
+        'Replicas_status': {'{}:0'.format(alias): {
+            'Primary': '{}:0'.format(primary)}}}}
+
+
+def test_parse_validator_info():
+    info = parse_validator_info('Node2', {'data': node_info('Node2', 'Node1')})
+    assert info.alias == 'Node2'
+    assert info.mode == 'participating'
+    assert info.primary == 'Node1'
+    assert info.catchup_status == {'Ledger_statuses': {'0': 'synced'}}
+
+    info = parse_validator_info('Node2', {})
+    assert info.mode == 'Unknown'
+    assert info.primary == 'Unknown'
+    assert info.catchup_status is None
+
+
+def test_get_validator_info_is_cached():
+    calls = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        genesis_file = write_genesis_file(temp_dir, ['Node1', 'Node2'])
+
+        def fake_collect_validator_info(genesis_file, **kwargs):
+            calls.append(genesis_file)
+            with open(os.path.join(temp_dir, 'Node1-validator-info'), 'w') as f:
+                json.dump(node_info('Node1', 'Node1'), f)
+            return True
+
+        invalidate_validator_info()
+        with patch(validator_info, 'get_chaos_temp_dir', lambda: temp_dir), \
+                patch(validator_info, 'collect_validator_info',
+                      fake_collect_validator_info):
+            assert get_validator_info(genesis_file, ttl=60)
+            info = get_validator_info_by_alias(genesis_file, ttl=60)
+            assert len(calls) == 1
+            # Node2 did not reply
+            assert list(info.keys()) == ['Node1']
+            assert info['Node1'].primary == 'Node1'
+
+            assert get_validator_info(genesis_file, ttl=0)
+            assert len(calls) == 2
+
+            invalidate_validator_info()
+            assert get_validator_info(genesis_file, ttl=60)
+            assert len(calls) == 3
+        invalidate_validator_info()
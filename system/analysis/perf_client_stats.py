@@ -0,0 +1,130 @@
+import os
+import json
+import warnings
+import numpy as np
+import pandas as pd
+
+
+PERCENTILES = [50, 90, 99, 99.9]
+CHUNK_SIZE = 10 ** 6
+SUCCESS_STATUS = 'succ'
+
+
+def _add_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+def latency_stats(latencies):  # takes numpy array of latencies
+    if len(latencies) == 0:
+        return {'count': 0, 'mean': None, **{'p{}'.format(p): None for p in PERCENTILES}}
+    return {
+        'count': int(len(latencies)),
+        'mean': float(np.mean(latencies)),
+        **{'p{}'.format(p): float(v) for p, v in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))}
+    }
+
+
+class ClientStats:
+    # accumulates client results chunk by chunk so only latencies are kept in memory, not the whole rows,
+    # type_column=None turns the per-type breakdown off
+    def __init__(self, type_column='req_type', error_window=10):
+        self._type_column = type_column
+        self._has_type_column = None  # unknown until the first chunk
+        self._error_window = error_window
+        self._latencies = []
+        self._type_latencies = {}
+        self._type_requests = None
+        self._type_failed = None
+        self._replies = None  # successful replies per second
+        self._sent = None  # requests per error window
+        self._failed = None  # failed requests per error window
+        self._first_sent = None
+        self._last_reply = None
+
+    def update(self, chunk):
+        succ = (chunk['status'] == SUCCESS_STATUS).values
+        data = chunk.loc[succ]
+        latencies = (data['client_reply'] - data['client_sent']).values
+        self._latencies.append(latencies)
+
+        if self._has_type_column is None and self._type_column is not None:
+            self._has_type_column = self._type_column in chunk.columns
+            if not self._has_type_column:
+                warnings.warn('Client results have no {} column, so stats are not broken down by request type, '
+                              'columns are: {}'.format(self._type_column, ', '.join(chunk.columns)))
+        if self._has_type_column:
+            for req_type, indices in data.groupby(self._type_column).indices.items():
+                self._type_latencies.setdefault(req_type, []).append(latencies[indices])
+            self._type_requests = _add_counts(self._type_requests, chunk[self._type_column].value_counts())
+            self._type_failed = _add_counts(self._type_failed, chunk.loc[~succ, self._type_column].value_counts())
+
+        if len(data.index):
+            first_sent, last_reply = data['client_sent'].min(), data['client_reply'].max()
+            self._first_sent = first_sent if self._first_sent is None else min(self._first_sent, first_sent)
+            self._last_reply = last_reply if self._last_reply is None else max(self._last_reply, last_reply)
+            self._replies = _add_counts(
+                self._replies, np.floor(data['client_reply']).astype('int64').value_counts()
+            )
+
+        # requests which were not even sent can't be placed into any window
+        sent = chunk['client_sent'].notna().values
+        windows = (
+            np.floor(chunk.loc[sent, 'client_sent'] / self._error_window) * self._error_window
+        ).astype('int64')
+        self._sent = _add_counts(self._sent, windows.value_counts())
+        self._failed = _add_counts(self._failed, windows[~succ[sent]].value_counts())
+
+    def throughput(self):  # successful replies for each second of the test
+        if self._replies is None:
+            return pd.DataFrame(columns=['replies'])
+        replies = self._replies.sort_index()
+        seconds = np.arange(replies.index.min(), replies.index.max() + 1)
+        return pd.DataFrame({'replies': replies.reindex(seconds, fill_value=0).astype('int64')})
+
+    def error_rate(self):  # sent and failed requests for each error window
+        if self._sent is None:
+            return pd.DataFrame(columns=['sent', 'failed', 'error_rate'])
+        data = pd.DataFrame({'sent': self._sent}).sort_index()
+        data['failed'] = self._failed.reindex(data.index, fill_value=0)
+        data = data.astype('int64')
+        data['error_rate'] = data['failed'] / data['sent']
+        return data
+
+    def summary(self):
+        latencies = np.concatenate(self._latencies) if self._latencies else np.array([])
+        sent = int(self._sent.sum()) if self._sent is not None else 0
+        failed = int(self._failed.sum()) if self._failed is not None else 0
+        test_time = (self._last_reply - self._first_sent) if len(latencies) else 0
+        by_type = {} if self._has_type_column else None  # None when there is no breakdown
+        for req_type, type_latencies in self._type_latencies.items():
+            by_type[str(req_type)] = latency_stats(np.concatenate(type_latencies))
+        if self._type_requests is not None:
+            for req_type, requests in self._type_requests.items():
+                type_failed = self._type_failed.get(req_type, 0) if self._type_failed is not None else 0
+                by_type.setdefault(str(req_type), latency_stats(np.array([]))).update(
+                    requests=int(requests), failed=int(type_failed)
+                )
+        return {
+            'requests': sent,
+            'failed': failed,
+            'error_rate': failed / sent if sent else None,
+            'test_time': float(test_time),
+            'mean_throughput': len(latencies) / test_time if test_time else None,
+            'latency': latency_stats(latencies),
+            'by_type': by_type
+        }
+
+
+def client_stats(path, output_dir=None, chunk_size=CHUNK_SIZE, type_column='req_type', error_window=10):
+    # takes path to `total`, saves statistics to output_dir if it is set
+    stats = ClientStats(type_column=type_column, error_window=error_window)
+    for chunk in pd.read_csv(path, sep='|', chunksize=chunk_size):
+        stats.update(chunk)
+
+    if output_dir:
+        with open(os.path.join(output_dir, 'client_stats.json'), 'w') as f:
+            json.dump(stats.summary(), f, indent=2)
+        stats.throughput().to_csv(os.path.join(output_dir, 'client_throughput.csv'), index_label='second')
+        stats.error_rate().to_csv(os.path.join(output_dir, 'client_error_rate.csv'), index_label='window_start')
+
+    return stats
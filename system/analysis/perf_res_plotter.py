@@ -1,7 +1,9 @@
+import os
+import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import numpy as np
+from system.analysis.perf_client_stats import client_stats, PERCENTILES
 
 sns.set()
 
@@ -20,13 +22,38 @@ metrics = [
     'max_node_prod_time',
     'timestamp'
 ]
+METRICS_DTYPES = {metric: 'float64' for metric in metrics if metric != 'timestamp'}
+CACHE_DIR = '.metrics-cache'  # kept apart from csv files, so metrics dir listings are not affected
+CACHE_SUFFIX = '.feather'
+
+
+def metrics_cache_path(path):  # cache file is bound to the csv modification time
+    cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    return os.path.join(cache_dir, '{}.{}{}'.format(os.path.basename(path), os.stat(path).st_mtime_ns, CACHE_SUFFIX))
+
+
+def load_metrics(path, use_cache=True):  # reads only plotted columns, caches them in feather format
+    cache_path = metrics_cache_path(path)
+    if use_cache and os.path.exists(cache_path):
+        return pd.read_feather(cache_path)
+    data = pd.read_csv(path, usecols=metrics, dtype=METRICS_DTYPES).loc[:, metrics]
+    if use_cache:
+        stale_pattern = '{}.*{}'.format(glob.escape(os.path.basename(path)), CACHE_SUFFIX)
+        for stale_path in glob.glob(os.path.join(glob.escape(os.path.dirname(cache_path)), stale_pattern)):
+            os.remove(stale_path)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            data.to_feather(cache_path)
+        except (ImportError, OSError):  # pyarrow is not installed or dir is read-only, so just go without cache
+            pass
+    return data
 
 
 def plot_metrics(paths, save_path=None):  # takes list of paths to csv metrics files
     titles = [path.split('/')[-1].replace('.csv', '') for path in paths]
     for path, title in zip(paths, titles):
         try:
-            pd.read_csv(path).loc[:, metrics].plot(
+            load_metrics(path).plot(
                 x='timestamp', subplots=True, cmap='cool', title=title, figsize=(20, 10),  # logy=True
             )
         except pd.errors.EmptyDataError:
@@ -34,17 +61,19 @@ def plot_metrics(paths, save_path=None):  # takes list of paths to csv metrics f
             plt.plot()
     if save_path:
         plt.savefig(save_path)
+        # figures are not shown so release them, it matters when many of them are rendered by one process
+        plt.close('all')
     else:
         plt.show()
 
 
-def plot_client_stats(path):  # takes path to `total`
-    data = pd.read_csv(path, sep='|')
-    data = data.loc[data['status'] == 'succ', :]
-    data['latency'] = data['client_reply'] - data['client_sent']
-    test_time = np.max(data['client_reply']) - np.min(data['client_sent'])
-    print('MEAN LATENCY: {}'.format(np.mean(data['latency'])))
-    print('MEAN THROUGHPUT: {}'.format(len(data.index)/test_time))
+def plot_client_stats(path, output_dir=None):  # takes path to `total`
+    summary = client_stats(path, output_dir).summary()
+    print('MEAN LATENCY: {}'.format(summary['latency']['mean']))
+    for percentile in PERCENTILES:
+        print('P{} LATENCY: {}'.format(percentile, summary['latency']['p{}'.format(percentile)]))
+    print('MEAN THROUGHPUT: {}'.format(summary['mean_throughput']))
+    print('ERROR RATE: {}'.format(summary['error_rate']))
 
 
 if __name__ == '__main__':
@@ -1,12 +1,13 @@
 import os
 from shutil import copyfile
-import subprocess
 import json
 import re
+import lzma
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 from system.analysis.perf_res_plotter import plot_metrics
-from system.utils import run_external_cmd
 
 
 NODES_NUM = 25
@@ -23,6 +24,82 @@ LOG_PATTERNS = [
     'error in plugin field',
     'incorrect audit ledger',
 ]
+ERROR_PATTERN = 'ERROR'
+# all patterns are matched at once so each log is read only one time
+LOG_PATTERNS_REGEX = re.compile('|'.join(re.escape(pattern) for pattern in LOG_PATTERNS))
+XZ_MAGIC = b'\xfd7zXZ\x00'
+JOURNAL_IGNORE_LIST = ['grep', 'preauth', 'user']  # ignore excess entries
+JOURNAL_LINE_REGEX = re.compile(r'^(?P<timestamp>\w{3} +\d+ \d{2}:\d{2}:\d{2}) \S+ [^:]+: (?P<message>.*)$')
+FRAME_REGEX = re.compile(r'File "(?P<file>[^"]+)", line (?P<line>\d+), in (?P<func>\S+)')
+
+JournalException = namedtuple('JournalException', ['timestamp', 'node', 'exc_type', 'frames', 'lines'])
+
+
+def open_log(path):  # opens both plain and xz compressed logs for streaming reading
+    with open(path, 'rb') as f:
+        magic = f.read(len(XZ_MAGIC))
+    if magic == XZ_MAGIC:
+        return lzma.open(path, 'rt', errors='replace')
+    return open(path, errors='replace')
+
+
+def scan_logs(paths):  # returns error entries and pattern matching entries found in all given logs
+    errors = []
+    pattern_matches = []
+    for path in paths:
+        with open_log(path) as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if ERROR_PATTERN in line:
+                    errors.append(line)
+                if LOG_PATTERNS_REGEX.search(line):
+                    pattern_matches.append(line)
+    return errors, pattern_matches
+
+
+def is_ignored_journal_line(line):
+    return any(map(line.__contains__, JOURNAL_IGNORE_LIST))
+
+
+def journal_exception(lines, node):  # returns None if all lines of the entry are ignored
+    match = JOURNAL_LINE_REGEX.match(lines[0])
+    timestamp = match.group('timestamp') if match else None
+    frames = [m.groups() for m in (FRAME_REGEX.search(line) for line in lines) if m]
+    last_match = JOURNAL_LINE_REGEX.match(lines[-1])
+    last_message = (last_match.group('message') if last_match else lines[-1]).strip()
+    exc_type = last_message.split(':', 1)[0] if 'Error' in last_message else None
+    lines = [x for x in lines if not is_ignored_journal_line(x)]
+    if not lines:
+        return None
+    return JournalException(timestamp, node, exc_type, frames, lines)
+
+
+def parse_journal_exceptions(path, node=None):
+    # yields entries from `Traceback` line up to the next line containing `Error`
+    # the same way `sed -n "/Traceback/,/Error/p"` does, entries are not started by ignored lines
+    # (i.e. `grep Traceback` run with sudo) and entries having only ignored lines are skipped
+    entry = None
+    with open_log(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if entry is None:
+                if 'Traceback' in line and not is_ignored_journal_line(line):
+                    entry = [line]
+                continue
+            entry.append(line)
+            if 'Error' in line:
+                exception = journal_exception(entry, node)
+                if exception:
+                    yield exception
+                entry = None
+    if entry:
+        exception = journal_exception(entry, node)
+        if exception:
+            yield exception
+
+
+def collect_journal_exceptions(path, node=None):
+    return list(parse_journal_exceptions(path, node))
 
 
 class PathReg:
@@ -152,24 +229,20 @@ class PerformanceReport:
             journal_file_names = sorted(os.listdir(path), key=NATURAL_SORTING)
             print(journal_file_names)
 
-            results = []
-            ignore_list = ['grep', 'preauth', 'user']  # ignore excess entries
-            for i, file_name in enumerate(journal_file_names):
-                res = []
-                try:
-                    res += run_external_cmd(
-                        'xzcat {} | sed -n "/Traceback/,/Error/p"'.format(os.path.join(path, file_name))
-                    )
-                except subprocess.CalledProcessError:
-                    res += []
-                res = [x for x in res if not any(map(x.__contains__, ignore_list))]
-
-                results.append(res)
+            # parse journals of all nodes in parallel
+            with ProcessPoolExecutor() as executor:
+                results = list(executor.map(
+                    collect_journal_exceptions,
+                    [os.path.join(path, file_name) for file_name in journal_file_names],
+                    ['Node{}'.format(i) for i in range(1, len(journal_file_names)+1)]
+                ))
 
+            for i, res in enumerate(results):
                 # create file with exception entries for each node
                 with open(sub_dirs[i] + 'exception_journal_entries.txt', 'w') as f:
-                    for item in res:
-                        f.write('{}\n'.format(item))
+                    for exception in res:
+                        for item in exception.lines:
+                            f.write('{}\n'.format(item))
 
             return results
 
@@ -186,30 +259,17 @@ class PerformanceReport:
             print(log_file_names)
 
             node_keys = ['Node{}.'.format(i) for i in range(1, NODES_NUM+1)]
-            results = []
-            pattern_results = []
-            for i, node_key in enumerate(node_keys):
-                res = []
-                pattern_res = []
+            node_log_paths = [
+                [os.path.join(path, x) for x in log_file_names if x.__contains__(node_key)] for node_key in node_keys
+            ]
 
-                # find errors and patterns in logs including xz
-                log_names = [x for x in log_file_names if x.__contains__(node_key)]
-                for log_name in log_names:
-                    try:
-                        res += subprocess.check_output(
-                            ['xzgrep', 'ERROR', os.path.join(path, log_name)]
-                        ).decode().strip().splitlines()
-                    except subprocess.CalledProcessError:
-                        res += []
-
-                    for item in LOG_PATTERNS:
-                        try:
-                            pattern_res += subprocess.check_output(
-                                ['xzgrep', item, os.path.join(path, log_name)]
-                            ).decode().strip().splitlines()
-                        except subprocess.CalledProcessError:
-                            pattern_res += []
+            # find errors and patterns in logs including xz, nodes are processed in parallel
+            with ProcessPoolExecutor() as executor:
+                scanned = list(executor.map(scan_logs, node_log_paths))
 
+            results = []
+            pattern_results = []
+            for i, (res, pattern_res) in enumerate(scanned):
                 results.append(res)
                 pattern_results.append(pattern_res)
 
@@ -236,15 +296,20 @@ class PerformanceReport:
     def process_metrics(path_from=path_reg.metrics_dir, paths_to=sub_dirs):
         ignore_list = ['summary', 'db']
         metric_file_names = sorted(
-                [x for x in os.listdir(path_from) if not any(map(x.__contains__, ignore_list))],
+                [x for x in os.listdir(path_from)
+                 if x.endswith('.csv') and not any(map(x.__contains__, ignore_list))],
                 key=NATURAL_SORTING
             )
 
-        # create metrics figure for each node
-        assert all(
-            [plot_metrics([os.path.join(path_from, metric_file_name)], os.path.join(path_to, 'Figure.png')) is None
-             for metric_file_name, path_to in zip(metric_file_names, paths_to)]
-        )
+        # create metrics figure for each node, figures are rendered in parallel
+        with ProcessPoolExecutor() as executor:
+            assert all(
+                [res is None for res in executor.map(
+                    plot_metrics,
+                    [[os.path.join(path_from, metric_file_name)] for metric_file_name in metric_file_names],
+                    [os.path.join(path_to, 'Figure.png') for path_to in paths_to]
+                )]
+            )
 
         summary_file_names = sorted(
                 [x for x in os.listdir(path_from) if x.__contains__('summary')],
@@ -2,20 +2,48 @@ import pytest
 import json
 import asyncio
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from async_generator import async_generator, yield_
 
 from indy import pool, payment, did, ledger
 
 from .utils import (
-    pool_helper, wallet_helper, default_trustee,
+    pool_helper, raw_wallet_helper, pool_destructor, wallet_destructor, default_trustee,
     check_no_failures, NodeHost, payment_initializer,
-    send_nym
+    send_nym, POOL_GENESIS_PATH
 )
 from .docker_setup import setup, teardown
 
 
 _failed_nodes = {}
+# genesis path -> (pool_handle, pool_name), valid until the pool is rebuilt
+_pool_handles = {}
+# pre-created wallets which are not handed out to any test yet
+_free_wallets = []
+WALLETS_BATCH_SIZE = int(os.environ.get('INDY_SYSTEM_TESTS_WALLETS_BATCH', 10))
+
+
+async def _get_pool_handle(path_to_genesis=POOL_GENESIS_PATH):
+    if path_to_genesis not in _pool_handles:
+        _pool_handles[path_to_genesis] = await pool_helper(path_to_genesis=path_to_genesis)
+    return _pool_handles[path_to_genesis][0]
+
+
+async def _close_pool_handles():
+    while _pool_handles:
+        _, (pool_handle, pool_name) = _pool_handles.popitem()
+        await pool_destructor(pool_handle, pool_name)
+
+
+async def _take_wallet():
+    if not _free_wallets:
+        _free_wallets.extend(await asyncio.gather(*[raw_wallet_helper() for _ in range(WALLETS_BATCH_SIZE)]))
+    return _free_wallets.pop()
+
+
+async def _delete_free_wallets():
+    while _free_wallets:
+        await wallet_destructor(*_free_wallets.pop())
 
 
 def pytest_configure(config):
@@ -37,6 +65,10 @@ def pytest_addoption(parser):
         "--logsdir", action='store', default='_build/logs',
         help="directory name to store logs"
     )
+    parser.addoption(
+        "--logswindow", action='store', type=int, default=None,
+        help="gather only node logs modified during the last N minutes"
+    )
 
 
 # based on https://docs.pytest.org/en/latest/example/simple.html#making-test-result-information-available-in-fixtures
@@ -66,18 +98,26 @@ def session_name():
     return "run.{}".format(datetime.now().strftime("%Y-%m-%dT%H%M%S"))
 
 
+@pytest.fixture(scope='session')
+def _handles_cache(event_loop):
+    yield
+    event_loop.run_until_complete(_close_pool_handles())
+    event_loop.run_until_complete(_delete_free_wallets())
+
+
 @pytest.fixture()
 @async_generator
-async def pool_handler(event_loop):
-    pool_handle, _ = await pool_helper()
+async def pool_handler(event_loop, _handles_cache):
+    pool_handle = await _get_pool_handle()
     await yield_(pool_handle)
 
 
 @pytest.fixture()
 @async_generator
-async def wallet_handler(event_loop):
-    wallet_handle, _, _ = await wallet_helper()
+async def wallet_handler(event_loop, _handles_cache):
+    wallet_handle, wallet_config, wallet_credentials = await _take_wallet()
     await yield_(wallet_handle)
+    await wallet_destructor(wallet_handle, wallet_config, wallet_credentials)
 
 
 @pytest.fixture()
@@ -195,26 +235,34 @@ async def ssh_config(nodes_num):
 def _docker_teardown(session_name):
     def wrapped(nodes_num, request):
         logs_dir = None
+        logs_since = None
         if (request.node.nodeid in _failed_nodes) and request.config.getoption("gatherlogs"):
             logs_dir = os.path.join(request.config.getoption("logsdir"), session_name, request.node.nodeid)
+            if request.config.getoption("logswindow") is not None:
+                logs_since = datetime.now() - timedelta(minutes=request.config.getoption("logswindow"))
 
-        teardown(nodes_num, logs_dir)
+        teardown(nodes_num, logs_dir, logs_since)
     return wrapped
 
 
 @pytest.fixture(scope='module')
 @async_generator
 async def docker_setup_and_teardown_module(nodes_num_module, request, _docker_teardown):
+    # cached pool handles can't survive pool rebuild
+    await _close_pool_handles()
     await setup(nodes_num_module)
     await yield_()
+    await _close_pool_handles()
     _docker_teardown(nodes_num_module, request)
 
 
 @pytest.fixture(scope='function')
 @async_generator
 async def docker_setup_and_teardown_function(nodes_num, request, _docker_teardown):
+    await _close_pool_handles()
     await setup(nodes_num)
     await yield_()
+    await _close_pool_handles()
     _docker_teardown(nodes_num, request)
 
 
@@ -5,6 +5,8 @@ import io
 import tarfile
 from pathlib import Path
 from subprocess import CalledProcessError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import docker
 import asyncio
 from async_generator import yield_
@@ -28,9 +30,20 @@ NETWORK_NAME = os.environ.get('INDY_SYSTEM_TESTS_NETWORK', 'indy-test-automation
 NETWORK_SUBNET = os.environ.get('INDY_SYSTEM_TESTS_SUBNET', '10.0.0.0/24')
 NODE_NAME_BASE = 'node'
 NODES_NUM = int(os.environ.get('INDY_SYSTEM_NODES_NUM', 7))
+# warm pool mode: initialized nodes are committed as images once and new pools are restored from them
+WARM_POOL = os.environ.get('INDY_SYSTEM_TESTS_WARM_POOL') == 'yes'
+SNAPSHOT_IMAGE_NAME = os.environ.get('INDY_SYSTEM_TESTS_SNAPSHOT_NAME', 'indy-test-automation-snapshot')
+SNAPSHOT_BASE_LABEL = 'indy-test-automation.base-image'
+# node ips of the baked genesis depend on the subnet
+SNAPSHOT_SUBNET_LABEL = 'indy-test-automation.subnet'
+SNAPSHOT_NODES_NUM_LABEL = 'indy-test-automation.nodes-num'
+# how many containers are created, initialized or removed at the same time
+DOCKER_WORKERS = int(os.environ.get('INDY_SYSTEM_TESTS_DOCKER_WORKERS', 25))
 
 
 client = docker.from_env()
+# duration in seconds of the latest run of each setup/teardown phase
+phase_timings = {}
 
 
 def network_builder(network_subnet, network_name):
@@ -46,9 +59,31 @@ def network_builder(network_subnet, network_name):
                                       ipam=ipam_config).name
 
 
-def pool_builder(docker_build_ctx_path, node_image_name, node_name_base, network_name, nodes_num):
+@contextmanager
+def phase_timer(phase):
+    started = time.perf_counter()
     try:
-        image = client.images.get(node_image_name)
+        yield
+    finally:
+        phase_timings[phase] = time.perf_counter() - started
+        logger.info('{} PHASE TOOK {:.2f} SECONDS'.format(phase.upper(), phase_timings[phase]))
+
+
+def parallel_map(func, items):
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(items), DOCKER_WORKERS)) as executor:
+        return list(executor.map(func, items))
+
+
+def node_ip(node_num):
+    return '.'.join(NETWORK_SUBNET.split('/')[0].split('.')[:3] + [str(node_num + 1)])
+
+
+def image_getter(docker_build_ctx_path, node_image_name):
+    try:
+        return client.images.get(node_image_name)
     except docker.errors.ImageNotFound:
         # build image from the Dockerfile
         output = []
@@ -64,59 +99,149 @@ def pool_builder(docker_build_ctx_path, node_image_name, node_name_base, network
             )
             for line in output:
                 print(line)
+        return image
 
-    # enable systemd
+
+def systemd_enabler(image):
     client.containers.run(image,
                           'setup',
                           remove=True,
                           privileged=True,
                           volumes={'/': {'bind': '/host', 'mode': 'rw'}})
+
+
+def node_runner(image, node_name, network_name, node_num):
+    # ip addresses are set explicitly since containers are created concurrently
+    # and genesis files refer to them
+    host_config = client.api.create_host_config(
+        binds={'/sys/fs/cgroup': {'bind': '/sys/fs/cgroup', 'mode': 'ro'}},
+        security_opt=['seccomp=unconfined'],
+        tmpfs={'/run': '', '/run/lock': ''},
+        network_mode=network_name
+    )
+    networking_config = client.api.create_networking_config(
+        {network_name: client.api.create_endpoint_config(ipv4_address=node_ip(node_num))}
+    )
+    container = client.api.create_container(
+        image,
+        name=node_name,
+        detach=True,
+        tty=True,
+        host_config=host_config,
+        networking_config=networking_config
+    )
+    client.api.start(container['Id'])
+    return client.containers.get(container['Id'])
+
+
+def pool_builder(docker_build_ctx_path, node_image_name, node_name_base, network_name, nodes_num):
+    image = image_getter(docker_build_ctx_path, node_image_name)
+    # enable systemd
+    systemd_enabler(image)
     # run pool containers
-    return [client.containers.run(image,
-                                  name=node_name_base+str(i),
-                                  detach=True,
-                                  tty=True,
-                                  network=network_name,
-                                  volumes={'/sys/fs/cgroup': {'bind': '/sys/fs/cgroup', 'mode': 'ro'}},
-                                  security_opt=['seccomp=unconfined'],
-                                  tmpfs={'/run': '',
-                                         '/run/lock': ''})
-            for i in range(1, nodes_num+1)]
+    return parallel_map(
+        lambda i: node_runner(image.id, node_name_base+str(i), network_name, i), range(1, nodes_num+1)
+    )
 
 
 def pool_starter(node_containers):
-    for node in node_containers:
-        node.start()
+    parallel_map(lambda node: node.start(), node_containers)
     return node_containers
 
 
-def pool_initializer(node_containers):
+def pool_genesis_generator(node_containers):
     indy_network_name = 'sandbox'
-    ips = []
-    for i in range(len(node_containers)):
-        ips.append('.'.join(NETWORK_SUBNET.split('/')[0].split('.')[:3] + [str(i + 2)]))
-    ips = ','.join(ips)
-    init_res = [node.exec_run(['generate_indy_pool_transactions',
-                               '--nodes', str(len(node_containers)),
-                               '--clients', '1',
-                               '--nodeNum', str(i+1),
-                               '--ips', ips,
-                               '--network', indy_network_name],
-                              user='indy')
-                for i, node in enumerate(node_containers)]
-    start_res = [node.exec_run(['systemctl', 'start', 'indy-node'], user='root') for node in node_containers]
+    ips = ','.join(node_ip(i + 1) for i in range(len(node_containers)))
+    init_res = parallel_map(
+        lambda i: node_containers[i].exec_run(['generate_indy_pool_transactions',
+                                               '--nodes', str(len(node_containers)),
+                                               '--clients', '1',
+                                               '--nodeNum', str(i+1),
+                                               '--ips', ips,
+                                               '--network', indy_network_name],
+                                              user='indy'),
+        range(len(node_containers))
+    )
     assert all([res.exit_code == 0 for res in init_res])
+    return init_res
+
+
+def pool_services_starter(node_containers):
+    start_res = parallel_map(
+        lambda node: node.exec_run(['systemctl', 'start', 'indy-node'], user='root'), node_containers
+    )
     assert all([res.exit_code == 0 for res in start_res])
+    return start_res
+
+
+def pool_initializer(node_containers):
+    with phase_timer('genesis'):
+        init_res = pool_genesis_generator(node_containers)
+    with phase_timer('services'):
+        start_res = pool_services_starter(node_containers)
     return init_res, start_res
 
 
+def snapshot_tag(nodes_num, node_name):
+    return '{}-{}'.format(nodes_num, node_name)
+
+
+def snapshot_labels(base_image_id, nodes_num):  # docker labels are strings
+    return {
+        SNAPSHOT_BASE_LABEL: base_image_id,
+        SNAPSHOT_SUBNET_LABEL: NETWORK_SUBNET,
+        SNAPSHOT_NODES_NUM_LABEL: str(nodes_num)
+    }
+
+
+def pool_snapshot_is_valid(node_image_name, node_name_base, nodes_num):
+    # snapshot is outdated as soon as base node image is rebuilt or the pool network changes
+    try:
+        labels = snapshot_labels(client.images.get(node_image_name).id, nodes_num)
+    except docker.errors.ImageNotFound:
+        return False
+    for i in range(1, nodes_num+1):
+        try:
+            image = client.images.get(
+                '{}:{}'.format(SNAPSHOT_IMAGE_NAME, snapshot_tag(nodes_num, node_name_base+str(i)))
+            )
+        except docker.errors.ImageNotFound:
+            return False
+        if any(image.labels.get(label) != value for label, value in labels.items()):
+            return False
+    return True
+
+
+def pool_snapshot(node_containers, node_image_name):
+    # nodes are committed right after genesis generation, before the services start
+    # so restored pools have keys and genesis files but empty ledgers
+    base_image_id = client.images.get(node_image_name).id
+    return parallel_map(
+        lambda node: node.commit(repository=SNAPSHOT_IMAGE_NAME,
+                                 tag=snapshot_tag(len(node_containers), node.name),
+                                 conf={'Labels': snapshot_labels(base_image_id, len(node_containers))}),
+        node_containers
+    )
+
+
+def pool_restorer(node_image_name, node_name_base, network_name, nodes_num):
+    systemd_enabler(client.images.get(node_image_name))
+
+    def node_restorer(node_num):
+        node_name = node_name_base+str(node_num)
+        image = '{}:{}'.format(SNAPSHOT_IMAGE_NAME, snapshot_tag(nodes_num, node_name))
+        node = node_runner(image, node_name, network_name, node_num)
+        pool_services_starter([node])
+        return node
+
+    return parallel_map(node_restorer, range(1, nodes_num+1))
+
+
 def pool_stop():
     print('\n---------------')
-    containers = subprocess.check_output(
-        ['docker', 'ps', '-a', '-q', '-f', "name={}*".format(NODE_NAME_BASE)]
-    ).decode().strip().split()
-    outputs = [subprocess.check_call(['docker', 'rm', container, '-f']) for container in containers]
-    assert outputs is not None
+    with phase_timer('stop'):
+        containers = client.containers.list(all=True, filters={'name': '{}*'.format(NODE_NAME_BASE)})
+        parallel_map(lambda container: container.remove(force=True), containers)
     # Uncomment to destroy all images too
     # images = subprocess.check_output(['docker', 'images', '-q']).decode().strip().split()
     # try:
@@ -126,17 +251,35 @@ def pool_stop():
     #     pass
 
 
+def warm_pool_starter(nodes_num):
+    network_name = network_builder(NETWORK_SUBNET, NETWORK_NAME)
+    if not pool_snapshot_is_valid(DOCKER_IMAGE_NAME, NODE_NAME_BASE, nodes_num):
+        with phase_timer('build'):
+            node_containers = pool_starter(
+                pool_builder(DOCKER_BUILD_CTX_PATH, DOCKER_IMAGE_NAME, NODE_NAME_BASE, network_name, nodes_num)
+            )
+        with phase_timer('genesis'):
+            pool_genesis_generator(node_containers)
+        with phase_timer('snapshot'):
+            pool_snapshot(node_containers, DOCKER_IMAGE_NAME)
+        pool_stop()
+        logger.info('POOL SNAPSHOT FOR {} NODES HAS BEEN CREATED!'.format(nodes_num))
+    with phase_timer('restore'):
+        return pool_restorer(DOCKER_IMAGE_NAME, NODE_NAME_BASE, network_name, nodes_num)
+
+
 def main(nodes_num=None):
     nodes_num = NODES_NUM if nodes_num is None else nodes_num
-    pool_initializer(
-        pool_starter(
+    with phase_timer('build'):
+        node_containers = pool_starter(
             pool_builder(
                 DOCKER_BUILD_CTX_PATH,
                 DOCKER_IMAGE_NAME,
                 NODE_NAME_BASE,
                 network_builder(NETWORK_SUBNET,
                                 NETWORK_NAME),
-                nodes_num)))
+                nodes_num))
+    pool_initializer(node_containers)
 
 
 async def wait_until_pool_is_ready():
@@ -147,42 +290,61 @@ async def wait_until_pool_is_ready():
     await ensure_pool_is_functional(pool_handle, wallet_handle, trustee_did)
 
 
-def gather_logs(hosts, target_dir):
+class ChunksReader(io.RawIOBase):
+    # file-like view of an iterator over bytes chunks, e.g. docker archive stream
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def host_logs_gatherer(host, target_dir, since=None):
+    logs_path = host.generate_logs(since=since)
+    bits, stat = client.containers.get(host.name).get_archive(logs_path)
+    # archive is extracted on the fly without staging it on disk
+    with tarfile.open(fileobj=io.BufferedReader(ChunksReader(bits)), mode='r|') as tar:
+        tar.extractall(str(target_dir))
+
+
+def gather_logs(hosts, target_dir, since=None):
     target_dir = Path(target_dir)
     target_dir.mkdir(parents=True, exist_ok=True)
 
-    tmp_tar = target_dir / 'tmp.tar'
-
-    try:
-        for host in hosts:
-            logs_path = host.generate_logs()
-            bits, stat = client.containers.get(host.name).get_archive(logs_path)
-            with open(str(tmp_tar), 'w+b') as f:
-                for chunk in bits:
-                    f.write(chunk)
-
-            with tarfile.open(str(tmp_tar)) as tar:
-                tar.extractall(str(target_dir))
-    finally:
-        if tmp_tar.exists():
-            tmp_tar.unlink()
+    with phase_timer('logs'):
+        parallel_map(lambda host: host_logs_gatherer(host, target_dir, since), hosts)
 
 
 async def setup(nodes_num):
     pool_stop()
 
-    main(nodes_num=nodes_num)
-    await wait_until_pool_is_ready()
+    if WARM_POOL:
+        warm_pool_starter(nodes_num)
+    else:
+        main(nodes_num=nodes_num)
+    with phase_timer('ready'):
+        await wait_until_pool_is_ready()
     logger.info('DOCKER SETUP HAS BEEN FINISHED!')
 
 
-def teardown(nodes_num, nodes_logs_dir=None):
+def teardown(nodes_num, nodes_logs_dir=None, logs_since=None):
     try:
         if nodes_logs_dir:
             hosts = [NodeHost(node_id + 1) for node_id in range(nodes_num)]
-            for host in hosts:
-                host.stop_service()
-            gather_logs(hosts, nodes_logs_dir)
+            parallel_map(lambda host: host.stop_service(), hosts)
+            gather_logs(hosts, nodes_logs_dir, since=logs_since)
     finally:
         pool_stop()
         logger.info('DOCKER TEARDOWN HAS BEEN FINISHED!\n')
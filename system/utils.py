@@ -7,8 +7,9 @@ import subprocess
 import base58
 import asyncio
 from random import sample, shuffle, randrange
-from collections import Counter
+from collections import Counter, namedtuple
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from inspect import isawaitable
 import random
 import itertools
@@ -128,6 +129,14 @@ UPGRADE_MAPPING = {
     'i-0d2d372e6a3c5e017': 'vol-0abc2059816e67ae7'  # 8
 }
 
+# how many signed NYM requests are allowed to wait for a reply at the same time
+NYMS_IN_FLIGHT = int(os.environ.get('INDY_SYSTEM_TESTS_NYMS_IN_FLIGHT', 10))
+
+LEDGER_TYPES = ('pool', 'config', 'domain', 'audit', 'sovtoken')
+
+NymWriteResult = namedtuple('NymWriteResult', ['did', 'response', 'latency'])
+NymWriteStats = namedtuple('NymWriteStats', ['results', 'elapsed', 'throughput'])
+
 
 def run_async_method(method, *args, **kwargs):
     loop = asyncio.get_event_loop()
@@ -173,6 +182,12 @@ async def wallet_helper(wallet_id=None, wallet_key='', wallet_key_derivation_met
     return wallet_handle, wallet_config, wallet_credentials
 
 
+async def raw_wallet_helper(wallet_id=None):
+    # RAW derivation skips ARGON2I key stretching, good enough for throwaway test wallets
+    wallet_key = await wallet.generate_wallet_key(None)
+    return await wallet_helper(wallet_id, wallet_key, 'RAW')
+
+
 async def pool_destructor(pool_handle, pool_name):
     await pool.close_pool_ledger(pool_handle)
     await pool.delete_pool_ledger_config(pool_name)
@@ -401,13 +416,51 @@ def check_no_failures(hosts):
         )
 
 
-async def check_pool_performs_write(pool_handle, wallet_handle, submitter_did, nyms_count=1):
-    res = []
-    for _ in range(nyms_count):
-        some_did, _ = await did.create_and_store_my_did(wallet_handle, '{}')
-        resp = await send_nym(pool_handle, wallet_handle, submitter_did, some_did)
-        assert resp['op'] == 'REPLY'
-        res.append(resp)
+async def create_dids(wallet_handle, count):
+    created = await asyncio.gather(
+        *[did.create_and_store_my_did(wallet_handle, '{}') for _ in range(count)]
+    )
+    return [some_did for some_did, _ in created]
+
+
+async def send_nyms_pipelined(
+        pool_handle, wallet_handle, submitter_did, target_dids, max_in_flight=NYMS_IN_FLIGHT
+):
+    # requests are built and signed up front, only submission is limited by the window
+    window = asyncio.Semaphore(max_in_flight)
+
+    async def _send(target_did):
+        req = await ledger.build_nym_request(submitter_did, target_did, None, None, None)
+        req = await ledger.sign_request(wallet_handle, submitter_did, req)
+        async with window:
+            started = time.perf_counter()
+            res = json.loads(await ledger.submit_request(pool_handle, req))
+            return NymWriteResult(target_did, res, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(_send(target_did)) for target_did in target_dids]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # do not leave requests running in background if any of them failed
+        for task in tasks:
+            task.cancel()
+    elapsed = time.perf_counter() - started
+    throughput = len(results) / elapsed if elapsed > 0 else 0.0
+    logger.debug("{} NYMs written in {:.2f} seconds ({:.2f} txns/sec)".format(len(results), elapsed, throughput))
+
+    return NymWriteStats(results, elapsed, throughput)
+
+
+async def check_pool_performs_write(
+        pool_handle, wallet_handle, submitter_did, nyms_count=1, max_in_flight=NYMS_IN_FLIGHT
+):
+    dids = await create_dids(wallet_handle, nyms_count)
+    stats = await send_nyms_pipelined(
+        pool_handle, wallet_handle, submitter_did, dids, max_in_flight=max_in_flight
+    )
+    res = [result.response for result in stats.results]
+    assert all(resp['op'] == 'REPLY' for resp in res)
     return res
 
 
@@ -456,25 +509,43 @@ async def ensure_pool_is_functional(
     )
 
 
+def get_diverged_ledgers(ledger_sizes):
+    # ledger_sizes: {node_name: {ledger_type: count}}
+    # returns {ledger_type: {node_name: count}} for nodes which differ from the most common count
+    diverged = {}
+    for ledger_type in LEDGER_TYPES:
+        counts = {name: sizes[ledger_type] for name, sizes in ledger_sizes.items()}
+        expected, _ = Counter(counts.values()).most_common()[0]
+        lagging = {name: count for name, count in counts.items() if count != expected}
+        if lagging:
+            diverged[ledger_type] = lagging
+    return diverged
+
+
 async def check_pool_is_in_sync(node_ids=None, nodes_num=7):
     if node_ids is None:
         node_ids = [(i + 1) for i in range(nodes_num)]
     hosts = [NodeHost(i) for i in node_ids]
+    if not hosts:  # nothing to compare
+        return
+
+    # one remote command per node, all nodes are queried at the same time
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        results = await asyncio.gather(
+            *[loop.run_in_executor(executor, host.get_ledger_sizes) for host in hosts]
+        )
+    ledger_sizes = {host.name: sizes for host, sizes in zip(hosts, results)}
 
-    # TODO make that async
-    pool_results = [host.run('read_ledger --type=pool --count') for host in hosts]
-    print('\nPOOL LEDGER SYNC: {}'.format([result for result in pool_results]))
-    config_results = [host.run('read_ledger --type=config --count') for host in hosts]
-    print('\nCONFIG LEDGER SYNC: {}'.format([result for result in config_results]))
-    domain_results = [host.run('read_ledger --type=domain --count') for host in hosts]
-    print('\nDOMAIN LEDGER SYNC: {}'.format([result for result in domain_results]))
-    audit_results = [host.run('read_ledger --type=audit --count') for host in hosts]
-    print('\nAUDIT LEDGER SYNC: {}'.format([result for result in audit_results]))
-    token_results = [host.run('read_ledger --type=sovtoken --count') for host in hosts]
-    print('\nTOKEN LEDGER SYNC: {}'.format([result for result in token_results]))
+    for ledger_type in LEDGER_TYPES:
+        print('\n{} LEDGER SYNC: {}'.format(
+            ledger_type.upper(), [sizes[ledger_type] for sizes in ledger_sizes.values()])
+        )
 
-    for res in (pool_results, config_results, domain_results, audit_results, token_results):
-        assert len(set(res)) == 1
+    diverged = get_diverged_ledgers(ledger_sizes)
+    assert not diverged, 'Ledgers are not in sync: {}'.format(
+        '; '.join('{} ledger differs on {}'.format(ledger_type, lagging) for ledger_type, lagging in diverged.items())
+    )
 
 
 async def ensure_pool_is_in_sync(node_ids=None, nodes_num=7):
@@ -1015,6 +1086,16 @@ class NodeHost:
             print(output)
         return output
 
+    def get_ledger_sizes(self):
+        output = self.run(
+            ' && '.join('read_ledger --type={} --count'.format(ledger_type) for ledger_type in LEDGER_TYPES)
+        )
+        counts = output.split()
+        assert len(counts) == len(LEDGER_TYPES), (
+            "Unexpected read_ledger output on {}: {}".format(self.name, output)
+        )
+        return dict(zip(LEDGER_TYPES, counts))
+
     def start_service(self):
         return self.run('systemctl start indy-node')
 
@@ -1024,21 +1105,25 @@ class NodeHost:
     def restart_service(self):
         return self.run('systemctl restart indy-node')
 
-    def generate_logs(self):
+    def generate_logs(self, since=None):
         # TODO might fail in case of running nodes since tar complaints when
         # files are changed during archiving
         archive_path = "/tmp/{}.{}.tgz".format(self.name, datetime.now().strftime("%Y-%m-%dT%H%M%S"))
+        # only files modified after `since` (datetime) are archived if it is set
+        newer = "-newermt @{} ".format(int(since.timestamp())) if since else ""
         self.run(
-            "find /var/log/indy/sandbox/ /var/lib/indy/sandbox/ -maxdepth 1 -type f -not -name data "
+            "find /var/log/indy/sandbox/ /var/lib/indy/sandbox/ -maxdepth 1 -type f -not -name data {}"
             "| tar czf {} -T -"
-            .format(archive_path)
+            .format(newer, archive_path)
         )
         return archive_path
 
 
-async def send_random_nyms(pool_handle, wallet_handle, submitter_did, count):
-    for i in range(count):
-        await send_nym(pool_handle, wallet_handle, submitter_did, random_did_and_json()[0], None, None, None)
+async def send_random_nyms(pool_handle, wallet_handle, submitter_did, count, max_in_flight=NYMS_IN_FLIGHT):
+    return await send_nyms_pipelined(
+        pool_handle, wallet_handle, submitter_did,
+        [random_did_and_json()[0] for _ in range(count)], max_in_flight=max_in_flight
+    )
 
 
 async def send_node(